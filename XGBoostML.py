@@ -1,3 +1,7 @@
+import argparse
+import hashlib
+import json
+import os
 import numpy as np
 import pandas as pd
 from itertools import product
@@ -21,67 +25,159 @@ fullness_map = {level: i for i, level in enumerate(fullness_levels)}
 weather_map = {level: i for i, level in enumerate(weather_conditions)}
 odor_map = {level: i for i, level in enumerate(odor_levels)}
 
+# Feature order used by the model and weights of the synthetic urgency target
+feature_order = ['moisture', 'toxicity', 'fullness', 'weather', 'odor']
+urgency_weights = {'moisture': 0.2, 'toxicity': 0.3, 'fullness': 0.4, 'weather': 0.2, 'odor': 0.3}
+category_levels = {
+    'moisture': moisture_levels,
+    'toxicity': toxicity_levels,
+    'fullness': fullness_levels,
+    'weather': weather_conditions,
+    'odor': odor_levels
+}
+category_maps = {
+    'moisture': moisture_map,
+    'toxicity': toxicity_map,
+    'fullness': fullness_map,
+    'weather': weather_map,
+    'odor': odor_map
+}
+
+DEFAULT_MODEL_PATH = 'xgboost_urgency.json'
+
+
+# Fingerprint of everything the trained model depends on: feature order,
+# category lists and the generated training set itself, so any change to
+# the urgency formula or its normalization in build_dataset() shows up.
+# Saved next to the model and checked again on load.
+def model_signature():
+    df = build_dataset()
+    digest = hashlib.sha256(json.dumps({
+        'features': feature_order,
+        'categories': category_levels,
+        'columns': list(df.columns)
+    }, sort_keys=True).encode())
+    # Rounded so that last-bit float differences between numpy builds do
+    # not invalidate a model
+    digest.update(np.ascontiguousarray(df.to_numpy(dtype=np.float64).round(9)).tobytes())
+    return digest.hexdigest()
+
+
 # Step 2: Generate all combinations of inputs
-combinations = list(product(moisture_levels, toxicity_levels, fullness_levels, weather_conditions, odor_levels))
-
-# Convert combinations to numerical values
-data = []
-for combination in combinations:
-    data.append([
-        moisture_map[combination[0]],
-        toxicity_map[combination[1]],
-        fullness_map[combination[2]],
-        weather_map[combination[3]],
-        odor_map[combination[4]]
+def build_dataset():
+    combinations = list(product(*(category_levels[f] for f in feature_order)))
+
+    # Convert combinations to numerical values
+    data = np.array([
+        [category_maps[f][level] for f, level in zip(feature_order, combination)]
+        for combination in combinations
     ])
 
-# Step 3: Define target urgency levels (heuristically or manually assigned)
-data = np.array(data)
-urgency = (
-    data[:, 0] * 0.2 +  # moisture weight
-    data[:, 1] * 0.3 +  # toxicity weight
-    data[:, 2] * 0.4 +  # fullness weight
-    data[:, 3] * 0.2 +  # weather weight
-    data[:, 4] * 0.3    # odor weight
-)
-
-# Normalize urgency to [0, 100]
-urgency = (urgency / max(urgency)) * 100
-
-# Create a DataFrame
-df = pd.DataFrame(data, columns=['moisture', 'toxicity', 'fullness', 'weather', 'odor'])
-df['urgency'] = urgency
-
-# Step 4: Split data into training and testing sets
-X = df.drop(columns=['urgency'])
-y = df['urgency']
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Step 5: Train an XGBoost model
-model = XGBRegressor(random_state=42)
-model.fit(X_train, y_train)
-
-# Hyperparameter tuning
-param_grid = {
-    'n_estimators': [100, 200],
-    'learning_rate': [0.1, 0.2],
-    'max_depth': [3, 5],
-    'subsample': [0.8, 1.0],
-    'colsample_bytree': [0.8, 1.0]
-}
-grid_search = GridSearchCV(
-    estimator=XGBRegressor(random_state=42),
-    param_grid=param_grid,
-    scoring='neg_mean_squared_error',
-    cv=3,
-    verbose=1,
-    n_jobs=-1
-)
-grid_search.fit(X_train, y_train)
-best_model = grid_search.best_estimator_
-
-# Step 8: Predict urgency based on user input
-def get_user_input_and_predict():
+    # Step 3: Define target urgency levels (heuristically or manually assigned)
+    urgency = sum(data[:, i] * urgency_weights[f] for i, f in enumerate(feature_order))
+
+    # Normalize urgency to [0, 100]
+    urgency = (urgency / max(urgency)) * 100
+
+    # Create a DataFrame
+    df = pd.DataFrame(data, columns=feature_order)
+    df['urgency'] = urgency
+    return df
+
+
+def train_model():
+    df = build_dataset()
+
+    # Step 4: Split data into training and testing sets
+    X = df.drop(columns=['urgency'])
+    y = df['urgency']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    # Step 5: Train an XGBoost model
+    model = XGBRegressor(random_state=42)
+    model.fit(X_train, y_train)
+
+    # Hyperparameter tuning
+    param_grid = {
+        'n_estimators': [100, 200],
+        'learning_rate': [0.1, 0.2],
+        'max_depth': [3, 5],
+        'subsample': [0.8, 1.0],
+        'colsample_bytree': [0.8, 1.0]
+    }
+    grid_search = GridSearchCV(
+        estimator=XGBRegressor(random_state=42),
+        param_grid=param_grid,
+        scoring='neg_mean_squared_error',
+        cv=3,
+        verbose=1,
+        n_jobs=-1
+    )
+    grid_search.fit(X_train, y_train)
+    best_model = grid_search.best_estimator_
+
+    for name, candidate in (('Baseline', model), ('Best', best_model)):
+        predictions = candidate.predict(X_test)
+        print(f"{name} model: MSE {mean_squared_error(y_test, predictions):.4f}, "
+              f"R2 {r2_score(y_test, predictions):.4f}")
+    return best_model
+
+
+# Step 6: Persist the model with the metadata needed to validate it on load
+def save_model(best_model, path=DEFAULT_MODEL_PATH):
+    best_model.save_model(path)
+    metadata = {
+        'features': feature_order,
+        'categories': category_levels,
+        'category_maps': category_maps,
+        'urgency_weights': urgency_weights,
+        'signature': model_signature()
+    }
+    with open(path + '.meta.json', 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+# Step 7: Load a saved model, refusing artifacts trained on other categories
+# or another urgency formula
+def load_model(path=DEFAULT_MODEL_PATH):
+    with open(path + '.meta.json') as f:
+        metadata = json.load(f)
+    if metadata.get('signature') != model_signature() or metadata.get('features') != feature_order:
+        raise ValueError(f"Model '{path}' was trained with different categories or urgency "
+                         f"formula. Retrain it with: python XGBoostML.py train")
+
+    best_model = XGBRegressor()
+    best_model.load_model(path)
+    return best_model
+
+
+# Step 8: Exhaustive answer table.  The categorical input space is finite, so
+# one vectorized predict over every combination replaces all later model
+# calls.  The table is indexed by category codes in feature_order.
+table_shape = tuple(len(category_levels[f]) for f in feature_order)
+
+
+def build_answer_table(best_model):
+    codes = np.indices(table_shape).reshape(len(feature_order), -1).T
+    grid = pd.DataFrame(codes, columns=feature_order)
+    return best_model.predict(grid).reshape(table_shape)
+
+
+# Bulk lookup from arrays (or scalars) of category codes.  Codes are checked
+# against the table: numpy would silently wrap a negative code around to
+# the last category.
+def predict_codes(answer_table, moisture, toxicity, fullness, weather, odor):
+    codes = [np.asarray(c) for c in (moisture, toxicity, fullness, weather, odor)]
+    for feature, code, size in zip(feature_order, codes, answer_table.shape):
+        if code.dtype.kind not in 'iu':
+            raise ValueError(f"{feature} codes must be integers, got {code.dtype}")
+        if code.size and (code.min() < 0 or code.max() >= size):
+            raise ValueError(f"{feature} codes must be in [0, {size}), got {code.min()}..{code.max()}")
+    return answer_table[tuple(codes)]
+
+
+# Step 9: Predict urgency based on user input
+def get_user_input_and_predict(best_model, answer_table=None):
     print("\nEnter the input levels for the following variables (choose one of the options shown):")
     
     user_moisture = input(f"Moisture ({', '.join(moisture_levels)}): ").strip().lower()
@@ -97,16 +193,20 @@ def get_user_input_and_predict():
         print("Invalid input. Please enter valid options.")
         return
 
-    user_input = pd.DataFrame({
-        'moisture': [moisture_map[user_moisture]],
-        'toxicity': [toxicity_map[user_toxicity]],
-        'fullness': [fullness_map[user_fullness]],
-        'weather': [weather_map[user_weather]],
-        'odor': [odor_map[user_odor]]
-    })
-
     # Predict urgency
-    predicted_urgency = best_model.predict(user_input)[0]
+    if answer_table is not None:
+        predicted_urgency = predict_codes(answer_table, moisture_map[user_moisture],
+                                          toxicity_map[user_toxicity], fullness_map[user_fullness],
+                                          weather_map[user_weather], odor_map[user_odor])
+    else:
+        user_input = pd.DataFrame({
+            'moisture': [moisture_map[user_moisture]],
+            'toxicity': [toxicity_map[user_toxicity]],
+            'fullness': [fullness_map[user_fullness]],
+            'weather': [weather_map[user_weather]],
+            'odor': [odor_map[user_odor]]
+        })
+        predicted_urgency = best_model.predict(user_input)[0]
 
     # Decide if the bin should be emptied (threshold: 70%)
     threshold = 70
@@ -115,5 +215,24 @@ def get_user_input_and_predict():
     print(f"\nPredicted Urgency: {predicted_urgency:.2f}%")
     print(f"Decision: {decision}")
 
-# Get user input and predict
-get_user_input_and_predict()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train or query the XGBoost urgency model")
+    parser.add_argument('command', nargs='?', choices=['train', 'predict'], default='predict')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="path of the saved model")
+    parser.add_argument('--answer-table', action='store_true',
+                        help="score every category combination at load time and answer from the table")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        save_model(train_model(), args.model)
+        print(f"Saved model to {args.model}")
+    else:
+        if not os.path.exists(args.model):
+            print(f"No saved model at {args.model}; training one first.")
+            save_model(train_model(), args.model)
+
+        # Get user input and predict
+        best_model = load_model(args.model)
+        answer_table = build_answer_table(best_model) if args.answer_table else None
+        get_user_input_and_predict(best_model, answer_table)
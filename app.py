@@ -1,104 +1,62 @@
-from flask import Flask, request, render_template
+from flask import Flask, request, render_template, Response, abort
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
 import random
+from functools import lru_cache
+import os
+from batchInference import BatchInferenceEngine
+from resultCache import QuantizedResultCache, DEFAULT_MAXSIZE, parse_resolution
+from ruleSpec import APP_SPEC, THRESHOLD, build_control_system, fuzzy_object_names, load_compiled
+from serviceMetrics import CONTENT_TYPE, MetricsRegistry, metrics_allowed
 
 app = Flask(__name__)
 
-# Define fuzzy variables
-fullness = ctrl.Antecedent(np.arange(0, 101, 1), 'fullness')
-toxicity = ctrl.Antecedent(np.arange(0, 101, 1), 'toxicity')
-moisture = ctrl.Antecedent(np.arange(0, 101, 1), 'moisture')
-odor = ctrl.Antecedent(np.arange(0, 101, 1), 'odor')
-weather = ctrl.Antecedent(np.arange(0, 101, 1), 'weather')
-urgency = ctrl.Consequent(np.arange(0, 101, 1), 'urgency')
-
-# Membership Functions
-fullness['low'] = fuzz.trimf(fullness.universe, [0, 0, 50])
-fullness['medium'] = fuzz.trimf(fullness.universe, [20, 50, 80])
-fullness['high'] = fuzz.trimf(fullness.universe, [50, 100, 100])
-
-toxicity['none'] = fuzz.trimf(toxicity.universe, [0, 0, 10])
-toxicity['mild'] = fuzz.trimf(toxicity.universe, [5, 15, 30])
-toxicity['moderate'] = fuzz.trimf(toxicity.universe, [20, 35, 50])
-toxicity['high'] = fuzz.trimf(toxicity.universe, [45, 60, 70])
-toxicity['very_high'] = fuzz.trimf(toxicity.universe, [60, 75, 90])
-toxicity['severe'] = fuzz.trimf(toxicity.universe, [80, 100, 100])
-
-moisture['dry'] = fuzz.trimf(moisture.universe, [0, 0, 20])
-moisture['slightly_moist'] = fuzz.trimf(moisture.universe, [10, 25, 40])
-moisture['moderate'] = fuzz.trimf(moisture.universe, [30, 50, 70])
-moisture['wet'] = fuzz.trimf(moisture.universe, [60, 75, 90])
-moisture['saturated'] = fuzz.trimf(moisture.universe, [80, 100, 100])
-
-odor['none'] = fuzz.gaussmf(odor.universe, mean=0, sigma=10)
-odor['mild'] = fuzz.gaussmf(odor.universe, mean=25, sigma=10)
-odor['moderate'] = fuzz.gaussmf(odor.universe, mean=50, sigma=10)
-odor['strong'] = fuzz.gaussmf(odor.universe, mean=75, sigma=10)
-odor['very_strong'] = fuzz.gaussmf(odor.universe, mean=100, sigma=10)
-
-weather['clear'] = fuzz.trapmf(weather.universe, [0, 0, 10, 20])
-weather['cloudy'] = fuzz.trapmf(weather.universe, [10, 20, 30, 40])
-weather['rainy'] = fuzz.trapmf(weather.universe, [30, 40, 50, 60])
-weather['humid'] = fuzz.trapmf(weather.universe, [50, 60, 70, 80])
-weather['stormy'] = fuzz.trapmf(weather.universe, [70, 80, 90, 100])
-
-urgency['low'] = fuzz.trimf(urgency.universe, [0, 0, 50])
-urgency['medium'] = fuzz.trimf(urgency.universe, [20, 50, 80])
-urgency['high'] = fuzz.trimf(urgency.universe, [50, 100, 100])
-urgency['critical'] = fuzz.trimf(urgency.universe, [85, 100, 100])
-
-# Rules
-rule1 = ctrl.Rule(fullness['high'] & odor['very_strong'] & toxicity['severe'] & moisture['saturated'] & weather['stormy'], urgency['critical'])
-rule2 = ctrl.Rule(fullness['high'] & odor['moderate'] & toxicity['moderate'] & moisture['saturated'] & weather['stormy'], urgency['critical'])
-rule3 = ctrl.Rule(fullness['medium'] & odor['very_strong'] & toxicity['very_high'] & moisture['wet'] & weather['humid'], urgency['critical'])
-rule4 = ctrl.Rule(fullness['high'] & odor['strong'] & toxicity['severe'] & moisture['wet'] & weather['stormy'], urgency['critical'])
-rule5 = ctrl.Rule(fullness['high'] & odor['moderate'] & toxicity['severe'] & moisture['saturated'] & weather['stormy'], urgency['critical'])
-rule6 = ctrl.Rule(fullness['medium'] & odor['moderate'] & (toxicity['high'] | toxicity['very_high']) & moisture['wet'] & weather['humid'], urgency['high'])
-rule7 = ctrl.Rule(fullness['medium'] & odor['very_strong'] & toxicity['high'] & moisture['wet'] & weather['humid'], urgency['critical'])
-rule8 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['moderate'] & moisture['wet'] & weather['stormy'], urgency['high'])
-rule9 = ctrl.Rule(fullness['high'] & odor['very_strong'] & toxicity['severe'] & moisture['wet'] & weather['humid'], urgency['high'])
-rule10 = ctrl.Rule(fullness['high'] & odor['very_strong'] & toxicity['moderate'] & moisture['wet'] & weather['rainy'], urgency['high'])
-rule11 = ctrl.Rule(fullness['high'] & odor['moderate'] & toxicity['moderate'] & moisture['wet'] & weather['cloudy'], urgency['high'])
-rule12 = ctrl.Rule(fullness['medium'] & odor['very_strong'] & toxicity['moderate'] & moisture['wet'] & weather['cloudy'], urgency['high'])
-rule13 = ctrl.Rule(fullness['medium'] & odor['strong'] & toxicity['moderate'] & moisture['wet'] & weather['rainy'], urgency['high'])
-rule14 = ctrl.Rule(fullness['medium'] & odor['mild'] & toxicity['moderate'] & moisture['wet'] & weather['cloudy'], urgency['medium'])
-rule15 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['moderate'] & moisture['moderate'] & weather['rainy'], urgency['medium'])
-rule16 = ctrl.Rule(fullness['medium'] & odor['strong'] & toxicity['mild'] & moisture['wet'] & weather['cloudy'], urgency['medium'])
-rule17 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['moderate'] & moisture['moderate'] & weather['cloudy'], urgency['medium'])
-rule18 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['moderate'] & moisture['wet'] & weather['cloudy'], urgency['medium'])
-rule19 = ctrl.Rule(fullness['low'] & odor['moderate'] & toxicity['mild'] & moisture['moderate'] & weather['rainy'], urgency['medium'])
-rule20 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['mild'] & moisture['wet'] & weather['rainy'], urgency['medium'])
-rule21 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['moderate'] & moisture['saturated'] & weather['cloudy'], urgency['medium'])
-rule22 = ctrl.Rule(fullness['medium'] & odor['mild'] & toxicity['mild'] & moisture['wet'] & weather['cloudy'], urgency['medium'])
-rule23 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['mild'] & moisture['wet'] & weather['cloudy'], urgency['medium'])
-rule24 = ctrl.Rule(fullness['low'] & odor['none'] & toxicity['none'] & moisture['dry'] & weather['clear'], urgency['low'])
-rule25 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['none'] & moisture['dry'] & weather['clear'], urgency['low'])
-rule26 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['mild'] & moisture['slightly_moist'] & weather['clear'], urgency['low'])
-rule27 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['none'] & moisture['slightly_moist'] & weather['clear'], urgency['low'])
-rule28 = ctrl.Rule(fullness['high'] & odor['mild'] & toxicity['moderate'] & moisture['moderate'] & weather['cloudy'], urgency['medium'])
-rule29 = ctrl.Rule(fullness['high'] & odor['very_strong'] & toxicity['high'] & moisture['saturated'] & weather['stormy'], urgency['high'])
-rule30 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['moderate'] & moisture['wet'] & weather['cloudy'], urgency['medium'])
-rule31 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['mild'] & moisture['moderate'] & weather['rainy'], urgency['medium'])
-rule32 = ctrl.Rule(fullness['medium'] & odor['moderate'] & toxicity['mild'] & moisture['wet'] & weather['humid'], urgency['medium'])
-rule33 = ctrl.Rule(fullness['high'] & odor['very_strong'] & toxicity['moderate'] & moisture['wet'] & weather['humid'], urgency['high'])
-rule34 = ctrl.Rule(fullness['low'] & odor['none'] & toxicity['mild'] & moisture['moderate'] & weather['cloudy'], urgency['low'])
-rule35 = ctrl.Rule(fullness['low'] & odor['mild'] & toxicity['none'] & moisture['dry'] & weather['cloudy'], urgency['low'])
-rule36 = ctrl.Rule(fullness['high'] & odor['mild'] & toxicity['none'] & moisture['dry'] & weather['cloudy'], urgency['high'])
-rule37 = ctrl.Rule(fullness['high'] & odor['strong'] & toxicity['high'] & moisture['wet'] & weather['stormy'], urgency['critical'])
-rule38 = ctrl.Rule(fullness['high'] & odor['strong'] & toxicity['very_high'] & moisture['wet'] & weather['humid'], urgency['critical'])
-
-fallback_rule = ctrl.Rule(fullness['high'], urgency['high'])  # Fallback for high fullness
-rules = [
-    rule1, rule2, rule3, rule4, rule5, rule6, rule7, rule8, rule9, rule10,
-    rule11, rule12, rule13, rule14, rule15, rule16, rule17, rule18, rule19, rule20,
-    rule21, rule22, rule23, rule24, rule25, rule26, rule27, rule28, rule29, rule30,
-    rule31, rule32, rule33, rule34, rule35, rule36, rule37, rule38, fallback_rule ]
-
-# Control System
-waste_ctrl = ctrl.ControlSystem(rules)
-waste_sim = ctrl.ControlSystemSimulation(waste_ctrl)
+# Compiled rule base (see ruleSpec.APP_SPEC), read from the on-disk cache
+# when the spec is unchanged. This is a stateless scorer shared by all
+# request threads.
+waste_engine = BatchInferenceEngine(load_compiled(APP_SPEC),
+                                    defuzzifier=os.environ.get('URGENCY_DEFUZZIFIER', 'sampled'))
+
+# Memoized scores, shared by every handler.  Keys are the exact inputs
+# unless URGENCY_CACHE_RESOLUTION opts into quantized keys (see resultCache)
+urgency_cache = QuantizedResultCache(
+    waste_engine,
+    resolution=parse_resolution(os.environ.get('URGENCY_CACHE_RESOLUTION')),
+    maxsize=int(os.environ.get('URGENCY_CACHE_SIZE', DEFAULT_MAXSIZE))
+)
+
+# Monte-Carlo mode: a form with samples=K (or URGENCY_MC_SAMPLES=K) scores K
+# existing_waste draws in one engine call and reports the distribution.
+# K is capped to keep the request inside normal latency (K=1000 costs about
+# as much as rendering the page); seed=N makes the draws reproducible.
+MC_DEFAULT_SAMPLES = int(os.environ.get('URGENCY_MC_SAMPLES', 0))
+MC_MAX_SAMPLES = 10000
+
+# Per-stage request timings and counters, served on /metrics
+metrics = MetricsRegistry('urgency_form')
+stage_seconds = metrics.stage_histogram(
+    'stage_seconds', "Time spent in each stage of the form handler",
+    ('existing_waste', 'form_parse', 'set_inputs', 'compute', 'monte_carlo', 'render'))
+requests_total = metrics.counter('requests_total', "Scoring requests (POST /)")
+monte_carlo_total = metrics.counter('monte_carlo_requests_total', "Requests scored in Monte-Carlo mode")
+shortcut_total = metrics.counter('fullness_shortcut_total', "Requests answered by the fullness > 95 shortcut")
+coverage_errors_total = metrics.counter('coverage_errors_total', "Requests where no rule fired (KeyError path)")
+metrics.cache('cache', urgency_cache)
+
+
+# The skfuzzy objects (fullness ... urgency, rule1 ... rule38, fallback_rule,
+# rules, waste_ctrl, waste_sim) are only built on first access. The request
+# handlers never need them; ControlSystemSimulation keeps its inputs on the
+# shared variables, so it must not be used from request handlers anyway.
+@lru_cache(maxsize=None)
+def _fuzzy_objects():
+    return build_control_system(APP_SPEC)
+
+
+def __getattr__(name):
+    if name in fuzzy_object_names(APP_SPEC):
+        return _fuzzy_objects()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Mappings for categorical inputs
 toxicity_mapping = {
@@ -134,54 +92,144 @@ weather_mapping = {
     "stormy": 90
 }
 
-@app.route('/', methods=['GET', 'POST'])
-def home():
-    if request.method == 'POST':
-        # Generate initial waste conditions
+# Scores one submitted form (any mapping with .get) and returns the
+# index.html context.  Shared by the Flask route and asyncServer.py.
+def score_form(data):
+    requests_total.inc()
+
+    try:
+        samples = min(int(data.get('samples') or MC_DEFAULT_SAMPLES), MC_MAX_SAMPLES)
+    except ValueError:
+        return {'error': "Error: samples must be a whole number."}
+    if samples > 0:
+        seed = data.get('seed')
+        try:
+            seed = int(seed) if seed else None
+        except ValueError:
+            seed = -1
+        if seed is not None and seed < 0:
+            return {'error': "Error: seed must be a non-negative whole number."}
+        return score_form_monte_carlo(data, samples, seed)
+
+    # Generate initial waste conditions
+    with stage_seconds.time('existing_waste'):
         existing_waste = {
             "toxicity": random.uniform(20, 70),  # Random toxicity value
             "moisture": random.uniform(20, 70)  # Random moisture value
         }
 
-        # Retrieve user inputs
-        data = request.form
+    # Retrieve user inputs
+    with stage_seconds.time('form_parse'):
         fullness_level = float(data.get('fullness', 0))
         toxicity_level = data.get('toxicity', 'none')
         moisture_level = data.get('moisture', 'dry')
         odor_level = data.get('odor', 'none')
         weather_level = data.get('weather', 'clear')
 
+    with stage_seconds.time('set_inputs'):
         # Combine existing and user inputs
         combined_toxicity = (existing_waste['toxicity'] + toxicity_mapping[toxicity_level]) / 2
         combined_moisture = (existing_waste['moisture'] + moisture_mapping[moisture_level]) / 2
 
         # Simulate fuzzy system
-        waste_sim.input['fullness'] = np.clip(fullness_level, 0, 100)
-        waste_sim.input['toxicity'] = np.clip(combined_toxicity, 0, 100)
-        waste_sim.input['moisture'] = np.clip(combined_moisture, 0, 100)
-        waste_sim.input['odor'] = np.clip(odor_mapping[odor_level], 0, 100)
-        waste_sim.input['weather'] = np.clip(weather_mapping[weather_level], 0, 100)
-        try:
-            if fullness_level > 95:
-                urgency_score = 98.5
-            else:
-            # Simulate fuzzy system
-                waste_sim.compute()
-
-                # Calculate urgency score
-                urgency_score = waste_sim.output['urgency']
-                
-            decision = "Empty the bin immediately!" if urgency_score >= 85 else "No immediate need to empty the bin."
-
-            # Render template with results
-            return render_template('index.html', existing_waste=existing_waste, urgency_score=round(urgency_score, 2),
-                                   decision=decision)
-        except KeyError as e:
-            return render_template('index.html', error=f"Error: {str(e)} - Please check your rule coverage.")
-    
+        inputs = {
+            'fullness': np.clip(fullness_level, 0, 100),
+            'toxicity': np.clip(combined_toxicity, 0, 100),
+            'moisture': np.clip(combined_moisture, 0, 100),
+            'odor': np.clip(odor_mapping[odor_level], 0, 100),
+            'weather': np.clip(weather_mapping[weather_level], 0, 100)
+        }
+    try:
+        if fullness_level > 95:
+            shortcut_total.inc()
+            urgency_score = 98.5
+        else:
+            # Calculate urgency score
+            with stage_seconds.time('compute'):
+                urgency_score = urgency_cache.score(**inputs)
+
+        decision = "Empty the bin immediately!" if urgency_score >= THRESHOLD else "No immediate need to empty the bin."
+        return {'existing_waste': existing_waste, 'urgency_score': round(urgency_score, 2), 'decision': decision}
+    except KeyError as e:
+        coverage_errors_total.inc()
+        return {'error': f"Error: {str(e)} - Please check your rule coverage."}
+
+
+# Monte-Carlo counterpart of score_form(): the same blending over `samples`
+# existing_waste draws from a seedable RNG, scored as one batch.  Draws no
+# rule covers are left out of the statistics and counted as uncovered.
+def score_form_monte_carlo(data, samples, seed=None):
+    monte_carlo_total.inc()
+    with stage_seconds.time('form_parse'):
+        fullness_level = float(data.get('fullness', 0))
+        toxicity_level = data.get('toxicity', 'none')
+        moisture_level = data.get('moisture', 'dry')
+        odor_level = data.get('odor', 'none')
+        weather_level = data.get('weather', 'clear')
+        rng = np.random.default_rng(seed)
+
+    with stage_seconds.time('existing_waste'):
+        existing_toxicity = rng.uniform(20, 70, samples)
+        existing_moisture = rng.uniform(20, 70, samples)
+
+    with stage_seconds.time('set_inputs'):
+        inputs = {
+            'fullness': np.full(samples, np.clip(fullness_level, 0, 100)),
+            'toxicity': np.clip((existing_toxicity + toxicity_mapping[toxicity_level]) / 2, 0, 100),
+            'moisture': np.clip((existing_moisture + moisture_mapping[moisture_level]) / 2, 0, 100),
+            'odor': np.full(samples, np.clip(odor_mapping[odor_level], 0, 100)),
+            'weather': np.full(samples, np.clip(weather_mapping[weather_level], 0, 100))
+        }
+
+    if fullness_level > 95:
+        shortcut_total.inc()
+        scores = np.full(samples, 98.5)
+    else:
+        with stage_seconds.time('monte_carlo'):
+            scores = waste_engine.compute(inputs)
+
+    covered = scores[~np.isnan(scores)]
+    if not covered.size:
+        coverage_errors_total.inc()
+        return {'error': f"Error: {str(KeyError(waste_engine.rule_base.output_label))} - Please check your rule coverage."}
+
+    p5, p50, p95 = np.percentile(covered, [5, 50, 95])
+    urgency_score = float(covered.mean())
+    decision = "Empty the bin immediately!" if urgency_score >= THRESHOLD else "No immediate need to empty the bin."
+    return {
+        'urgency_score': round(urgency_score, 2),
+        'decision': decision,
+        'monte_carlo': {
+            'samples': samples,
+            'seed': seed,
+            'mean': round(urgency_score, 2),
+            'p5': round(float(p5), 2),
+            'p50': round(float(p50), 2),
+            'p95': round(float(p95), 2),
+            'p_empty': round(float((covered >= THRESHOLD).mean()), 4),
+            'uncovered': int(samples - covered.size),
+        },
+    }
+
+
+@app.route('/', methods=['GET', 'POST'])
+def home():
+    if request.method == 'POST':
+        context = score_form(request.form)
+
+        # Render template with results
+        with stage_seconds.time('render'):
+            return render_template('index.html', **context)
 
     # For GET request, just render the form
     return render_template('index.html')
 
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics_allowed(request.remote_addr):
+        abort(404)
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from werkzeug.exceptions import BadRequest, InternalServerError, MethodNotAllowed, NotFound, UnsupportedMediaType
+
+import app as form_app
+import wastedisposalDiffMembership as json_app
+from serviceMetrics import CONTENT_TYPE, MetricsRegistry, metrics_allowed
+
+# asyncio-native HTTP/1.1 front end for the urgency service.
+#
+# Serves the same contracts as the Flask apps from one process:
+#     GET/POST /    index.html form flow (app.py, APP_SPEC)
+#     POST /predict JSON scoring (wastedisposalDiffMembership.py)
+#     GET /metrics  metrics of both handlers plus this server's own
+# Both routes call the same score_form()/predict_payload() functions as the
+# Flask routes, render the same template and serialize with Flask's JSON
+# provider, so responses are interchangeable.  Error statuses carry
+# werkzeug's HTML error pages, as Flask's do (405s lack Flask's Allow
+# header).
+#
+# Connections are plain asyncio streams with keep-alive, so thousands of
+# idle device connections cost one coroutine each.  Scoring and rendering
+# run on a bounded thread pool:
+#   * at most max_pending requests may be admitted (running or queued);
+#     beyond that the server answers 503 with Retry-After straight away
+#   * every admitted request has a deadline; a request still queued or
+#     running when it expires gets a 504, and queued work whose deadline
+#     has already passed is skipped instead of being computed
+
+DEFAULT_PORT = 8000
+DEFAULT_MAX_PENDING = 256
+DEFAULT_DEADLINE = 2.0
+KEEPALIVE_TIMEOUT = 75.0
+MAX_BODY = 1 << 20
+
+TEMPLATES = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+                        autoescape=select_autoescape(['html']))
+
+metrics = MetricsRegistry('urgency_async')
+rejected_total = metrics.counter('rejected_total', "Requests refused with 503 because the executor was full")
+deadline_total = metrics.counter('deadline_exceeded_total', "Requests answered with 504 after their deadline")
+connections_total = metrics.counter('connections_total', "Accepted client connections")
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, workers=None, max_pending=DEFAULT_MAX_PENDING, deadline=DEFAULT_DEADLINE):
+        self.pool = ThreadPoolExecutor(workers or os.cpu_count() or 1, thread_name_prefix='urgency')
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.pending = 0
+
+    def _done(self, _):
+        self.pending -= 1
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        loop = asyncio.get_running_loop()
+        expires = time.monotonic() + self.deadline
+
+        def call():
+            if time.monotonic() > expires:
+                raise DeadlineExceeded()
+            return fn(*args)
+
+        # pending drops when the work really finishes (or is cancelled while
+        # still queued), not when the client stops waiting for it
+        self.pending += 1
+        future = self.pool.submit(call)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._done, f))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.deadline)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+
+
+def render_form(fields):
+    context = form_app.score_form(fields)
+    with form_app.stage_seconds.time('render'):
+        return TEMPLATES.get_template('index.html').render(**context)
+
+
+def predict(body, content_type):
+    def load():
+        if content_type.split(';')[0].strip().lower() != 'application/json':
+            raise UnsupportedMediaType("Did not attempt to load JSON data because the request "
+                                       "Content-Type was not 'application/json'.")
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise BadRequest()
+
+    payload, status = json_app.predict_payload(load)
+    with json_app.stage_seconds.time('serialize'):
+        return status, json_app.app.json.response(payload).get_data()
+
+
+# Status, body and content type of the page Flask sends for a werkzeug
+# HTTPException
+def error_page(exception):
+    return exception.code, exception.get_body(), 'text/html; charset=utf-8'
+
+
+def response(status, body, content_type='text/plain; charset=utf-8', keep_alive=True, extra=()):
+    if isinstance(body, str):
+        body = body.encode()
+    status = HTTPStatus(status)
+    head = [f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"), *extra]
+    return ("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body
+
+
+class UrgencyServer:
+    def __init__(self, executor):
+        self.executor = executor
+        # The GET page has no per-request content
+        self.form_page = TEMPLATES.get_template('index.html').render()
+
+    async def dispatch(self, method, path, headers, body, peer):
+        if path == '/':
+            if method == 'GET':
+                return 200, self.form_page, 'text/html; charset=utf-8'
+            if method == 'POST':
+                fields = {}
+                for key, value in parse_qsl(body.decode(), keep_blank_values=True):
+                    fields.setdefault(key, value)
+                return 200, await self.executor.run(render_form, fields), 'text/html; charset=utf-8'
+        elif path == '/predict':
+            if method == 'POST':
+                status, payload = await self.executor.run(predict, body, headers.get('content-type', ''))
+                return status, payload, 'application/json'
+        elif path == '/metrics':
+            if method == 'GET' and metrics_allowed(peer):
+                text = form_app.metrics.render() + json_app.metrics.render() + metrics.render()
+                return 200, text, CONTENT_TYPE
+            return error_page(NotFound())
+        else:
+            return error_page(NotFound())
+        return error_page(MethodNotAllowed())
+
+    async def handle(self, reader, writer):
+        connections_total.inc()
+        peer = (writer.get_extra_info('peername') or ('',))[0]
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    writer.write(response(400, "Bad Request", keep_alive=False))
+                    break
+
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                if 'chunked' in headers.get('transfer-encoding', '').lower():
+                    writer.write(response(411, "Length Required", keep_alive=False))
+                    break
+                length = headers.get('content-length') or '0'
+                if not (length.isascii() and length.isdigit()):
+                    writer.write(response(*error_page(BadRequest()), keep_alive=False))
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    writer.write(response(413, "Payload Too Large", keep_alive=False))
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload, content_type = await self.dispatch(
+                        method, target.split('?', 1)[0], headers, body, peer)
+                    extra = ()
+                except Overloaded:
+                    rejected_total.inc()
+                    status, payload, content_type = 503, "Service Unavailable", 'text/plain; charset=utf-8'
+                    extra = ("Retry-After: 1",)
+                except DeadlineExceeded:
+                    deadline_total.inc()
+                    status, payload, content_type = 504, "Gateway Timeout", 'text/plain; charset=utf-8'
+                    extra = ()
+                except Exception:
+                    # Same outcome as an unhandled exception in the Flask routes
+                    status, payload, content_type = error_page(InternalServerError())
+                    extra = ()
+                writer.write(response(status, payload, content_type, keep_alive, extra))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=DEFAULT_PORT, workers=None, max_pending=DEFAULT_MAX_PENDING,
+                deadline=DEFAULT_DEADLINE, ready=None):
+    server = UrgencyServer(BoundedExecutor(workers, max_pending, deadline))
+    listener = await asyncio.start_server(server.handle, host, port, backlog=4096)
+    if ready is not None:
+        ready(listener.sockets[0].getsockname()[1])
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="asyncio front end for the urgency service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help="scoring threads (default: CPU count)")
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument('--deadline', type=float, default=DEFAULT_DEADLINE, help="per-request deadline in seconds")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.workers, args.max_pending, args.deadline,
+                      ready=lambda port: print(f"Serving on http://{args.host}:{port}", flush=True)))
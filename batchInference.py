@@ -0,0 +1,714 @@
+import hashlib
+import threading
+
+import numpy as np
+
+# Vectorized Mamdani inference for skfuzzy control systems.
+#
+# A ControlSystem is compiled once into plain NumPy arrays (membership
+# matrices, clause/rule index arrays) and then whole batches of crisp inputs
+# are fuzzified, evaluated and centroid-defuzzified as array operations.
+#
+# The engine reproduces ControlSystemSimulation.compute() exactly:
+#   * inputs are clipped to each antecedent universe (clip_to_bounds=True)
+#   * fuzzification interpolates the sampled membership functions
+#   * AND/OR/NOT are fmin/fmax/1-x, rules are accumulated with max
+#   * the output universe is upsampled at every cut crossing before the
+#     piecewise-linear centroid is taken, just like CrispValueCalculator
+# The only differences are floating-point summation order, so scores agree
+# with waste_sim.output['urgency'] to within MATCH_TOLERANCE.  Inputs where
+# no rule fires come back as NaN - that is the case where skfuzzy leaves
+# 'urgency' out of sim.output and app.py reports a rule-coverage KeyError.
+
+MATCH_TOLERANCE = 1e-6
+
+DEFAULT_CHUNK_SIZE = 4096
+
+# 'sampled' integrates the output sets sampled on the output universe, as
+# skfuzzy does.  'analytic' integrates the exact piecewise-linear shapes
+# (CompiledRuleBase.output_vertices) and does not depend on the universe
+# resolution; on the integer universe it agrees with skfuzzy to within
+# ANALYTIC_TOLERANCE.
+DEFUZZIFIERS = ('sampled', 'analytic')
+
+ANALYTIC_TOLERANCE = 0.05
+
+# Chunks smaller than this are evaluated densely even when the engine is
+# sparse: below it the index costs more than the rules it skips.
+SPARSE_MIN_ROWS = 64
+
+# Column order of (N, 5) input arrays.  skfuzzy orders antecedents by graph
+# traversal, which changes with the rule list, so it is pinned here.
+INPUT_LABELS = ('fullness', 'toxicity', 'moisture', 'odor', 'weather')
+
+
+# Step 1: Flatten rule antecedents into conjunctive normal form.
+# min/max form a distributive lattice and 1-x obeys De Morgan over it, so
+# every and/or/not tree has an exact AND-of-ORs equivalent.
+def _antecedent_to_cnf(node, term_index, negate=False):
+    from skfuzzy.control.term import Term, TermAggregate
+
+    if isinstance(node, Term):
+        literal = term_index[id(node)]
+        if negate:
+            literal = -literal - 1
+        return [frozenset([literal])]
+
+    if not isinstance(node, TermAggregate):
+        raise ValueError(f"Unsupported antecedent node: {node!r}")
+
+    if node.kind == 'not':
+        return _antecedent_to_cnf(node.term1, term_index, not negate)
+
+    left = _antecedent_to_cnf(node.term1, term_index, negate)
+    right = _antecedent_to_cnf(node.term2, term_index, negate)
+    if (node.kind == 'and') != negate:
+        return left + right
+    return [a | b for a in left for b in right]
+
+
+def simplify_cnf(clauses):
+    # Drop duplicate clauses and clauses absorbed by a smaller one:
+    # min(a, max(a, b)) == a.
+    unique = sorted(set(clauses), key=len)
+    kept = []
+    for clause in unique:
+        if not any(other <= clause for other in kept):
+            kept.append(clause)
+    return sorted(kept, key=sorted)
+
+
+# Own, read-only copy of an array.  A compiled rule base never changes after
+# construction, which is what makes its memoized fingerprint, activation
+# index and the engine's breakpoints safe to cache; a changed membership
+# function means compiling a new rule base.
+def _read_only(array, dtype):
+    array = np.array(array, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+class CompiledRuleBase:
+    def __init__(self, input_labels, input_universes, input_terms, input_membership,
+                 output_label, output_universe, output_terms, output_membership,
+                 rule_labels, rule_clauses, activation_rule, activation_term,
+                 activation_weight, output_vertices=None):
+        self.input_labels = tuple(input_labels)
+        self.input_universes = [_read_only(u, np.float64) for u in input_universes]
+        self.input_terms = [tuple(t) for t in input_terms]
+        self.input_membership = [_read_only(m, np.float64) for m in input_membership]
+
+        self.output_label = output_label
+        self.output_universe = _read_only(output_universe, np.float64)
+        self.output_terms = tuple(output_terms)
+        self.output_membership = _read_only(output_membership, np.float64)
+
+        # Exact piecewise-linear shape of each output term as (x, y) vertex
+        # arrays, used by the analytic defuzzifier.  Terms without one (e.g.
+        # Gaussian sets, or rule bases built from a ControlSystem) fall back
+        # to the vertices of their sampled membership function.
+        if output_vertices is None:
+            output_vertices = [None] * len(self.output_terms)
+        self.output_vertices = [
+            tuple(_read_only(a, np.float64) for a in (sampled_vertices(self.output_universe, mf) if v is None else v))
+            for v, mf in zip(output_vertices, self.output_membership)]
+
+        # Rules are stored as lists of clauses, each clause a set of literals.
+        # A literal is a global term index, or -(index + 1) for its negation.
+        self.rule_labels = tuple(rule_labels)
+        self.rule_clauses = [[frozenset(c) for c in clauses] for clauses in rule_clauses]
+        self.activation_rule = _read_only(activation_rule, np.intp)
+        self.activation_term = _read_only(activation_term, np.intp)
+        self.activation_weight = _read_only(activation_weight, np.float64)
+
+        self.term_offsets = np.cumsum([0] + [len(t) for t in self.input_terms])
+        self.n_terms = int(self.term_offsets[-1])
+        self.output_used = np.zeros(len(self.output_terms), dtype=bool)
+        self.output_used[self.activation_term] = True
+        self._build_index_arrays()
+
+    @property
+    def n_inputs(self):
+        return len(self.input_labels)
+
+    @property
+    def n_rules(self):
+        return len(self.rule_labels)
+
+    def literal_column(self, literal):
+        # Column of a literal in the extended membership matrix
+        # [mu | 1 - mu | 0 | 1].
+        return literal if literal >= 0 else self.n_terms - literal - 1
+
+    def _build_index_arrays(self):
+        clause_ids = {}
+        for clauses in self.rule_clauses:
+            for clause in clauses:
+                clause_ids.setdefault(clause, len(clause_ids))
+        self.clauses = sorted(clause_ids, key=clause_ids.get)
+
+        zero_column = 2 * self.n_terms
+        width = max((len(c) for c in self.clauses), default=1)
+        self.clause_literals = np.full((len(self.clauses), width), zero_column, dtype=np.intp)
+        for i, clause in enumerate(self.clauses):
+            self.clause_literals[i, :len(clause)] = [self.literal_column(l) for l in sorted(clause)]
+
+        # Padding points at an extra always-one clause column.
+        one_clause = len(self.clauses)
+        width = max((len(c) for c in self.rule_clauses), default=1)
+        self.rule_clause_index = np.full((self.n_rules, width), one_clause, dtype=np.intp)
+        for r, clauses in enumerate(self.rule_clauses):
+            self.rule_clause_index[r, :len(clauses)] = [clause_ids[c] for c in clauses]
+
+        # Literal columns of every rule as (rules, clauses, literals), the
+        # padding clause reading the always-one column, for evaluating
+        # single (row, rule) pairs
+        padded = np.vstack([self.clause_literals,
+                            np.full((1, self.clause_literals.shape[1]), zero_column + 1, dtype=np.intp)])
+        self.rule_literals = padded[self.rule_clause_index]
+
+        # Activations grouped by rule (CSR layout)
+        self.activation_order = np.argsort(self.activation_rule, kind='stable')
+        self.rule_activation_count = np.bincount(self.activation_rule, minlength=self.n_rules)
+        self.rule_activation_start = np.cumsum(self.rule_activation_count) - self.rule_activation_count
+
+        # Activations grouped by output term, for output_cuts()
+        self.term_activation_order = np.argsort(self.activation_term, kind='stable')
+        self.activated_terms, self.term_activation_start = np.unique(
+            self.activation_term[self.term_activation_order], return_index=True)
+
+    # Activation index: for every input variable, a (slots, rules) table of
+    # the rules that variable does not rule out, bit-packed along the rules.
+    # A slot is one interval of the input universe, the same interval
+    # interp_rows() interpolates in.
+    # A term whose samples are 0 at both ends of an interval is exactly 0
+    # anywhere inside it, and a rule is ruled out when one of its clauses
+    # only has (non-negated) literals of that variable and all of them are 0
+    # there.  Clauses mixing variables or containing negations never rule a
+    # rule out, so the index only ever over-approximates the firing rules.
+    @property
+    def activation_index(self):
+        if getattr(self, '_activation_index', None) is None:
+            tables = []
+            for v, membership in enumerate(self.input_membership):
+                first, stop = self.term_offsets[v], self.term_offsets[v + 1]
+                zero = (membership[:, :-1] == 0) & (membership[:, 1:] == 0)
+                table = np.ones((zero.shape[1], self.n_rules), dtype=bool)
+                for r, clauses in enumerate(self.rule_clauses):
+                    for clause in clauses:
+                        if all(first <= l < stop for l in clause):
+                            table[np.logical_and.reduce([zero[l - first] for l in clause]), r] = False
+                tables.append(np.packbits(table, axis=1, bitorder='little'))
+            self._activation_index = tables
+        return self._activation_index
+
+    # Flat array form, used for the on-disk cache and the content fingerprint.
+    # Clauses are stored as one literal array plus per-clause and per-rule
+    # lengths.
+    def to_arrays(self):
+        arrays = {
+            'input_labels': np.array(self.input_labels),
+            'term_counts': np.array([len(t) for t in self.input_terms]),
+            'input_terms': np.array([t for terms in self.input_terms for t in terms]),
+            'output_label': np.array(self.output_label),
+            'output_universe': self.output_universe,
+            'output_terms': np.array(self.output_terms),
+            'output_membership': self.output_membership,
+            'rule_labels': np.array(self.rule_labels),
+            'rule_sizes': np.array([len(c) for c in self.rule_clauses], dtype=np.int64),
+            'clause_sizes': np.array([len(c) for cs in self.rule_clauses for c in cs], dtype=np.int64),
+            'literals': np.array([l for cs in self.rule_clauses for c in cs for l in sorted(c)],
+                                 dtype=np.int64),
+            'activation_rule': self.activation_rule.astype(np.int64),
+            'activation_term': self.activation_term.astype(np.int64),
+            'activation_weight': self.activation_weight,
+            'output_vertex_counts': np.array([len(x) for x, _ in self.output_vertices], dtype=np.int64),
+            'output_vertex_x': np.concatenate([x for x, _ in self.output_vertices]),
+            'output_vertex_y': np.concatenate([y for _, y in self.output_vertices]),
+        }
+        for i, (universe, membership) in enumerate(zip(self.input_universes, self.input_membership)):
+            arrays[f'input_universe_{i}'] = universe
+            arrays[f'input_membership_{i}'] = membership
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        counts = [int(c) for c in arrays['term_counts']]
+        terms = [str(t) for t in arrays['input_terms']]
+        input_terms = [terms[sum(counts[:i]):sum(counts[:i + 1])] for i in range(len(counts))]
+
+        literals = iter(int(l) for l in arrays['literals'])
+        clause_sizes = iter(int(c) for c in arrays['clause_sizes'])
+        rule_clauses = [[frozenset(next(literals) for _ in range(next(clause_sizes)))
+                         for _ in range(int(size))]
+                        for size in arrays['rule_sizes']]
+
+        output_vertices = None
+        if 'output_vertex_counts' in arrays:
+            bounds = np.cumsum([0] + [int(c) for c in arrays['output_vertex_counts']])
+            output_vertices = [(arrays['output_vertex_x'][a:b], arrays['output_vertex_y'][a:b])
+                               for a, b in zip(bounds[:-1], bounds[1:])]
+
+        return cls(
+            input_labels=[str(l) for l in arrays['input_labels']],
+            input_universes=[arrays[f'input_universe_{i}'] for i in range(len(counts))],
+            input_terms=input_terms,
+            input_membership=[arrays[f'input_membership_{i}'] for i in range(len(counts))],
+            output_label=str(arrays['output_label']),
+            output_universe=arrays['output_universe'],
+            output_terms=[str(t) for t in arrays['output_terms']],
+            output_membership=arrays['output_membership'],
+            rule_labels=[str(l) for l in arrays['rule_labels']],
+            rule_clauses=rule_clauses,
+            activation_rule=arrays['activation_rule'],
+            activation_term=arrays['activation_term'],
+            activation_weight=arrays['activation_weight'],
+            output_vertices=output_vertices,
+        )
+
+    def save(self, file):
+        np.savez(file, **self.to_arrays())
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as data:
+            return cls.from_arrays({key: data[key] for key in data.files})
+
+    # Content hash of the membership functions and rules; changes whenever
+    # anything that can affect a score changes.
+    @property
+    def fingerprint(self):
+        if getattr(self, '_fingerprint', None) is None:
+            digest = hashlib.sha256()
+            for key, value in sorted(self.to_arrays().items()):
+                digest.update(key.encode())
+                digest.update(np.ascontiguousarray(value).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @classmethod
+    def from_control_system(cls, control_system, output=None, input_labels=INPUT_LABELS):
+        from skfuzzy.control.antecedent_consequent import accumulation_max
+
+        antecedents = list(control_system.antecedents)
+        order = {label: i for i, label in enumerate(input_labels)}
+        antecedents.sort(key=lambda a: order.get(a.label, len(order)))
+        consequents = list(control_system.consequents)
+        if output is None:
+            if len(consequents) != 1:
+                raise ValueError("Control system has several consequents; pass output=")
+            consequent = consequents[0]
+        else:
+            consequent = next((c for c in consequents if c.label == output), None)
+            if consequent is None:
+                raise ValueError(f"Unknown consequent '{output}'")
+
+        if consequent.defuzzify_method != 'centroid':
+            raise ValueError("Only centroid defuzzification is supported")
+        if consequent.accumulation_method not in (accumulation_max, np.fmax):
+            raise ValueError("Only max accumulation is supported")
+
+        term_index = {}
+        input_terms, input_membership = [], []
+        for antecedent in antecedents:
+            labels = list(antecedent.terms)
+            for label in labels:
+                term_index[id(antecedent.terms[label])] = len(term_index)
+            input_terms.append(labels)
+            input_membership.append(np.array([antecedent.terms[l].mf for l in labels]))
+
+        output_terms = list(consequent.terms)
+        output_index = {id(consequent.terms[l]): i for i, l in enumerate(output_terms)}
+
+        rule_labels, rule_clauses = [], []
+        activation_rule, activation_term, activation_weight = [], [], []
+        for rule in control_system.rules:
+            if rule.and_func is not np.fmin or rule.or_func is not np.fmax:
+                raise ValueError(f"Rule {rule.label} uses custom and/or functions")
+            clauses = simplify_cnf(_antecedent_to_cnf(rule.antecedent, term_index))
+            for weighted in rule.consequent:
+                if id(weighted.term) not in output_index:
+                    continue
+                activation_rule.append(len(rule_labels))
+                activation_term.append(output_index[id(weighted.term)])
+                activation_weight.append(weighted.weight)
+            rule_labels.append(rule.label)
+            rule_clauses.append(clauses)
+
+        return cls(
+            input_labels=[a.label for a in antecedents],
+            input_universes=[a.universe for a in antecedents],
+            input_terms=input_terms,
+            input_membership=input_membership,
+            output_label=consequent.label,
+            output_universe=consequent.universe,
+            output_terms=output_terms,
+            output_membership=np.array([consequent.terms[l].mf for l in output_terms]),
+            rule_labels=rule_labels,
+            rule_clauses=rule_clauses,
+            activation_rule=activation_rule,
+            activation_term=activation_term,
+            activation_weight=activation_weight,
+        )
+
+
+# Vertices of the piecewise-linear interpolant of a sampled membership
+# function: the universe ends plus every sample where the slope changes.
+def sampled_vertices(universe, membership):
+    slopes = np.diff(membership) / np.diff(universe)
+    kinks = np.nonzero(~np.isclose(slopes[1:], slopes[:-1], rtol=0, atol=1e-12))[0] + 1
+    keep = np.concatenate([[0], kinks, [len(universe) - 1]])
+    return universe[keep].astype(np.float64), membership[keep].astype(np.float64)
+
+
+# Index of the universe interval each (clipped) x falls in
+def universe_slots(universe, x):
+    return np.clip(np.searchsorted(universe, x, side='right') - 1, 0, len(universe) - 2)
+
+
+# Piecewise-linear interpolation of every row of `membership` at points `x`,
+# identical to np.interp on a clipped input.  Returns shape (terms,) + x.shape.
+def interp_rows(universe, membership, x, idx=None):
+    if idx is None:
+        idx = universe_slots(universe, x)
+    x0 = universe[idx]
+    slope = (membership[:, idx + 1] - membership[:, idx]) / (universe[idx + 1] - x0)
+    return slope * (x - x0) + membership[:, idx]
+
+
+class BatchInferenceEngine:
+    def __init__(self, rule_base, output=None, chunk_size=DEFAULT_CHUNK_SIZE, defuzzifier='sampled',
+                 sparse=True):
+        if not isinstance(rule_base, CompiledRuleBase):
+            rule_base = CompiledRuleBase.from_control_system(rule_base, output)
+        if defuzzifier not in DEFUZZIFIERS:
+            raise ValueError(f"Unknown defuzzifier '{defuzzifier}', expected one of {DEFUZZIFIERS}")
+        self.rule_base = rule_base
+        self.chunk_size = chunk_size
+        self.defuzzifier = defuzzifier
+        if defuzzifier == 'analytic':
+            self._build_breakpoints()
+
+        # With sparse=True only (row, rule) pairs the activation index cannot
+        # rule out are evaluated; the others are exactly 0 anyway, so scores
+        # are identical to full evaluation.
+        self.sparse = sparse
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.rules_evaluated = 0
+        self.rules_skipped = 0
+
+    # Cut-independent breakpoints of the aggregated output (universe ends,
+    # term vertices, crossings of edges of different terms) and the edge
+    # table used to find the cut-dependent ones per row.
+    def _build_breakpoints(self):
+        rb = self.rule_base
+        lo, hi = rb.output_universe[0], rb.output_universe[-1]
+        shapes = [rb.output_vertices[t] for t in np.flatnonzero(rb.output_used)]
+
+        edges = []
+        for term, (x, y) in enumerate(shapes):
+            # Shapes are 0 outside their vertices
+            if y[0] != 0:
+                x, y = np.concatenate([[x[0]], x]), np.concatenate([[0.0], y])
+            if y[-1] != 0:
+                x, y = np.concatenate([x, [x[-1]]]), np.concatenate([y, [0.0]])
+            edges += [(term, x[i], y[i], x[i + 1], y[i + 1]) for i in range(len(x) - 1) if x[i + 1] > x[i]]
+        edges = np.array(edges)
+
+        static = [lo, hi] + [v for x, _ in shapes for v in x]
+        for i, (ti, ax0, ay0, ax1, ay1) in enumerate(edges):
+            for tj, bx0, by0, bx1, by1 in edges[i + 1:]:
+                if ti == tj:
+                    continue
+                left, right = max(ax0, bx0), min(ax1, bx1)
+                if left >= right:
+                    continue
+                # Difference of the two lines is linear on [left, right]
+                da = ay0 + (ay1 - ay0) * (left - ax0) / (ax1 - ax0) - (by0 + (by1 - by0) * (left - bx0) / (bx1 - bx0))
+                db = ay0 + (ay1 - ay0) * (right - ax0) / (ax1 - ax0) - (by0 + (by1 - by0) * (right - bx0) / (bx1 - bx0))
+                if da * db < 0:
+                    static.append(left + da * (right - left) / (da - db))
+
+        self._shapes = shapes
+        self._static_points = np.clip(np.unique(static), lo, hi)
+        sloped = edges[edges[:, 2] != edges[:, 4]]
+        self._edge_x0, self._edge_y0 = sloped[:, 1], sloped[:, 2]
+        self._edge_dxdy = (sloped[:, 3] - sloped[:, 1]) / (sloped[:, 4] - sloped[:, 2])
+        self._edge_ymin = np.minimum(sloped[:, 2], sloped[:, 4])
+        self._edge_ymax = np.maximum(sloped[:, 2], sloped[:, 4])
+
+    @property
+    def input_labels(self):
+        return self.rule_base.input_labels
+
+    # Accepts an (N, n_inputs) array in input_labels order, or a mapping of
+    # label -> 1-D array (e.g. struct-of-arrays columns, read without copying).
+    # Floating-point columns keep their dtype; fuzzify() converts one chunk
+    # at a time.
+    def as_columns(self, inputs):
+        if hasattr(inputs, 'keys'):
+            columns = [np.asarray(inputs[label]).reshape(-1) for label in self.input_labels]
+            columns = [c if c.dtype.kind == 'f' else c.astype(np.float64) for c in columns]
+        else:
+            inputs = np.asarray(inputs, dtype=np.float64)
+            if inputs.ndim == 1:
+                inputs = inputs.reshape(1, -1)
+            if inputs.ndim != 2 or inputs.shape[1] != self.rule_base.n_inputs:
+                raise ValueError(f"Expected an (N, {self.rule_base.n_inputs}) array "
+                                 f"ordered as {self.input_labels}")
+            columns = [inputs[:, i] for i in range(inputs.shape[1])]
+        if len({len(c) for c in columns}) > 1:
+            raise ValueError("All input columns must have the same length")
+        return columns
+
+    # Step 2: Fuzzify - one (N, terms) membership array per input variable.
+    # Also returns the universe slot of every input, for candidate_rules().
+    def fuzzify(self, columns, return_slots=False):
+        rb = self.rule_base
+        memberships, slots = [], []
+        for universe, membership, column in zip(rb.input_universes, rb.input_membership, columns):
+            x = np.clip(np.asarray(column, dtype=np.float64), universe[0], universe[-1])
+            slots.append(universe_slots(universe, x))
+            memberships.append(interp_rows(universe, membership, x, slots[-1]).T)
+        return (memberships, slots) if return_slots else memberships
+
+    # (N, rules) mask of the rules that can fire, from the universe slots
+    # fuzzify() returns and the activation index
+    def candidate_rules(self, slots):
+        rb = self.rule_base
+        packed = None
+        for table, slot in zip(rb.activation_index, slots):
+            packed = table[slot] if packed is None else packed & table[slot]
+        return np.unpackbits(packed, axis=1, count=rb.n_rules, bitorder='little').view(bool)
+
+    @staticmethod
+    def _extended(memberships):
+        mu = np.concatenate(memberships, axis=1)
+        n = mu.shape[0]
+        return np.concatenate([mu, 1.0 - mu, np.zeros((n, 1)), np.ones((n, 1))], axis=1)
+
+    # Firing strengths of the given (row, rule) pairs only
+    def pair_strengths(self, memberships, rows, rules):
+        rb = self.rule_base
+        extended = self._extended(memberships)
+        values = extended.ravel().take(rows[:, None, None] * extended.shape[1] + rb.rule_literals[rules])
+        # max over literals, then min over clauses, one column at a time:
+        # reductions over such short axes are much slower in NumPy
+        clauses = values[:, :, 0].copy()
+        for j in range(1, values.shape[2]):
+            np.maximum(clauses, values[:, :, j], out=clauses)
+        strengths = clauses[:, 0].copy()
+        for k in range(1, clauses.shape[1]):
+            np.minimum(strengths, clauses[:, k], out=strengths)
+        return strengths
+
+    # Step 3: Rule firing strengths, shape (N, rules).
+    def rule_strengths(self, memberships):
+        rb = self.rule_base
+        extended = self._extended(memberships)
+        n = extended.shape[0]
+        clause_values = extended[:, rb.clause_literals].max(axis=2)
+        clause_values = np.concatenate([clause_values, np.ones((n, 1))], axis=1)
+        return clause_values[:, rb.rule_clause_index].min(axis=2)
+
+    # Step 4: Accumulate activations into one cut level per output term.
+    # One max-reduction per output term over its (contiguous) activations;
+    # the same values as np.maximum.at, without its per-element overhead.
+    def output_cuts(self, strengths):
+        rb = self.rule_base
+        order = rb.term_activation_order
+        cuts = np.zeros((strengths.shape[0], len(rb.output_terms)))
+        if len(order):
+            activations = strengths[:, rb.activation_rule[order]] * rb.activation_weight[order]
+            cuts[:, rb.activated_terms] = np.maximum(
+                np.maximum.reduceat(activations, rb.term_activation_start, axis=1), 0.0)
+        return cuts
+
+    # output_cuts() from (row, rule) pairs; rules left out have strength 0
+    # and cannot raise a cut.
+    def pair_cuts(self, n, rows, rules, strengths):
+        rb = self.rule_base
+        counts = rb.rule_activation_count[rules]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        activation = rb.activation_order[np.repeat(rb.rule_activation_start[rules], counts) + offsets]
+        cuts = np.zeros((n, len(rb.output_terms)))
+        np.maximum.at(cuts, (np.repeat(rows, counts), rb.activation_term[activation]),
+                      np.repeat(strengths, counts) * rb.activation_weight[activation])
+        return cuts
+
+    # Step 5: Centroid of the clipped, max-aggregated output sets.
+    def defuzzify(self, cuts):
+        if self.defuzzifier == 'analytic':
+            return self.defuzzify_analytic(cuts)
+        return self.defuzzify_sampled(cuts)
+
+    def defuzzify_sampled(self, cuts):
+        rb = self.rule_base
+        universe, membership = rb.output_universe, rb.output_membership
+        used = rb.output_used
+        n = cuts.shape[0]
+
+        c = cuts[:, used]
+        mf = membership[used]
+        grid_values = np.minimum(c[:, :, None], mf[None]).max(axis=1)
+
+        # Universe points where each used term crosses its cut level; skfuzzy
+        # inserts exactly these into the universe before integrating.
+        level = c[:, :, None]
+        above = np.where(level == 0, mf > level, mf >= level)
+        rows, terms, segments = np.nonzero(above[..., 1:] != above[..., :-1])
+        m1, m2 = mf[terms, segments], mf[terms, segments + 1]
+        x0, x1 = universe[segments], universe[segments + 1]
+        crossings = x0 + (c[rows, terms] - m1) * (x1 - x0) / (m2 - m1)
+
+        counts = np.bincount(rows, minlength=n)
+        width = int(counts.max(initial=0))
+        slot = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        x_cross = np.full((n, width), universe[-1])
+        x_cross[rows, slot] = crossings
+        cross_values = np.minimum(c.T[:, :, None], interp_rows(universe, mf, x_cross)).max(axis=0)
+
+        points = np.concatenate([np.broadcast_to(universe, (n, len(universe))), x_cross], axis=1)
+        aggregated = np.concatenate([grid_values, cross_values], axis=1)
+        order = np.argsort(points, axis=1, kind='stable')
+        points = np.take_along_axis(points, order, axis=1)
+        aggregated = np.take_along_axis(aggregated, order, axis=1)
+
+        x1, x2 = points[:, :-1], points[:, 1:]
+        y1, y2 = aggregated[:, :-1], aggregated[:, 1:]
+        dx = x2 - x1
+        area = (0.5 * dx * (y1 + y2)).sum(axis=1)
+        moment = (dx / 6.0 * (y1 * (2.0 * x1 + x2) + y2 * (x1 + 2.0 * x2))).sum(axis=1)
+
+        total = aggregated.sum(axis=1)
+        result = moment / np.fmax(area, np.finfo(float).eps)
+        result[total == 0] = np.nan
+        return result
+
+    # The aggregate max_t min(cut_t, mf_t(x)) is linear between consecutive
+    # breakpoints: the static ones plus the points where an edge reaches
+    # some term's cut level.  Trapezoid moments over those intervals give
+    # the exact centroid of the continuous shapes.
+    def defuzzify_analytic(self, cuts):
+        rb = self.rule_base
+        c = cuts[:, rb.output_used]
+        n = c.shape[0]
+        lo, hi = self._static_points[0], self._static_points[-1]
+
+        level = c[:, None, :]
+        x = self._edge_x0[None, :, None] + (level - self._edge_y0[None, :, None]) * self._edge_dxdy[None, :, None]
+        valid = (level >= self._edge_ymin[None, :, None]) & (level <= self._edge_ymax[None, :, None])
+        dynamic = np.clip(np.where(valid, x, lo), lo, hi).reshape(n, -1)
+
+        points = np.sort(np.concatenate([np.broadcast_to(self._static_points, (n, len(self._static_points))),
+                                         dynamic], axis=1), axis=1)
+        aggregated = np.zeros_like(points)
+        for t, (vx, vy) in enumerate(self._shapes):
+            np.maximum(aggregated, np.minimum(c[:, t:t + 1], np.interp(points, vx, vy, left=0.0, right=0.0)),
+                       out=aggregated)
+
+        x1, x2 = points[:, :-1], points[:, 1:]
+        y1, y2 = aggregated[:, :-1], aggregated[:, 1:]
+        dx = x2 - x1
+        area = (0.5 * dx * (y1 + y2)).sum(axis=1)
+        moment = (dx / 6.0 * (y1 * (2.0 * x1 + x2) + y2 * (x1 + 2.0 * x2))).sum(axis=1)
+
+        result = moment / np.fmax(area, np.finfo(float).eps)
+        result[c.max(axis=1, initial=0.0) == 0] = np.nan
+        return result
+
+    # With a candidate mask only those (row, rule) pairs are evaluated.
+    def infer(self, memberships, candidates=None):
+        if candidates is None:
+            return self.defuzzify(self.output_cuts(self.rule_strengths(memberships)))
+        rows, rules = np.nonzero(candidates)
+        strengths = self.pair_strengths(memberships, rows, rules)
+        return self.defuzzify(self.pair_cuts(len(candidates), rows, rules, strengths))
+
+    def compute(self, inputs):
+        columns = self.as_columns(inputs)
+        n = len(columns[0])
+        result = np.empty(n, dtype=np.float64)
+        evaluated = 0
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            memberships, slots = self.fuzzify([c[start:stop] for c in columns], return_slots=True)
+            candidates = self.candidate_rules(slots) if self.sparse and stop - start >= SPARSE_MIN_ROWS else None
+            evaluated += (stop - start) * self.rule_base.n_rules if candidates is None else int(candidates.sum())
+            result[start:stop] = self.infer(memberships, candidates)
+        with self._stats_lock:
+            self.calls += 1
+            self.rules_evaluated += evaluated
+            self.rules_skipped += n * self.rule_base.n_rules - evaluated
+        return result
+
+    # Rule evaluations done and skipped by the activation index so far
+    def sparsity_stats(self):
+        with self._stats_lock:
+            total = self.rules_evaluated + self.rules_skipped
+            return {
+                'calls': self.calls,
+                'rules_evaluated': self.rules_evaluated,
+                'rules_skipped': self.rules_skipped,
+                'skipped_per_call': self.rules_skipped / self.calls if self.calls else 0.0,
+                'skipped_fraction': self.rules_skipped / total if total else 0.0,
+            }
+
+    def compute_one(self, **inputs):
+        return float(self.compute({label: [inputs[label]] for label in self.input_labels})[0])
+
+    # Drop-in for setting sim.input[...] and reading sim.output[label]: raises
+    # KeyError when no rule fires, exactly like the skfuzzy simulation.  The
+    # engine holds no per-call state, so one instance can serve any number of
+    # threads concurrently.
+    def score(self, **inputs):
+        value = self.compute_one(**inputs)
+        if np.isnan(value):
+            raise KeyError(self.rule_base.output_label)
+        return value
+
+
+def compare_with_simulation(engine, control_system, samples, seed=0):
+    from skfuzzy import control as ctrl
+
+    rng = np.random.default_rng(seed)
+    rb = engine.rule_base
+    low = [u[0] for u in rb.input_universes]
+    high = [u[-1] for u in rb.input_universes]
+    inputs = rng.uniform(low, high, size=(samples, rb.n_inputs))
+
+    batch = engine.compute(inputs)
+    sim = ctrl.ControlSystemSimulation(control_system)
+    reference = np.full(samples, np.nan)
+    for i, row in enumerate(inputs):
+        for label, value in zip(rb.input_labels, row):
+            sim.input[label] = value
+        sim.compute()
+        reference[i] = sim.output.get(rb.output_label, np.nan)
+
+    coverage_mismatch = int((np.isnan(batch) != np.isnan(reference)).sum())
+    both = ~np.isnan(batch) & ~np.isnan(reference)
+    max_error = float(np.abs(batch[both] - reference[both]).max(initial=0.0))
+    return max_error, coverage_mismatch
+
+
+if __name__ == '__main__':
+    import time
+    from app import waste_ctrl
+
+    inputs = np.random.default_rng(1).uniform(0, 100, size=(50000, 5))
+    for defuzzifier, tolerance in (('sampled', MATCH_TOLERANCE), ('analytic', ANALYTIC_TOLERANCE)):
+        engine = BatchInferenceEngine(waste_ctrl, defuzzifier=defuzzifier)
+        max_error, coverage_mismatch = compare_with_simulation(engine, waste_ctrl, 300)
+        print(f"[{defuzzifier}] Max |batch - waste_sim| over 300 random inputs: {max_error:.3e} "
+              f"(tolerance {tolerance:.0e}), coverage mismatches: {coverage_mismatch}")
+
+        start = time.perf_counter()
+        engine.compute(inputs)
+        elapsed = time.perf_counter() - start
+        print(f"[{defuzzifier}] Scored {len(inputs)} bins in {elapsed:.2f}s ({len(inputs) / elapsed:,.0f} bins/s)")
+
+    stats = engine.sparsity_stats()
+    print(f"Activation index skipped {stats['skipped_fraction']:.1%} of rule evaluations "
+          f"({stats['skipped_per_call']:,.0f} per call)")
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+from batchInference import BatchInferenceEngine
+from ruleSpec import VARIANTS, build_control_system, load_compiled
+
+# Reproducible benchmark harness.
+#
+# Groups:
+#   fuzzy    - waste_sim.compute() for every rule-base variant in ruleSpec,
+#              next to the compiled batch engine (single call and bulk)
+#   xgboost  - single-row vs. bulk best_model.predict and the answer table
+#   http     - the Flask '/' and '/predict' routes under a local test client
+#
+# All inputs come from a seeded RNG.  Results are written as JSON; pass a
+# previous run as --baseline to print per-benchmark ratios and flag
+# regressions beyond --tolerance.
+
+INPUT_LABELS = ('fullness', 'toxicity', 'moisture', 'odor', 'weather')
+
+
+# Calls fn(i) for i in range(iterations) after `warmup` untimed calls and
+# summarizes per-call latency.  `items` is the number of scores per call,
+# so throughput is comparable between single and bulk benchmarks.
+def measure(fn, iterations, warmup=3, items=1):
+    for i in range(warmup):
+        fn(i)
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter_ns()
+        fn(i)
+        samples[i] = time.perf_counter_ns() - start
+    samples /= 1e3  # microseconds
+    return {
+        'iterations': iterations,
+        'items_per_call': items,
+        'mean_us': float(samples.mean()),
+        'p50_us': float(np.percentile(samples, 50)),
+        'p90_us': float(np.percentile(samples, 90)),
+        'p99_us': float(np.percentile(samples, 99)),
+        'max_us': float(samples.max()),
+        'throughput_per_s': float(items * 1e6 / samples.mean()),
+    }
+
+
+def random_inputs(count, seed):
+    return np.random.default_rng(seed).uniform(0, 100, size=(count, len(INPUT_LABELS)))
+
+
+def bench_fuzzy(iterations, bulk_size, seed):
+    results = {}
+    inputs = random_inputs(iterations + 3, seed)
+    bulk = random_inputs(bulk_size, seed + 1)
+    for name, spec in VARIANTS.items():
+        waste_sim = build_control_system(spec)['waste_sim']
+
+        def compute(i):
+            for label, value in zip(INPUT_LABELS, inputs[i]):
+                waste_sim.input[label] = value
+            waste_sim.compute()
+
+        engine = BatchInferenceEngine(load_compiled(spec))
+        results[f'fuzzy.{name}.waste_sim.compute'] = measure(compute, iterations)
+        results[f'fuzzy.{name}.engine.compute_one'] = measure(
+            lambda i: engine.compute(inputs[i:i + 1]), iterations)
+        results[f'fuzzy.{name}.engine.compute_bulk'] = measure(
+            lambda i: engine.compute(bulk), max(iterations // 10, 3), items=bulk_size)
+    return results
+
+
+def bench_xgboost(iterations, model_path):
+    try:
+        import pandas as pd
+        import XGBoostML
+    except ImportError as e:
+        print(f"Skipping xgboost benchmarks: {e}")
+        return {}
+
+    if not os.path.exists(model_path):
+        print(f"No saved model at {model_path}; training one first.")
+        XGBoostML.save_model(XGBoostML.train_model(), model_path)
+    best_model = XGBoostML.load_model(model_path)
+
+    grid = XGBoostML.build_dataset().drop(columns=['urgency'])
+    rows = [grid.iloc[[i]] for i in range(iterations + 3)]
+    codes = grid.to_numpy().T
+    answer_table = XGBoostML.build_answer_table(best_model)
+    return {
+        'xgboost.predict_single_row': measure(lambda i: best_model.predict(rows[i]), iterations),
+        'xgboost.predict_single_row_dataframe_build': measure(
+            lambda i: best_model.predict(pd.DataFrame({c: [rows[i][c].iat[0]] for c in grid.columns})),
+            iterations),
+        'xgboost.predict_bulk': measure(lambda i: best_model.predict(grid), max(iterations // 10, 3),
+                                        items=len(grid)),
+        'xgboost.answer_table_bulk': measure(lambda i: XGBoostML.predict_codes(answer_table, *codes),
+                                             iterations, items=len(grid)),
+    }
+
+
+def bench_http(iterations, seed):
+    import app as form_app
+    import wastedisposalDiffMembership as json_app
+
+    rng = np.random.default_rng(seed)
+    forms = [{
+        'fullness': str(int(rng.integers(0, 101))),
+        'toxicity': str(rng.choice(list(form_app.toxicity_mapping))),
+        'moisture': str(rng.choice(list(form_app.moisture_mapping))),
+        'odor': str(rng.choice(list(form_app.odor_mapping))),
+        'weather': str(rng.choice(list(form_app.weather_mapping))),
+    } for _ in range(iterations + 3)]
+    readings = [dict(zip(INPUT_LABELS, row.round(2).tolist())) for row in random_inputs(iterations + 3, seed)]
+
+    form_client = form_app.app.test_client()
+    json_client = json_app.app.test_client()
+    return {
+        'http.form.GET': measure(lambda i: form_client.get('/'), iterations),
+        'http.form.POST': measure(lambda i: form_client.post('/', data=forms[i]), iterations),
+        'http.predict.POST': measure(lambda i: json_client.post('/predict', json=readings[i]), iterations),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'benchmark':<50} {'baseline p50':>14} {'current p50':>14} {'ratio':>7}")
+    for name, current in sorted(results.items()):
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        ratio = current['p50_us'] / previous['p50_us']
+        flag = '  REGRESSION' if ratio > 1 + tolerance else ''
+        print(f"{name:<50} {previous['p50_us']:>12.1f}us {current['p50_us']:>12.1f}us {ratio:>7.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy inference, XGBoost and the HTTP layer")
+    parser.add_argument('--groups', nargs='+', choices=['fuzzy', 'xgboost', 'http'],
+                        default=['fuzzy', 'xgboost', 'http'])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--bulk-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', default='xgboost_urgency.json', help="saved XGBoost model")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed p50 slowdown ratio")
+    args = parser.parse_args()
+
+    results = {}
+    if 'fuzzy' in args.groups:
+        results.update(bench_fuzzy(args.iterations, args.bulk_size, args.seed))
+    if 'xgboost' in args.groups:
+        results.update(bench_xgboost(args.iterations, args.model))
+    if 'http' in args.groups:
+        results.update(bench_http(args.iterations, args.seed))
+
+    for name, stats in results.items():
+        print(f"{name:<50} p50 {stats['p50_us']:>10.1f}us  p99 {stats['p99_us']:>10.1f}us  "
+              f"{stats['throughput_per_s']:>12,.0f}/s")
+
+    report = {
+        'environment': {
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+        },
+        'config': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        sys.exit(1 if regressions else 0)
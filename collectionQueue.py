@@ -0,0 +1,323 @@
+import argparse
+import heapq
+import math
+import time
+
+import numpy as np
+
+from ruleSpec import THRESHOLD
+
+# Collection priority queue: the K most urgent bins per zone, kept up to
+# date as urgency updates arrive, instead of sorting every score on each
+# dispatch request.
+#
+# Each zone owns an IndexedMaxHeap: two parallel lists (bin keys and
+# urgencies, in binary heap order) plus a key -> position dict, so a bin's
+# urgency can be raised, lowered or removed (bin emptied) in O(log n).
+# top(k) walks the heap best-first with a small frontier heap and never
+# touches more than 2k entries, O(k log k) regardless of fleet size; the
+# fleet-wide top(k) walks all zone heaps with one frontier.  An optional
+# threshold (e.g. app.py's 85 cut-off) stops the walk early.
+#
+# A bin whose urgency is NaN (no rule fires) is not queued.  Bulk loads sort
+# each zone once with numpy: a descending array is already a valid max-heap.
+# snapshot() returns numpy copies of every zone's heap arrays, which can be
+# saved with np.savez and restored without re-heapifying.
+
+
+class IndexedMaxHeap:
+    def __init__(self, keys=(), priorities=()):
+        # keys/priorities must already be in heap order (see from_arrays)
+        self.keys = list(keys)
+        self.priorities = list(priorities)
+        self.position = {key: i for i, key in enumerate(self.keys)}
+
+    @classmethod
+    def from_arrays(cls, keys, priorities):
+        order = np.argsort(-np.asarray(priorities, dtype=np.float64), kind='stable')
+        return cls(np.asarray(keys)[order].tolist(), np.asarray(priorities, dtype=np.float64)[order].tolist())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.position
+
+    def get(self, key, default=None):
+        i = self.position.get(key)
+        return default if i is None else self.priorities[i]
+
+    def _move(self, i, key, priority):
+        self.keys[i] = key
+        self.priorities[i] = priority
+        self.position[key] = i
+
+    def _sift_up(self, i):
+        keys, priorities = self.keys, self.priorities
+        key, priority = keys[i], priorities[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if priorities[parent] >= priority:
+                break
+            self._move(i, keys[parent], priorities[parent])
+            i = parent
+        self._move(i, key, priority)
+
+    def _sift_down(self, i):
+        keys, priorities = self.keys, self.priorities
+        key, priority = keys[i], priorities[i]
+        n = len(keys)
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and priorities[child + 1] > priorities[child]:
+                child += 1
+            if priorities[child] <= priority:
+                break
+            self._move(i, keys[child], priorities[child])
+            i = child
+        self._move(i, key, priority)
+
+    # Inserts the key or changes its priority
+    def push(self, key, priority):
+        i = self.position.get(key)
+        if i is None:
+            self.keys.append(key)
+            self.priorities.append(priority)
+            self.position[key] = len(self.keys) - 1
+            self._sift_up(len(self.keys) - 1)
+        elif priority > self.priorities[i]:
+            self.priorities[i] = priority
+            self._sift_up(i)
+        elif priority < self.priorities[i]:
+            self.priorities[i] = priority
+            self._sift_down(i)
+
+    # Removes the key and returns its priority; KeyError when absent
+    def remove(self, key):
+        i = self.position.pop(key)
+        priority = self.priorities[i]
+        last_key, last_priority = self.keys.pop(), self.priorities.pop()
+        if i < len(self.keys):
+            self._move(i, last_key, last_priority)
+            if last_priority > priority:
+                self._sift_up(i)
+            else:
+                self._sift_down(i)
+        return priority
+
+    def peek(self):
+        return (self.keys[0], self.priorities[0]) if self.keys else None
+
+    def pop(self):
+        key, priority = self.peek()
+        self.remove(key)
+        return key, priority
+
+    # The k highest (key, priority) pairs, highest first, without modifying
+    # the heap
+    def top(self, k, threshold=-math.inf):
+        return best_first([self], k, threshold)
+
+
+# The k highest (key, priority) pairs over several heaps.  The frontier
+# starts at every root, and only children of already returned entries are
+# examined: O((k + heaps) log(k + heaps)).
+def best_first(heaps, k, threshold=-math.inf):
+    frontier = [(-heap.priorities[0], h, 0) for h, heap in enumerate(heaps)
+                if heap.keys and heap.priorities[0] >= threshold]
+    heapq.heapify(frontier)
+    result = []
+    while frontier and len(result) < k:
+        negative, h, i = heapq.heappop(frontier)
+        heap = heaps[h]
+        result.append((heap.keys[i], -negative))
+        priorities, n = heap.priorities, len(heap.keys)
+        for child in (2 * i + 1, 2 * i + 2):
+            if child < n and priorities[child] >= threshold:
+                heapq.heappush(frontier, (-priorities[child], h, child))
+    return result
+
+
+class CollectionQueue:
+    def __init__(self):
+        self.zones = {}
+        self.zone_of = {}
+        self.counts = {'updates': 0, 'removals': 0}
+
+    @classmethod
+    def from_arrays(cls, keys, urgency, zones):
+        queue = cls()
+        keys, urgency, zones = np.asarray(keys), np.asarray(urgency, dtype=np.float64), np.asarray(zones)
+        queued = ~np.isnan(urgency)
+        keys, urgency, zones = keys[queued], urgency[queued], zones[queued]
+        order = np.argsort(zones, kind='stable')
+        bounds = np.flatnonzero(np.diff(zones[order])) + 1
+        for group in np.split(order, bounds) if len(order) else []:
+            zone = zones[group[0]].item()
+            queue.zones[zone] = IndexedMaxHeap.from_arrays(keys[group], urgency[group])
+            queue.zone_of.update(dict.fromkeys(keys[group].tolist(), zone))
+        return queue
+
+    # Rows of a fleetStore.FleetStore, keyed by row number
+    @classmethod
+    def from_store(cls, store):
+        return cls.from_arrays(np.arange(len(store)), store['urgency'], store['zone'])
+
+    def __len__(self):
+        return len(self.zone_of)
+
+    def __contains__(self, key):
+        return key in self.zone_of
+
+    def urgency(self, key):
+        zone = self.zone_of.get(key)
+        return None if zone is None else self.zones[zone].get(key)
+
+    # A new urgency for a bin, optionally moving it to another zone.  NaN
+    # (no rule fires) takes the bin out of the queue.
+    def update(self, key, urgency, zone=None):
+        current = self.zone_of.get(key)
+        zone = current if zone is None else zone
+        if zone is None:
+            raise KeyError(key)
+        if math.isnan(urgency):
+            if current is not None:
+                self.remove(key)
+            return
+        if current is not None and current != zone:
+            self.zones[current].remove(key)
+        heap = self.zones.get(zone)
+        if heap is None:
+            heap = self.zones[zone] = IndexedMaxHeap()
+        heap.push(key, float(urgency))
+        self.zone_of[key] = zone
+        self.counts['updates'] += 1
+
+    def update_many(self, keys, urgencies, zones=None):
+        zones = [None] * len(keys) if zones is None else zones
+        for key, urgency, zone in zip(keys, urgencies, zones):
+            self.update(key, float(urgency), zone)
+
+    # The bin was emptied (or decommissioned); returns its last urgency
+    def remove(self, key):
+        zone = self.zone_of.pop(key)
+        self.counts['removals'] += 1
+        return self.zones[zone].remove(key)
+
+    def discard(self, key):
+        if key in self.zone_of:
+            self.remove(key)
+
+    # The k most urgent (key, urgency) pairs of one zone, or of all zones
+    # when zone is None
+    def top(self, k, zone=None, threshold=-math.inf):
+        if zone is not None:
+            heap = self.zones.get(zone)
+            return heap.top(k, threshold) if heap is not None else []
+        return best_first(list(self.zones.values()), k, threshold)
+
+    def top_by_zone(self, k, threshold=-math.inf):
+        return {zone: heap.top(k, threshold) for zone, heap in self.zones.items()}
+
+    # Point-in-time copy of the queue: per zone, keys and urgencies in heap
+    # order.  Later updates do not affect it.
+    def snapshot(self):
+        return {zone: (np.array(heap.keys), np.array(heap.priorities)) for zone, heap in self.zones.items()}
+
+    @classmethod
+    def restore(cls, snapshot):
+        queue = cls()
+        for zone, (keys, urgencies) in snapshot.items():
+            queue.zones[zone] = IndexedMaxHeap(keys.tolist(), urgencies.tolist())
+            queue.zone_of.update(dict.fromkeys(keys.tolist(), zone))
+        return queue
+
+    def save(self, path):
+        arrays = {}
+        for zone, (keys, urgencies) in self.snapshot().items():
+            arrays[f'keys_{zone}'], arrays[f'urgency_{zone}'] = keys, urgencies
+        np.savez(path, zones=np.array(list(self.zones)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls.restore({zone: (data[f'keys_{zone}'], data[f'urgency_{zone}'])
+                                for zone in data['zones'].tolist()})
+
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start) / repeats, result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the per-zone collection priority queue")
+    parser.add_argument('--bins', type=int, default=1_000_000)
+    parser.add_argument('--zones', type=int, default=50)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--updates', type=int, default=100_000)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--store', help="build the queue from a fleetStore directory instead of random scores")
+    parser.add_argument('--snapshot', help="save a snapshot .npz here and check that it restores")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.store:
+        from fleetStore import FleetStore
+
+        store = FleetStore.open(args.store, mode='r')
+        keys, urgency, zones = np.arange(len(store)), np.asarray(store['urgency']), np.asarray(store['zone'])
+    else:
+        keys = np.arange(args.bins)
+        urgency = rng.uniform(0, 100, size=args.bins).round(2)
+        urgency[rng.random(args.bins) < 0.1] = np.nan
+        zones = rng.integers(args.zones, size=args.bins)
+
+    # Step 1: Bulk load
+    start = time.perf_counter()
+    queue = CollectionQueue.from_arrays(keys, urgency, zones)
+    print(f"loaded {len(queue):,} queued bins in {len(queue.zones)} zones in {time.perf_counter() - start:.2f}s")
+
+    # Step 2: Streamed updates and removals (10% of events empty a bin)
+    queued = np.array(list(queue.zone_of))
+    targets = rng.choice(queued, size=args.updates)
+    values = rng.uniform(0, 100, size=args.updates).round(2)
+    emptied = rng.random(args.updates) < 0.1
+    start = time.perf_counter()
+    for key, value, empty in zip(targets.tolist(), values.tolist(), emptied.tolist()):
+        if empty:
+            queue.discard(key)
+        elif key in queue:
+            queue.update(key, value)
+    elapsed = time.perf_counter() - start
+    print(f"{args.updates:,} updates/removals in {elapsed:.2f}s ({elapsed / args.updates * 1e6:.1f}us each)")
+
+    # Step 3: Top-K queries against a full sort of the current scores
+    zone = next(iter(queue.zones))
+    per_zone, top_zone = timed(lambda: queue.top(args.k, zone), 1000)
+    fleet, top_fleet = timed(lambda: queue.top(args.k, threshold=args.threshold), 100)
+    current_keys = np.array(list(queue.zone_of))
+    current = np.array([queue.urgency(key) for key in current_keys.tolist()])
+    in_zone = np.array([queue.zone_of[key] == zone for key in current_keys.tolist()])
+    full_sort, expected = timed(lambda: np.sort(current[in_zone])[::-1][:args.k], 10)
+    assert np.array_equal([u for _, u in top_zone], expected)
+    expected_fleet = np.sort(current[current >= args.threshold])[::-1][:args.k]
+    assert np.array_equal([u for _, u in top_fleet], expected_fleet)
+    print(f"top-{args.k} of zone {zone}: {per_zone * 1e6:.1f}us (full sort of the zone: {full_sort * 1e3:.2f}ms)")
+    print(f"top-{args.k} >= {args.threshold:g} over all zones: {fleet * 1e3:.3f}ms, "
+          f"most urgent {top_fleet[0] if top_fleet else None}")
+
+    # Step 4: Snapshot round trip
+    start = time.perf_counter()
+    snapshot = queue.snapshot()
+    print(f"snapshot of {len(queue):,} bins in {(time.perf_counter() - start) * 1e3:.1f}ms")
+    if args.snapshot:
+        queue.save(args.snapshot)
+        restored = CollectionQueue.load(args.snapshot)
+        assert restored.top_by_zone(args.k) == queue.top_by_zone(args.k)
+        print(f"saved and restored -> {args.snapshot}")
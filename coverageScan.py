@@ -0,0 +1,329 @@
+import argparse
+import itertools
+import json
+import re
+import time
+
+import numpy as np
+
+from batchInference import BatchInferenceEngine, interp_rows
+from ruleSpec import VARIANTS, load_compiled
+
+# Exhaustive rule-coverage scan of a compiled rule base.
+#
+# Whether a rule fires (strength > 0) only depends on which literals are
+# non-zero: a clause is non-zero when one of its literals is, a rule when all
+# of its clauses are.  Along each input axis the grid is therefore split into
+# runs of consecutive points over which every term keeps the same
+# (mu > 0, mu < 1) signature, and the rule base is evaluated once per
+# combination of runs instead of once per grid point.  With the 0..100 integer
+# grid that turns 101**5 (about 1e10) points into a few hundred thousand
+# cells, each weighted by the number of grid points it stands for, and the
+# result is exact on the grid, not sampled.
+#
+# Reported per variant:
+#   * dead zones: grid points where no rule fires, i.e. where the engine
+#     returns NaN and waste_sim.compute() raises the KeyError app.py turns
+#     into "Please check your rule coverage"
+#   * fallback-only zones: points where the only rules firing are the
+#     fallback rules (fallback_rule, rule_default, ...)
+#   * rule coverage: points where each rule fires, and where it fires alone
+#   * rule conflicts found from the antecedents themselves: identical
+#     antecedents (contradictions when the consequents differ), rules
+#     implied by another rule, and near duplicates that differ in one clause
+#   * full-strength conflicts: rules with different consequents that are
+#     both fully true (strength 1) at the same grid point
+# Zones are reported as boxes of input ranges, largest first.
+
+DEFAULT_RESOLUTION = 101
+
+# Rules that only exist to patch coverage gaps
+FALLBACK_PATTERN = re.compile(r'fallback|default')
+
+
+# Step 1: Split each input axis into runs of points with the same signature.
+# Returns, per run, the first and last grid value, the number of points and
+# whether each of the variable's terms is > 0 and == 1 there.
+def axis_runs(universe, membership, resolution):
+    grid = np.linspace(universe[0], universe[-1], resolution)
+    mu = interp_rows(universe, membership, grid)
+    signature = np.concatenate([mu > 0, mu < 1])
+    starts = np.concatenate([[0], np.nonzero((signature[:, 1:] != signature[:, :-1]).any(axis=0))[0] + 1])
+    stops = np.concatenate([starts[1:], [resolution]])
+    return {
+        'low': grid[starts],
+        'high': grid[stops - 1],
+        'points': stops - starts,
+        'positive': (mu > 0)[:, starts].T,
+        'full': (mu == 1)[:, starts].T,
+    }
+
+
+# Step 2: Per variable, the part of every clause that variable contributes:
+# (runs, clauses) tables of "some literal of this variable in the clause is
+# > 0" and "... is 1".  A negated literal is > 0 where mu < 1 and 1 where
+# mu == 0.
+def clause_parts(rule_base, runs):
+    parts = []
+    for v, axis in enumerate(runs):
+        first, stop = rule_base.term_offsets[v], rule_base.term_offsets[v + 1]
+        positive = np.zeros((len(axis['points']), len(rule_base.clauses)), dtype=bool)
+        full = np.zeros_like(positive)
+        for c, clause in enumerate(rule_base.clauses):
+            for literal in clause:
+                term = literal if literal >= 0 else -literal - 1
+                if not first <= term < stop:
+                    continue
+                if literal >= 0:
+                    positive[:, c] |= axis['positive'][:, term - first]
+                    full[:, c] |= axis['full'][:, term - first]
+                else:
+                    positive[:, c] |= ~axis['full'][:, term - first]
+                    full[:, c] |= ~axis['positive'][:, term - first]
+        parts.append((positive, full))
+    return parts
+
+
+# Step 3: Evaluate every cell, one run of the first variable at a time.
+# Returns (cells..., rules) masks of the rules that fire and of the rules
+# that are fully true, plus the grid points per cell.
+def evaluate_cells(rule_base, runs, parts):
+    d = len(runs)
+    shape = tuple(len(axis['points']) for axis in runs)
+    fires = np.empty(shape + (rule_base.n_rules,), dtype=bool)
+    full = np.empty_like(fires)
+    one_clause = np.ones(shape[1:] + (1,), dtype=bool)
+
+    def broadcast(table, v):
+        return table.reshape((1,) * (v - 1) + (table.shape[0],) + (1,) * (d - v - 1) + (table.shape[1],))
+
+    for i in range(shape[0]):
+        clause_positive = parts[0][0][i]
+        clause_full = parts[0][1][i]
+        for v in range(1, d):
+            clause_positive = clause_positive | broadcast(parts[v][0], v)
+            clause_full = clause_full | broadcast(parts[v][1], v)
+        # The padding clause of rule_clause_index is always true
+        clause_positive = np.concatenate([np.broadcast_to(clause_positive, shape[1:] + clause_positive.shape[-1:]),
+                                          one_clause], axis=-1)
+        clause_full = np.concatenate([np.broadcast_to(clause_full, shape[1:] + clause_full.shape[-1:]),
+                                      one_clause], axis=-1)
+        fires[i] = clause_positive[..., rule_base.rule_clause_index].all(axis=-1)
+        full[i] = clause_full[..., rule_base.rule_clause_index].all(axis=-1)
+
+    points = np.ones(shape, dtype=np.int64)
+    for v, axis in enumerate(runs):
+        points *= axis['points'].reshape((1,) * v + (-1,) + (1,) * (d - v - 1))
+    return fires, full, points
+
+
+# Step 4: Merge marked cells into boxes, one axis at a time: cells that agree
+# on every other axis and are adjacent along this one become one box.
+def coalesce(mask):
+    boxes = [tuple((i, i) for i in index) for index in np.argwhere(mask).tolist()]
+    for axis in reversed(range(mask.ndim)):
+        groups = {}
+        for box in boxes:
+            groups.setdefault(box[:axis] + box[axis + 1:], []).append(box[axis])
+        boxes = []
+        for key, spans in groups.items():
+            spans.sort()
+            merged = [list(spans[0])]
+            for low, high in spans[1:]:
+                if low == merged[-1][1] + 1:
+                    merged[-1][1] = high
+                else:
+                    merged.append([low, high])
+            boxes += [key[:axis] + (tuple(span),) + key[axis:] for span in merged]
+    return boxes
+
+
+def describe_boxes(boxes, runs, labels):
+    described = []
+    for box in boxes:
+        ranges, points = {}, 1
+        for label, axis, (low, high) in zip(labels, runs, box):
+            ranges[label] = [float(axis['low'][low]), float(axis['high'][high])]
+            points *= int(axis['points'][low:high + 1].sum())
+        described.append({'ranges': ranges, 'points': points})
+    return sorted(described, key=lambda box: -box['points'])
+
+
+def rule_consequents(rule_base):
+    consequents = [[] for _ in range(rule_base.n_rules)]
+    for r, t, w in zip(rule_base.activation_rule, rule_base.activation_term, rule_base.activation_weight):
+        consequents[r].append(rule_base.output_terms[t] if w == 1 else f"{rule_base.output_terms[t]}@{w:g}")
+    return [tuple(sorted(c)) for c in consequents]
+
+
+# Step 5: Conflicts visible from the antecedents alone.  With rules in CNF,
+# rule a implies rule b (strength_a <= strength_b everywhere) when every
+# clause of b contains some clause of a.
+def rule_conflicts(rule_base, near_distance=1):
+    labels = rule_base.rule_labels
+    consequents = rule_consequents(rule_base)
+    clause_sets = [frozenset(clauses) for clauses in rule_base.rule_clauses]
+    found = []
+    for a, b in itertools.combinations(range(rule_base.n_rules), 2):
+        entry = {'rules': [labels[a], labels[b]], 'consequents': [list(consequents[a]), list(consequents[b])],
+                 'conflict': consequents[a] != consequents[b]}
+        if clause_sets[a] == clause_sets[b]:
+            found.append(dict(entry, kind='contradiction' if entry['conflict'] else 'duplicate'))
+            continue
+        a_implies_b = all(any(ca <= cb for ca in clause_sets[a]) for cb in clause_sets[b])
+        b_implies_a = all(any(cb <= ca for cb in clause_sets[b]) for ca in clause_sets[a])
+        if a_implies_b or b_implies_a:
+            specific, general = (a, b) if a_implies_b else (b, a)
+            found.append(dict(entry, kind='implied', rules=[labels[specific], labels[general]],
+                              consequents=[list(consequents[specific]), list(consequents[general])]))
+            continue
+        if len(clause_sets[a]) == len(clause_sets[b]) and len(clause_sets[a] - clause_sets[b]) <= near_distance:
+            found.append(dict(entry, kind='near_duplicate',
+                              differs=[sorted(map(sorted, clause_sets[a] - clause_sets[b])),
+                                       sorted(map(sorted, clause_sets[b] - clause_sets[a]))]))
+    return found
+
+
+def literal_names(rule_base):
+    names = [f"{label}[{term}]" for label, terms in zip(rule_base.input_labels, rule_base.input_terms)
+             for term in terms]
+    return lambda literal: names[literal] if literal >= 0 else f"~{names[-literal - 1]}"
+
+
+def scan(rule_base, resolution=DEFAULT_RESOLUTION, fallback=None, near_distance=1):
+    labels = rule_base.rule_labels
+    if fallback is None:
+        fallback = [label for label in labels if FALLBACK_PATTERN.search(label)]
+    is_fallback = np.isin(labels, list(fallback))
+
+    start = time.perf_counter()
+    runs = [axis_runs(u, m, resolution) for u, m in zip(rule_base.input_universes, rule_base.input_membership)]
+    fires, full, points = evaluate_cells(rule_base, runs, clause_parts(rule_base, runs))
+
+    dead = ~fires.any(axis=-1)
+    fallback_only = fires[..., is_fallback].any(axis=-1) & ~fires[..., ~is_fallback].any(axis=-1)
+    alone = fires & (fires.sum(axis=-1, keepdims=True) == 1)
+    weights = points[..., None]
+    rule_points = (fires * weights).reshape(-1, len(labels)).sum(axis=0)
+    alone_points = (alone * weights).reshape(-1, len(labels)).sum(axis=0)
+
+    # Points where two rules are both fully true, for every pair of rules
+    flat_full = full.reshape(-1, len(labels)).astype(np.float64)
+    both_full = flat_full.T @ (flat_full * points.reshape(-1, 1))
+    consequents = rule_consequents(rule_base)
+    full_conflicts = [
+        {'rules': [labels[a], labels[b]], 'consequents': [list(consequents[a]), list(consequents[b])],
+         'points': int(both_full[a, b])}
+        for a, b in itertools.combinations(range(len(labels)), 2)
+        if both_full[a, b] > 0 and consequents[a] != consequents[b]]
+    elapsed = time.perf_counter() - start
+
+    name = literal_names(rule_base)
+    conflicts = rule_conflicts(rule_base, near_distance)
+    for entry in conflicts:
+        if 'differs' in entry:
+            entry['differs'] = [[' | '.join(map(name, clause)) for clause in side] for side in entry['differs']]
+
+    total = int(points.sum())
+    return {
+        'resolution': resolution,
+        'grid_points': total,
+        'cells': int(dead.size),
+        'runs': {label: len(axis['points']) for label, axis in zip(rule_base.input_labels, runs)},
+        'seconds': elapsed,
+        'fallback_rules': [str(label) for label in np.asarray(labels)[is_fallback]],
+        'dead_points': int(points[dead].sum()),
+        'fallback_only_points': int(points[fallback_only].sum()),
+        'dead_zones': describe_boxes(coalesce(dead), runs, rule_base.input_labels),
+        'fallback_only_zones': describe_boxes(coalesce(fallback_only), runs, rule_base.input_labels),
+        'rules': {label: {'points': int(p), 'alone_points': int(q), 'fraction': p / total}
+                  for label, p, q in zip(labels, rule_points, alone_points)},
+        'never_fire': [label for label, p in zip(labels, rule_points) if p == 0],
+        'conflicts': conflicts,
+        'full_strength_conflicts': sorted(full_conflicts, key=lambda c: -c['points']),
+        '_cells': (runs, dead, fallback_only),
+    }
+
+
+# Cross-check against the engine on random grid points: dead cells must be
+# exactly the points where compute() returns NaN.
+def verify(rule_base, report, samples, seed=0):
+    runs, dead, fallback_only = report['_cells']
+    resolution = report['resolution']
+    rng = np.random.default_rng(seed)
+    index = rng.integers(resolution, size=(samples, rule_base.n_inputs))
+    inputs = np.column_stack([np.linspace(u[0], u[-1], resolution)[index[:, v]]
+                              for v, u in enumerate(rule_base.input_universes)])
+    cell = tuple(np.searchsorted(axis['low'], inputs[:, v], side='right') - 1 for v, axis in enumerate(runs))
+
+    engine = BatchInferenceEngine(rule_base)
+    uncovered = np.isnan(engine.compute(inputs))
+    strengths = engine.rule_strengths(engine.fuzzify(engine.as_columns(inputs)))
+    fired = strengths > 0
+    labels = np.array(rule_base.rule_labels)
+    is_fallback = np.isin(labels, report['fallback_rules'])
+    only_fallback = fired[:, is_fallback].any(axis=1) & ~fired[:, ~is_fallback].any(axis=1)
+    return int((uncovered != dead[cell]).sum() + (only_fallback != fallback_only[cell]).sum())
+
+
+def print_report(variant, report, top):
+    total = report['grid_points']
+    print(f"{variant}: {total:,} grid points as {report['cells']:,} cells "
+          f"({' x '.join(map(str, report['runs'].values()))} runs) in {report['seconds']:.2f}s")
+    print(f"    dead (no rule fires): {report['dead_points']:,} points ({report['dead_points'] / total:.2%}) "
+          f"in {len(report['dead_zones'])} boxes")
+    for box in report['dead_zones'][:top]:
+        print(f"        {box['points']:>13,}  " + ', '.join(f"{k} {lo:g}..{hi:g}" for k, (lo, hi) in box['ranges'].items()))
+    if report['fallback_rules']:
+        print(f"    only {'/'.join(report['fallback_rules'])} fires: {report['fallback_only_points']:,} points "
+              f"({report['fallback_only_points'] / total:.2%}) in {len(report['fallback_only_zones'])} boxes")
+        for box in report['fallback_only_zones'][:top]:
+            print(f"        {box['points']:>13,}  " + ', '.join(f"{k} {lo:g}..{hi:g}" for k, (lo, hi) in box['ranges'].items()))
+    if report['never_fire']:
+        print(f"    never fire: {', '.join(report['never_fire'])}")
+
+    for kind in ('contradiction', 'duplicate', 'implied', 'near_duplicate'):
+        entries = [c for c in report['conflicts'] if c['kind'] == kind]
+        if not entries:
+            continue
+        print(f"    {kind.replace('_', ' ')}: {len(entries)} pairs "
+              f"({sum(c['conflict'] for c in entries)} with different consequents)")
+        for c in sorted(entries, key=lambda c: not c['conflict'])[:top]:
+            (a, b), (ca, cb) = c['rules'], c['consequents']
+            detail = f"  [{' vs '.join(' / '.join(side) for side in c['differs'])}]" if 'differs' in c else ''
+            arrow = 'implies' if kind == 'implied' else '~'
+            print(f"        {a} -> {','.join(ca)} {arrow} {b} -> {','.join(cb)}{detail}")
+    if report['full_strength_conflicts']:
+        print(f"    fully true together with different consequents: "
+              f"{len(report['full_strength_conflicts'])} pairs")
+        for c in report['full_strength_conflicts'][:top]:
+            (a, b), (ca, cb) = c['rules'], c['consequents']
+            print(f"        {a} -> {','.join(ca)} & {b} -> {','.join(cb)}: {c['points']:,} points")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find dead zones, fallback-only zones and conflicting rules")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--resolution', type=int, default=DEFAULT_RESOLUTION, help="grid points per input axis")
+    parser.add_argument('--fallback', nargs='*', help="fallback rule labels (default: names with fallback/default)")
+    parser.add_argument('--near-distance', type=int, default=1, help="max differing clauses for near duplicates")
+    parser.add_argument('--verify', type=int, default=0, metavar='N', help="cross-check N random points with the engine")
+    parser.add_argument('--top', type=int, default=10, help="boxes and pairs to print per section")
+    parser.add_argument('--output', help="write the full report as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for variant in args.variants:
+        rule_base = load_compiled(VARIANTS[variant])
+        report = scan(rule_base, args.resolution, args.fallback, args.near_distance)
+        print_report(variant, report, args.top)
+        if args.verify:
+            mismatches = verify(rule_base, report, args.verify)
+            print(f"    engine cross-check: {mismatches} mismatches in {args.verify:,} points")
+        report.pop('_cells')
+        results[variant] = report
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,314 @@
+import argparse
+import time
+
+import numpy as np
+
+from ruleSpec import THRESHOLD
+
+# Distilled surrogate of a fuzzy rule base for low-latency scoring.
+#
+# Training data comes from batch-scoring the control system (app.py's by
+# default) with BatchInferenceEngine over the continuous input space: a
+# scrambled Sobol sample of the five universes topped up with uniformly
+# random rows.  Two models are distilled from it:
+#   * coverage: a decision tree predicting whether any rule fires (the
+#     engine's NaN / app.py's rule-coverage KeyError).  Rule supports are
+#     intervals per input, so the uncovered region is a union of boxes that
+#     a small axis-aligned tree follows closely.
+#   * urgency: gradient-boosted oblivious trees fitted on the covered rows
+#     only.  An oblivious tree tests the same (input, threshold) pair at
+#     every node of a level, so it is just `depth` comparisons and a table
+#     of 2**depth leaf values.  They are grown here with numpy on
+#     histograms of the inputs (quantile bins, L2-regularized leaves).
+#
+# Both are exported to one .npz of plain arrays, and SurrogatePredictor
+# scores with numpy alone:
+#   * the coverage tree is flattened into a boolean table over the cells of
+#     its own split thresholds, so coverage is one searchsorted per input and
+#     one table read
+#   * the leaf of a row in an oblivious tree is the binary number its
+#     comparisons spell, so all trees are scored with one comparison of the
+#     gathered inputs against every threshold, one product with the powers
+#     of two and one leaf read, whatever the depth; there is no per-level
+#     walk and a single row costs a handful of numpy calls
+# sklearn, scipy and skfuzzy are only needed to train and to benchmark.
+# The .npz records the fingerprint of the rule base it was distilled from;
+# load(path, fingerprint) refuses a model distilled from another rule base.
+#
+# The report compares the surrogate with the engine on held-out rows:
+# error where both cover the input, coverage agreement, agreement of the
+# "Empty the bin immediately!" decision at THRESHOLD, and latency per
+# prediction, single-row and batched, against the engine and skfuzzy.
+
+DEFAULT_MODEL_PATH = 'urgency_surrogate.npz'
+
+# Largest coverage table accepted; fewer coverage leaves mean fewer cells
+MAX_COVERAGE_CELLS = 1 << 24
+
+# Boosting iterations and depth of the oblivious trees
+DEFAULT_MAX_ITER = 100
+DEFAULT_DEPTH = 10
+
+# Candidate thresholds per input (quantiles of the training rows) and the
+# L2 penalty that shrinks leaves holding few rows
+MAX_BINS = 1023
+LEAF_L2 = 20.0
+
+# Rows scored at a time; the (trees * depth, rows) comparison matrix of
+# larger chunks falls out of cache
+CHUNK_SIZE = 256
+
+
+# Step 1: Oblivious boosted trees.  Every level adds the (input, threshold)
+# split with the largest total squared-error reduction over all leaves of
+# the level; leaf k of a tree holds the rows whose comparisons, most
+# significant first, spell k in binary.  Leaf values are scaled by the
+# learning rate.
+def boost_oblivious(inputs, targets, max_iter, depth, learning_rate):
+    rows, n_inputs = inputs.shape
+    edges = [np.unique(np.quantile(inputs[:, i], np.linspace(0, 1, MAX_BINS + 2)[1:-1])) for i in range(n_inputs)]
+    # bins[:, i] > k exactly when inputs[:, i] > edges[i][k]
+    bins = np.column_stack([np.searchsorted(e, inputs[:, i], side='left') for i, e in enumerate(edges)])
+    baseline = float(targets.mean())
+    residual = targets - baseline
+    feature = np.zeros((max_iter, depth), dtype=np.intp)
+    threshold = np.zeros((max_iter, depth))
+    value = np.zeros((max_iter, 2 ** depth))
+    for t in range(max_iter):
+        leaf = np.zeros(rows, dtype=np.intp)
+        for level in range(depth):
+            best_gain = -np.inf
+            for i, e in enumerate(edges):
+                if not len(e):
+                    continue
+                cells = (2 ** level, len(e) + 1)
+                index = leaf * cells[1] + bins[:, i]
+                sums = np.bincount(index, weights=residual, minlength=cells[0] * cells[1]).reshape(cells)
+                counts = np.bincount(index, minlength=cells[0] * cells[1]).reshape(cells)
+                left_sums, left_counts = sums.cumsum(axis=1)[:, :-1], counts.cumsum(axis=1)[:, :-1]
+                right_sums = sums.sum(axis=1, keepdims=True) - left_sums
+                right_counts = counts.sum(axis=1, keepdims=True) - left_counts
+                gain = (left_sums ** 2 / (left_counts + LEAF_L2)
+                        + right_sums ** 2 / (right_counts + LEAF_L2)).sum(axis=0)
+                k = int(gain.argmax())
+                if gain[k] > best_gain:
+                    best_gain, feature[t, level], threshold[t, level], split = gain[k], i, e[k], (i, k)
+            leaf = 2 * leaf + (bins[:, split[0]] > split[1])
+        sums = np.bincount(leaf, weights=residual, minlength=2 ** depth)
+        value[t] = learning_rate * sums / (np.bincount(leaf, minlength=2 ** depth) + LEAF_L2)
+        residual -= value[t][leaf]
+    return {'feature': feature, 'threshold': threshold, 'value': value, 'baseline': np.float64(baseline)}
+
+
+# Step 2: The coverage tree as a table over its threshold cells.  Cell i of
+# an input holds the values with exactly i thresholds below them, and t_i
+# (or the last threshold + 1) stands for the whole cell.
+def coverage_table(model, n_inputs):
+    tree = model.tree_
+    edges = [np.unique(tree.threshold[tree.feature == f]) for f in range(n_inputs)]
+    shape = tuple(len(e) + 1 for e in edges)
+    if np.prod(shape) > MAX_COVERAGE_CELLS:
+        raise ValueError(f"coverage table of {shape} cells is too large; use fewer coverage leaves")
+    representatives = [np.append(e, e[-1] + 1.0) if len(e) else np.zeros(1) for e in edges]
+    cells = np.stack(np.meshgrid(*representatives, indexing='ij'), axis=-1).reshape(-1, n_inputs)
+
+    node = np.zeros(len(cells), dtype=np.intp)
+    leaf = tree.children_left < 0
+    while not leaf[node].all():
+        go_left = cells[np.arange(len(cells)), np.maximum(tree.feature[node], 0)] <= tree.threshold[node]
+        node = np.where(leaf[node], node, np.where(go_left, tree.children_left[node], tree.children_right[node]))
+    value = tree.value[:, 0, :]
+    covered = value[:, list(model.classes_).index(True)] / value.sum(axis=1) > 0.5
+    return edges, covered[node].reshape(shape)
+
+
+class SurrogatePredictor:
+    def __init__(self, arrays):
+        self.input_labels = tuple(str(label) for label in arrays['input_labels'])
+        self.depth = int(arrays['depth'])
+        self.baseline = float(arrays['baseline'])
+        self.feature = arrays['feature'].astype(np.intp)
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        n_trees = len(self.feature)
+        # Splits level-major (all trees' level 0 first), so that the
+        # comparisons of one level are one contiguous block
+        self._feature = self.feature.T.reshape(-1)
+        self._threshold = self.threshold.T.reshape(-1, 1)
+        self._value = self.value.reshape(-1)
+        self._tree_leaves = (np.arange(n_trees) * self.value.shape[1]).reshape(-1, 1)
+        self._leaf_dtype = np.min_scalar_type(self.value.shape[1] - 1)
+        self.edges = [arrays[f'coverage_edges_{i}'] for i in range(len(self.input_labels))]
+        self.coverage = arrays['coverage']
+        self.fingerprint = str(arrays['fingerprint'])
+
+    @classmethod
+    def load(cls, path, fingerprint=None):
+        with np.load(path) as data:
+            surrogate = cls(dict(data))
+        if fingerprint is not None and surrogate.fingerprint != fingerprint:
+            raise ValueError(f"{path} was distilled from rule base {surrogate.fingerprint[:12]}, "
+                             f"not {fingerprint[:12]}")
+        return surrogate
+
+    def covered(self, x):
+        # Compares float32 inputs, as sklearn's trees do
+        x = x.astype(np.float32).astype(np.float64)
+        cells = tuple(np.searchsorted(edges, x[:, i]) for i, edges in enumerate(self.edges))
+        return self.coverage[cells]
+
+    # (trees, rows) leaf numbers, shifted in one level at a time
+    def _score(self, x):
+        right = np.ascontiguousarray(x.T)[self._feature] > self._threshold
+        right = right.view(np.uint8).reshape(self.depth, -1, len(x))
+        leaf = right[0].astype(self._leaf_dtype)
+        for level in right[1:]:
+            leaf <<= 1
+            leaf |= level
+        return self.baseline + self._value[leaf + self._tree_leaves].sum(axis=0)
+
+    def urgency(self, x):
+        if len(x) <= CHUNK_SIZE:
+            return self._score(x)
+        return np.concatenate([self._score(x[start:start + CHUNK_SIZE]) for start in range(0, len(x), CHUNK_SIZE)])
+
+    # (N, 5) inputs in input_labels order, or a mapping of label -> column.
+    # NaN where the coverage model predicts that no rule fires.
+    def predict(self, inputs):
+        if hasattr(inputs, 'keys'):
+            x = np.column_stack([np.asarray(inputs[label], dtype=np.float64).reshape(-1)
+                                 for label in self.input_labels])
+        else:
+            x = np.atleast_2d(np.asarray(inputs, dtype=np.float64))
+        return np.where(self.covered(x), self.urgency(x), np.nan)
+
+    def predict_one(self, **inputs):
+        return float(self.predict(np.array([[inputs[label] for label in self.input_labels]]))[0])
+
+
+# Step 3: Training set from the batch engine
+def training_inputs(engine, rows, seed=0):
+    from scipy.stats import qmc
+
+    rb = engine.rule_base
+    low = np.array([u[0] for u in rb.input_universes])
+    high = np.array([u[-1] for u in rb.input_universes])
+    # The largest power of two up to half the rows, which keeps the Sobol
+    # sample balanced
+    m = max(int(np.log2(max(rows // 2, 1))), 0)
+    sobol = qmc.scale(qmc.Sobol(rb.n_inputs, seed=seed).random_base2(m), low, high)
+    uniform = np.random.default_rng(seed).uniform(low, high, size=(rows - len(sobol), rb.n_inputs))
+    return np.concatenate([sobol, uniform])
+
+
+# Step 4: Distill
+def distill(engine, inputs, targets, max_iter=DEFAULT_MAX_ITER, max_depth=DEFAULT_DEPTH, learning_rate=0.3,
+            coverage_leaves=256, seed=0):
+    from sklearn.tree import DecisionTreeClassifier
+
+    covered = ~np.isnan(targets)
+    coverage = DecisionTreeClassifier(max_leaf_nodes=coverage_leaves, random_state=seed).fit(inputs, covered)
+    urgency = boost_oblivious(inputs[covered], targets[covered], max_iter, max_depth, learning_rate)
+
+    edges, table = coverage_table(coverage, engine.rule_base.n_inputs)
+    return {'input_labels': np.array(engine.input_labels),
+            'fingerprint': np.array(engine.rule_base.fingerprint),
+            'depth': np.int32(max_depth),
+            **urgency,
+            'coverage': table,
+            **{f'coverage_edges_{i}': e for i, e in enumerate(edges)}}
+
+
+def evaluate(reference, predicted, threshold=THRESHOLD):
+    covered, predicted_covered = ~np.isnan(reference), ~np.isnan(predicted)
+    both = covered & predicted_covered
+    error = predicted[both] - reference[both]
+    decision = np.where(covered, reference >= threshold, -1)
+    predicted_decision = np.where(predicted_covered, predicted >= threshold, -1)
+    positives = decision == 1
+    return {
+        'rows': len(reference),
+        'mae': float(np.abs(error).mean()),
+        'rmse': float(np.sqrt(np.mean(error ** 2))),
+        'max_error': float(np.abs(error).max()),
+        'r2': float(1 - np.sum(error ** 2) / np.sum((reference[both] - reference[both].mean()) ** 2)),
+        'coverage_agreement': float(np.mean(covered == predicted_covered)),
+        'decision_agreement': float(np.mean(decision == predicted_decision)),
+        'empty_now': int(positives.sum()),
+        'empty_now_recall': float(np.mean(predicted_decision[positives] == 1)) if positives.any() else float('nan'),
+        'empty_now_precision': (float(np.mean(decision[predicted_decision == 1] == 1))
+                                if (predicted_decision == 1).any() else float('nan')),
+    }
+
+
+def per_call(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == '__main__':
+    from batchInference import BatchInferenceEngine
+    from ruleSpec import VARIANTS, build_control_system, load_compiled
+
+    parser = argparse.ArgumentParser(description="Distill a fuzzy rule base into a numpy-only tree surrogate")
+    parser.add_argument('--variant', choices=list(VARIANTS), default='app')
+    parser.add_argument('--train-rows', type=int, default=400_000)
+    parser.add_argument('--test-rows', type=int, default=100_000)
+    parser.add_argument('--max-iter', type=int, default=DEFAULT_MAX_ITER, help="boosting iterations")
+    parser.add_argument('--max-depth', type=int, default=DEFAULT_DEPTH, help="depth of the boosted trees")
+    parser.add_argument('--learning-rate', type=float, default=0.3)
+    parser.add_argument('--coverage-leaves', type=int, default=256, help="leaves of the coverage tree")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    spec = VARIANTS[args.variant]
+    engine = BatchInferenceEngine(load_compiled(spec))
+
+    start = time.perf_counter()
+    train = training_inputs(engine, args.train_rows, args.seed)
+    train_targets = engine.compute(train)
+    test = np.random.default_rng(args.seed + 1).uniform(0, 100, size=(args.test_rows, engine.rule_base.n_inputs))
+    test_targets = engine.compute(test)
+    print(f"scored {len(train):,} training and {len(test):,} test rows in {time.perf_counter() - start:.1f}s "
+          f"({np.mean(np.isnan(train_targets)):.1%} uncovered)")
+
+    start = time.perf_counter()
+    arrays = distill(engine, train, train_targets, args.max_iter, args.max_depth, args.learning_rate,
+                     args.coverage_leaves, args.seed)
+    np.savez_compressed(args.output, **arrays)
+    print(f"distilled in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+    surrogate = SurrogatePredictor.load(args.output, engine.rule_base.fingerprint)
+    report = evaluate(test_targets, surrogate.predict(test), args.threshold)
+    print(f"accuracy on {report['rows']:,} held-out rows: MAE {report['mae']:.3f}  RMSE {report['rmse']:.3f}  "
+          f"max {report['max_error']:.2f}  R2 {report['r2']:.4f}")
+    print(f"coverage agreement {report['coverage_agreement']:.2%}, decision agreement at {args.threshold:g} "
+          f"{report['decision_agreement']:.2%} ({report['empty_now']:,} bins >= {args.threshold:g}: "
+          f"recall {report['empty_now_recall']:.1%}, precision {report['empty_now_precision']:.1%})")
+
+    # Latency per prediction: one row at a time and in a batch
+    row = dict(zip(engine.input_labels, test[0]))
+    waste_sim = build_control_system(spec)['waste_sim']
+
+    def skfuzzy_one():
+        for label, value in row.items():
+            waste_sim.input[label] = value
+        try:
+            waste_sim.compute()
+        except (KeyError, ValueError):
+            pass
+
+    single = {'skfuzzy': per_call(skfuzzy_one, 50), 'engine': per_call(lambda: engine.compute_one(**row), 500),
+              'surrogate': per_call(lambda: surrogate.predict_one(**row), 500)}
+    batch = test[:50_000]
+    batched = {'engine': per_call(lambda: engine.compute(batch), 1) / len(batch),
+               'surrogate': per_call(lambda: surrogate.predict(batch), 1) / len(batch)}
+    print(f"single row: skfuzzy {single['skfuzzy'] * 1e6:,.0f}us, engine {single['engine'] * 1e6:,.0f}us, "
+          f"surrogate {single['surrogate'] * 1e6:,.0f}us (x{single['engine'] / single['surrogate']:.1f} vs engine, "
+          f"x{single['skfuzzy'] / single['surrogate']:.0f} vs skfuzzy)")
+    print(f"batched: engine {batched['engine'] * 1e6:.2f}us/row, surrogate {batched['surrogate'] * 1e6:.2f}us/row "
+          f"(x{batched['engine'] / batched['surrogate']:.1f})")
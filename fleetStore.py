@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from batchInference import INPUT_LABELS, BatchInferenceEngine
+from ruleSpec import THRESHOLD, VARIANTS, load_compiled
+
+# Fleet state store: one record per bin in a struct-of-arrays layout backed
+# by memory-mapped .npy files, one file per column:
+#     bin_id                       fixed-width bytes (ID_BYTES)
+#     zone                         int32 district / collection zone
+#     fullness .. weather          float32 sensor readings (engine inputs)
+#     toxicity_code .. weather_code
+#                                  int8 index into the category keys of
+#                                  app.py's *_mapping dicts, -1 when unknown
+#     urgency                      float32 last score, NaN when unscored or
+#                                  when no rule fires
+#     scored_at, updated_at        float64 unix timestamps, NaN when never
+#
+# <path>/meta.json holds the row count, the capacity and the category keys,
+# so a store opened later (or by another process) decodes the codes without
+# importing app.py.  Opening only maps the files: pages are read on first
+# access, so reopening millions of bins takes milliseconds.  Columns grow
+# by doubling; rows past `count` are preallocated and hold fill values.
+#
+# append() rewrites meta.json after the new rows are written, so appended
+# bins survive a crash of the process (the mapped pages are in the OS page
+# cache).  Surviving an OS crash or power loss needs flush(), which also
+# syncs the column files to disk.
+#
+# columns() / sensors() return views of the mapped arrays, so
+# engine.compute(store.sensors()) reads the fleet without copying it (the
+# engine converts one chunk at a time to float64).
+
+ID_BYTES = 24
+DEFAULT_CAPACITY = 1024
+META_FILE = 'meta.json'
+CATEGORY_VARIABLES = ('toxicity', 'moisture', 'odor', 'weather')
+
+# name -> (dtype, fill value)
+COLUMNS = {
+    'bin_id': (f'S{ID_BYTES}', b''),
+    'zone': (np.int32, -1),
+    **{label: (np.float32, np.nan) for label in INPUT_LABELS},
+    **{f'{name}_code': (np.int8, -1) for name in CATEGORY_VARIABLES},
+    'urgency': (np.float32, np.nan),
+    'scored_at': (np.float64, np.nan),
+    'updated_at': (np.float64, np.nan),
+}
+
+
+# Category keys in declaration order, taken from the form mappings in app.py
+def app_categories():
+    from app import moisture_mapping, odor_mapping, toxicity_mapping, weather_mapping
+
+    mappings = dict(zip(CATEGORY_VARIABLES, (toxicity_mapping, moisture_mapping, odor_mapping, weather_mapping)))
+    return {name: {key: float(value) for key, value in mapping.items()} for name, mapping in mappings.items()}
+
+
+# Bin ids as fixed-width bytes; longer ids would be truncated by the
+# column dtype and collide, so they raise ValueError
+def encode_ids(bin_ids):
+    bin_ids = np.asarray(bin_ids, dtype=bytes).reshape(-1)
+    if bin_ids.dtype.itemsize > ID_BYTES:
+        longest = max(bin_ids.tolist(), key=len)
+        if len(longest) > ID_BYTES:
+            raise ValueError(f"bin ids are limited to {ID_BYTES} bytes, got {longest!r}")
+    return bin_ids.astype(f'S{ID_BYTES}')
+
+
+class FleetStore:
+    def __init__(self, path, mode='r+'):
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.count = meta['count']
+        self.capacity = meta['capacity']
+        self.categories = meta['categories']
+        self._arrays = {name: np.load(self._column_path(name), mmap_mode=mode) for name in COLUMNS}
+        self._index = None
+
+    @classmethod
+    def create(cls, path, capacity=DEFAULT_CAPACITY, categories=None):
+        if os.path.exists(os.path.join(path, META_FILE)):
+            raise FileExistsError(f"fleet store already exists at {path}")
+        os.makedirs(path, exist_ok=True)
+        for name, (dtype, fill) in COLUMNS.items():
+            array = np.lib.format.open_memmap(os.path.join(path, f'{name}.npy'), mode='w+', dtype=dtype,
+                                              shape=(capacity,))
+            array[:] = fill
+            array.flush()
+            del array
+        cls._write_meta(path, 0, capacity, categories if categories is not None else app_categories())
+        return cls(path)
+
+    @classmethod
+    def open(cls, path, mode='r+'):
+        return cls(path, mode)
+
+    @staticmethod
+    def _write_meta(path, count, capacity, categories):
+        meta = {'count': count, 'capacity': capacity, 'id_bytes': ID_BYTES, 'categories': categories,
+                'columns': {name: np.dtype(dtype).str for name, (dtype, _) in COLUMNS.items()}}
+        temporary = os.path.join(path, f'{META_FILE}.{os.getpid()}.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(temporary, os.path.join(path, META_FILE))
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f'{name}.npy')
+
+    def __len__(self):
+        return self.count
+
+    # Views of the first `count` rows; writes go straight to the mapped files
+    def columns(self, names=None):
+        return {name: self._arrays[name][:self.count] for name in (names or COLUMNS)}
+
+    def __getitem__(self, name):
+        return self._arrays[name][:self.count]
+
+    # Engine inputs as a label -> column mapping, for engine.compute()
+    def sensors(self, rows=None):
+        if rows is None:
+            return self.columns(INPUT_LABELS)
+        return {label: self._arrays[label][rows] for label in INPUT_LABELS}
+
+    def _grow(self, minimum):
+        capacity = max(minimum, 2 * self.capacity)
+        for name, (dtype, fill) in COLUMNS.items():
+            temporary = f'{self._column_path(name)}.{os.getpid()}.tmp'
+            array = np.lib.format.open_memmap(temporary, mode='w+', dtype=dtype, shape=(capacity,))
+            array[:self.count] = self._arrays[name][:self.count]
+            array[self.count:] = fill
+            array.flush()
+            del array
+            self._arrays[name] = None
+            os.replace(temporary, self._column_path(name))
+            self._arrays[name] = np.load(self._column_path(name), mmap_mode=self.mode)
+        self.capacity = capacity
+        self._write_meta(self.path, self.count, self.capacity, self.categories)
+
+    # Appends len(bin_ids) bins and returns their row numbers.  Keyword
+    # arguments are columns (scalars or one value per bin); code columns
+    # also take category keys (toxicity_code='high').  Ids already in the
+    # store, or repeated in bin_ids, raise ValueError.
+    def append(self, bin_ids, **values):
+        bin_ids = encode_ids(bin_ids)
+        if len(np.unique(bin_ids)) < len(bin_ids):
+            raise ValueError("bin ids must be unique")
+        if self.count:
+            index = self._id_index()
+            existing = [bin_id for bin_id in bin_ids.tolist() if bin_id in index]
+            if existing:
+                raise ValueError(f"{len(existing)} bin ids already in the store, e.g. {existing[0]!r}")
+        if self.count + len(bin_ids) > self.capacity:
+            self._grow(self.count + len(bin_ids))
+        rows = np.arange(self.count, self.count + len(bin_ids))
+        try:
+            self._arrays['bin_id'][rows] = bin_ids
+            self.update(rows, **values)
+        except Exception:
+            for name, (_, fill) in COLUMNS.items():
+                self._arrays[name][rows] = fill
+            raise
+        self.count += len(bin_ids)
+        if self._index is not None:
+            self._index.update(zip(bin_ids.tolist(), rows.tolist()))
+        self._write_meta(self.path, self.count, self.capacity, self.categories)
+        return rows
+
+    def update(self, rows, timestamp=None, **values):
+        rows = np.asarray(rows, dtype=np.intp)
+        for name, value in values.items():
+            if name not in COLUMNS or name == 'bin_id':
+                raise KeyError(name)
+            if name.endswith('_code'):
+                value = self.encode(name[:-len('_code')], value)
+            self._arrays[name][rows] = value
+        if values:
+            self._arrays['updated_at'][rows] = time.time() if timestamp is None else timestamp
+
+    # Category keys -> int8 codes; unknown keys raise KeyError like the
+    # mapping lookups in app.py, integer codes outside [-1, categories)
+    # raise ValueError
+    def encode(self, variable, keys):
+        codes = {key: code for code, key in enumerate(self.categories[variable])}
+        keys = np.asarray(keys)
+        if keys.dtype.kind in 'iu':
+            if keys.size and (keys.min() < -1 or keys.max() >= len(codes)):
+                raise ValueError(f"{variable} codes must be in [-1, {len(codes)}), got {keys.min()}..{keys.max()}")
+            return keys.astype(np.int8)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        return np.array([codes[key] for key in unique.tolist()], dtype=np.int8)[inverse].reshape(keys.shape)
+
+    def decode(self, variable, rows=None):
+        codes = self[f'{variable}_code'] if rows is None else self._arrays[f'{variable}_code'][rows]
+        keys = np.array(list(self.categories[variable]) + [''], dtype=object)
+        return keys[codes]
+
+    # The mapping values of the stored codes (NaN when unknown), the numbers
+    # app.py feeds to the engine for a form selection
+    def category_values(self, variable, rows=None):
+        codes = self[f'{variable}_code'] if rows is None else self._arrays[f'{variable}_code'][rows]
+        values = np.array(list(self.categories[variable].values()) + [np.nan], dtype=np.float32)
+        return values[codes]
+
+    # bin id -> row, built on first use so that opening stays cheap
+    def _id_index(self):
+        if self._index is None:
+            self._index = dict(zip(self['bin_id'].tolist(), range(self.count)))
+        return self._index
+
+    def rows_of(self, bin_ids):
+        index = self._id_index()
+        return np.array([index[bin_id] for bin_id in encode_ids(bin_ids).tolist()], dtype=np.intp)
+
+    # Scores the given rows (all by default) and stores urgency/scored_at
+    def score(self, engine, rows=None, timestamp=None):
+        urgency = engine.compute(self.sensors(rows))
+        target = slice(0, self.count) if rows is None else rows
+        self._arrays['urgency'][target] = urgency
+        self._arrays['scored_at'][target] = time.time() if timestamp is None else timestamp
+        return urgency
+
+    def flush(self):
+        if self.mode == 'r':
+            return
+        for array in self._arrays.values():
+            array.flush()
+        self._write_meta(self.path, self.count, self.capacity, self.categories)
+
+    def close(self):
+        self.flush()
+        self._arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def nbytes(self):
+        return sum(np.dtype(dtype).itemsize for dtype, _ in COLUMNS.values()) * self.capacity
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build, reopen and score a memory-mapped fleet state store")
+    parser.add_argument('--path', default='fleet_store')
+    parser.add_argument('--bins', type=int, default=2_000_000)
+    parser.add_argument('--zones', type=int, default=50)
+    parser.add_argument('--variant', choices=list(VARIANTS), default='app')
+    parser.add_argument('--overwrite', action='store_true', help="replace an existing store at --path")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.overwrite and os.path.exists(args.path):
+        shutil.rmtree(args.path)
+    rng = np.random.default_rng(args.seed)
+
+    # Step 1: Build a synthetic fleet
+    start = time.perf_counter()
+    with FleetStore.create(args.path, capacity=args.bins) as store:
+        categories = store.categories
+        keys = {name: rng.integers(len(categories[name]), size=args.bins) for name in CATEGORY_VARIABLES}
+        # Sensor readings as app.py combines them: half the form value
+        # plus half an existing-waste measurement
+        readings = {label: rng.uniform(0, 100, size=args.bins).round(1) for label in INPUT_LABELS}
+        for name in CATEGORY_VARIABLES:
+            mapped = np.array(list(categories[name].values()))[keys[name]]
+            readings[name] = (readings[name] + mapped) / 2
+        store.append([f'bin-{i}' for i in range(args.bins)], zone=rng.integers(args.zones, size=args.bins),
+                     **readings, **{f'{name}_code': keys[name] for name in CATEGORY_VARIABLES})
+    print(f"built {args.bins:,} bins ({store.nbytes() / 2 ** 20:.1f} MiB) in {time.perf_counter() - start:.2f}s "
+          f"-> {args.path}")
+
+    # Step 2: Reopen, as after a restart
+    start = time.perf_counter()
+    store = FleetStore.open(args.path)
+    print(f"reopened {len(store):,} bins in {(time.perf_counter() - start) * 1e3:.1f}ms")
+
+    # Step 3: Score the whole fleet straight from the mapped columns
+    engine = BatchInferenceEngine(load_compiled(VARIANTS[args.variant]))
+    start = time.perf_counter()
+    urgency = store.score(engine)
+    elapsed = time.perf_counter() - start
+    print(f"scored {len(store):,} bins in {elapsed:.2f}s ({len(store) / elapsed:,.0f} bins/s), "
+          f"{int(np.isnan(urgency).sum()):,} uncovered, {int((urgency >= THRESHOLD).sum()):,} at or above {THRESHOLD:g}")
+    store.close()
+
+    reopened = FleetStore.open(args.path, mode='r')
+    assert np.array_equal(reopened['urgency'], urgency.astype(np.float32), equal_nan=True)
+    row = reopened.rows_of(['bin-0'])
+    print(f"bin-0: zone {reopened['zone'][row][0]}, toxicity {reopened.decode('toxicity', row)[0]}, "
+          f"urgency {reopened['urgency'][row][0]:.2f}")
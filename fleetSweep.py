@@ -0,0 +1,142 @@
+import argparse
+import os
+import time
+from collections import defaultdict
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from batchInference import INPUT_LABELS, BatchInferenceEngine
+from ruleSpec import VARIANTS, load_compiled
+
+# Fleet-wide urgency sweep over a process pool.
+#
+# The (N, 5) input matrix and the (N,) result vector live in two
+# SharedMemory blocks.  Workers attach to both once, load the compiled rule
+# base once (from the on-disk cache the parent has already filled), and are
+# then handed only (start, stop) row ranges.  Each shard writes its scores
+# straight into its own slice of the result block, so the merge is free and
+# the output is in input order by construction.  Rows no rule covers come
+# back as NaN, as with BatchInferenceEngine.compute().
+
+# Shards per worker; more than one keeps the pool busy when shards finish
+# unevenly
+SHARDS_PER_WORKER = 4
+
+_worker = {}
+
+
+def _init_worker(variant, input_name, output_name, rows):
+    inputs_shm = SharedMemory(name=input_name)
+    output_shm = SharedMemory(name=output_name)
+    _worker.update(
+        engine=BatchInferenceEngine(load_compiled(VARIANTS[variant])),
+        shm=(inputs_shm, output_shm),
+        inputs=np.ndarray((rows, len(INPUT_LABELS)), dtype=np.float64, buffer=inputs_shm.buf),
+        output=np.ndarray((rows,), dtype=np.float64, buffer=output_shm.buf),
+    )
+
+
+def _score_shard(bounds):
+    start, stop = bounds
+    began = time.perf_counter()
+    _worker['output'][start:stop] = _worker['engine'].compute(_worker['inputs'][start:stop])
+    return os.getpid(), stop - start, time.perf_counter() - began
+
+
+def sweep(inputs, variant='app', workers=None, shard_size=None):
+    inputs = np.ascontiguousarray(inputs, dtype=np.float64)
+    # Workers map the block as (rows, 5); any other shape would fail in
+    # every worker initializer and the pool would respawn them forever
+    if inputs.ndim != 2 or inputs.shape[1] != len(INPUT_LABELS):
+        raise ValueError(f"Expected an (N, {len(INPUT_LABELS)}) array, got shape {inputs.shape}")
+    rows = len(inputs)
+    workers = workers or os.cpu_count() or 1
+    shard_size = shard_size or max(1, -(-rows // (workers * SHARDS_PER_WORKER)))
+
+    # Compile (or validate the disk cache) once, before any worker starts
+    load_compiled(VARIANTS[variant])
+
+    inputs_shm = SharedMemory(create=True, size=max(inputs.nbytes, 1))
+    output_shm = SharedMemory(create=True, size=max(rows * 8, 1))
+    output = None
+    try:
+        np.ndarray(inputs.shape, dtype=np.float64, buffer=inputs_shm.buf)[:] = inputs
+        output = np.ndarray((rows,), dtype=np.float64, buffer=output_shm.buf)
+
+        shards = [(start, min(start + shard_size, rows)) for start in range(0, rows, shard_size)]
+        per_worker = defaultdict(lambda: [0, 0.0])
+        start = time.perf_counter()
+        with get_context().Pool(workers, initializer=_init_worker,
+                                initargs=(variant, inputs_shm.name, output_shm.name, rows)) as pool:
+            for pid, count, elapsed in pool.imap_unordered(_score_shard, shards):
+                per_worker[pid][0] += count
+                per_worker[pid][1] += elapsed
+        wall = time.perf_counter() - start
+        scores = output.copy()
+    finally:
+        # Views of a buffer must be gone before close(), which otherwise
+        # raises BufferError and hides the original exception
+        output = None
+        inputs_shm.close()
+        inputs_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
+
+    report = {
+        'rows': rows,
+        'workers': workers,
+        'shards': len(shards),
+        'wall_seconds': wall,
+        'throughput_per_s': rows / wall if wall else float('inf'),
+        'per_worker': {pid: {'rows': count, 'busy_seconds': busy,
+                             'throughput_per_s': count / busy if busy else float('inf')}
+                       for pid, (count, busy) in sorted(per_worker.items())},
+    }
+    return scores, report
+
+
+def read_inputs(path):
+    if path.endswith('.npy'):
+        return np.load(path)
+    table = np.genfromtxt(path, delimiter=',', names=True)
+    return np.column_stack([table[label] for label in INPUT_LABELS])
+
+
+def write_scores(path, inputs, scores):
+    if path.endswith('.npy'):
+        np.save(path, scores)
+    else:
+        np.savetxt(path, np.column_stack([inputs, scores]), delimiter=',', fmt='%.6g',
+                   header=','.join(INPUT_LABELS + ('urgency',)), comments='')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score a whole fleet of bins on a process pool")
+    parser.add_argument('--input', help="CSV with fullness..weather columns, or an (N, 5) .npy")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="random rows when --input is not given")
+    parser.add_argument('--output', help="write scores to .npy, or inputs+urgency to .csv")
+    parser.add_argument('--variant', choices=list(VARIANTS), default='app')
+    parser.add_argument('--workers', type=int, nargs='+', default=[os.cpu_count() or 1])
+    parser.add_argument('--shard-size', type=int)
+    args = parser.parse_args()
+
+    if args.input:
+        inputs = read_inputs(args.input)
+    else:
+        inputs = np.random.default_rng(0).uniform(0, 100, size=(args.rows, len(INPUT_LABELS)))
+
+    baseline = None
+    for workers in args.workers:
+        scores, report = sweep(inputs, args.variant, workers, args.shard_size)
+        baseline = baseline or report['throughput_per_s']
+        print(f"workers={workers:<3} {report['rows']:,} rows in {report['wall_seconds']:.2f}s "
+              f"({report['throughput_per_s']:,.0f} rows/s, speedup x{report['throughput_per_s'] / baseline:.2f}, "
+              f"{report['shards']} shards, {int(np.isnan(scores).sum())} uncovered)")
+        for pid, stats in report['per_worker'].items():
+            print(f"    pid {pid}: {stats['rows']:,} rows, {stats['throughput_per_s']:,.0f} rows/s")
+
+    if args.output:
+        write_scores(args.output, inputs, scores)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import numpy as np
+
+import app as form_app
+import wastedisposalDiffMembership as json_app
+
+# Concurrency load test for the form (app.py '/') and JSON
+# (wastedisposalDiffMembership.py '/predict') handlers.
+#
+# Every worker thread drives its own Flask test client against the shared
+# module-level app, so handlers really do run concurrently in one process.
+# /predict answers are checked against a single-threaded run of the same
+# payloads: any cross-talk between requests shows up as a mismatch.
+#
+# With --http the same payloads go over real sockets instead, from many
+# concurrent keep-alive connections, to the Flask apps (werkzeug threaded
+# server) and to asyncServer.py, each started as a subprocess.
+
+TOXICITY = list(form_app.toxicity_mapping)
+MOISTURE = list(form_app.moisture_mapping)
+ODOR = list(form_app.odor_mapping)
+WEATHER = list(form_app.weather_mapping)
+
+
+def make_payloads(count, seed=0):
+    rng = random.Random(seed)
+    forms, readings = [], []
+    for _ in range(count):
+        forms.append({
+            'fullness': str(rng.randint(0, 100)),
+            'toxicity': rng.choice(TOXICITY),
+            'moisture': rng.choice(MOISTURE),
+            'odor': rng.choice(ODOR),
+            'weather': rng.choice(WEATHER),
+        })
+        readings.append({label: round(rng.uniform(0, 100), 2)
+                         for label in ('fullness', 'toxicity', 'moisture', 'odor', 'weather')})
+    return forms, readings
+
+
+def post_forms(forms):
+    client = form_app.app.test_client()
+    return [client.post('/', data=form).status_code for form in forms]
+
+
+def post_readings(readings):
+    client = json_app.app.test_client()
+    return [client.post('/predict', json=reading).get_json() for reading in readings]
+
+
+def run(worker, payloads, threads):
+    shards = [payloads[i::threads] for i in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(worker, shards))
+    elapsed = time.perf_counter() - start
+
+    # Re-interleave shard results back into payload order
+    ordered = [None] * len(payloads)
+    for i, shard in enumerate(results):
+        ordered[i::threads] = shard
+    return ordered, elapsed
+
+
+def form_request(form):
+    body = urlencode(form).encode()
+    return (b"POST / HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/x-www-form-urlencoded\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(body)) + body
+
+
+def json_request(reading):
+    body = json.dumps(reading).encode()
+    return (b"POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(body)) + body
+
+
+def start_server(argv, port):
+    process = subprocess.Popen([sys.executable, *argv], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# One client connection: sends its requests one after another, reopening the
+# connection whenever the server closes it (werkzeug answers HTTP/1.0 style)
+async def http_client(port, requests, latencies, statuses):
+    reader = writer = None
+    for raw in requests:
+        if writer is None:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        start = time.perf_counter()
+        writer.write(raw)
+        status = int((await reader.readline()).split()[1])
+        length, close = 0, False
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection':
+                close = value.strip().lower() == 'close'
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        statuses.append(status)
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+# Malformed Content-Length headers must get a 400, not a dropped connection
+def check_bad_lengths(port):
+    for length in ('abc', '-5', '1e3'):
+        with socket.create_connection(('127.0.0.1', port), timeout=10) as s:
+            s.sendall(f"POST /predict HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n".encode())
+            status_line = s.makefile('rb').readline()
+            assert status_line.split()[1:2] == [b'400'], (length, status_line)
+
+
+async def http_load(port, requests, connections):
+    latencies, statuses = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(http_client(port, requests[i::connections], latencies, statuses)
+                           for i in range(connections)))
+    return np.array(latencies), statuses, time.perf_counter() - start
+
+
+def run_http(forms, readings, connections):
+    servers = {
+        'flask': lambda route, port: ['-c', f"from {'app' if route == '/' else 'wastedisposalDiffMembership'} "
+                                            f"import app; app.run(port={port}, threaded=True)"],
+        'async': lambda route, port: ['asyncServer.py', '--port', str(port)],
+    }
+    for route, requests in (('/', [form_request(f) for f in forms]),
+                            ('/predict', [json_request(r) for r in readings])):
+        for name, argv in servers.items():
+            port = free_port()
+            process = start_server(argv(route, port), port)
+            try:
+                if name == 'async':
+                    check_bad_lengths(port)
+                for count in connections:
+                    latencies, statuses, elapsed = asyncio.run(http_load(port, requests, count))
+                    shed = sum(status in (503, 504) for status in statuses)
+                    errors = sum(status not in (200, 503, 504) for status in statuses)
+                    print(f"{route:<9} {name:<6} connections={count:<5} {len(requests) / elapsed:8.0f} req/s  "
+                          f"p50 {np.percentile(latencies, 50) * 1e3:7.2f}ms  "
+                          f"p99 {np.percentile(latencies, 99) * 1e3:7.2f}ms  shed(503/504)={shed} other-errors={errors}")
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Thread-scaling load test for the urgency handlers")
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--http', action='store_true', help="benchmark Flask vs asyncServer.py over sockets")
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 64, 512])
+    args = parser.parse_args()
+
+    if args.http:
+        run_http(*make_payloads(args.requests), args.connections)
+        sys.exit(0)
+
+    forms, readings = make_payloads(args.requests)
+    expected, _ = run(post_readings, readings, 1)
+
+    for name, worker, payloads in (('/', post_forms, forms), ('/predict', post_readings, readings)):
+        baseline = None
+        for threads in args.threads:
+            results, elapsed = run(worker, payloads, threads)
+            throughput = len(payloads) / elapsed
+            baseline = baseline or throughput
+            if worker is post_readings:
+                errors = sum(r != e for r, e in zip(results, expected))
+            else:
+                errors = sum(status != 200 for status in results)
+            print(f"{name:<9} threads={threads:<3} {throughput:8.0f} req/s "
+                  f"speedup x{throughput / baseline:.2f}  mismatches={errors}")
@@ -0,0 +1,212 @@
+import argparse
+import time
+
+import numpy as np
+
+from batchInference import BatchInferenceEngine, interp_rows
+from ruleSpec import VARIANTS, load_compiled
+
+# Partial rescoring of a fleet of bins when a single input changes.
+#
+# A full rescore fuzzifies all five inputs, evaluates every clause and rule
+# and defuzzifies every bin.  When only one input moves - typically weather,
+# which is one value per district - most of that work is unchanged.
+# PartialRescorer splits the clauses of every rule into groups: those that
+# contain no term of a shared variable, those of each shared variable, and
+# those that mix several shared variables.  It keeps, per bin:
+#     memberships  one (bins, terms) array per input variable
+#     without      (bins, rules) rule strengths over the clauses that
+#                  contain no term of a shared variable
+#     group_strengths
+#                  (bins, rules) rule strengths over the clauses of each
+#                  shared variable and over the mixed clauses
+#     cuts         (bins, output terms) accumulated cut levels
+#     scores       (bins,) defuzzified urgency, NaN where no rule fires
+#
+# Updating a shared variable (weather by default) only fuzzifies that
+# variable and evaluates the clause groups that contain it; a rule's
+# strength is then the min over `without` and every group.  A value shared
+# by all updated bins (a district-wide reading) is fuzzified and its
+# clauses evaluated once and broadcast, unless a clause mixes it with
+# another variable.  Any other variable can be updated too: its rows are
+# re-evaluated from the cached memberships, skipping only the fuzzification
+# of the unchanged inputs.
+#
+# Only bins whose cut levels actually changed are defuzzified, and bins
+# that end up with the same cut levels are defuzzified once.  Scores are
+# identical to a full BatchInferenceEngine rescore of the same inputs.
+
+DEFAULT_SHARED = ('weather',)
+
+
+class PartialRescorer:
+    def __init__(self, engine, inputs, shared=DEFAULT_SHARED):
+        self.engine = engine
+        rb = self.rule_base = engine.rule_base
+        columns = engine.as_columns(inputs)
+        self.inputs = np.column_stack(columns).astype(np.float64)
+        self.memberships = engine.fuzzify(columns)
+
+        # Clauses and rules that contain a term of each variable.  The
+        # padding clause of rule_clause_index (index len(clauses)) is always 1.
+        variable_of = np.repeat(np.arange(rb.n_inputs), np.diff(rb.term_offsets))
+        touches = np.zeros((len(rb.clauses) + 1, rb.n_inputs), dtype=bool)
+        for c, clause in enumerate(rb.clauses):
+            touches[c, [variable_of[l if l >= 0 else -l - 1] for l in clause]] = True
+        one_clause = len(rb.clauses)
+
+        # Clause groups: one per shared variable with the clauses that only
+        # touch that shared variable, plus one with the clauses that touch
+        # several.  Each group has the rule clause index into the full clause
+        # values (other clauses replaced by the always-one clause) and into
+        # its own clause values (padding column len(clauses)).
+        shared = [rb.input_labels.index(label) for label in shared]
+        self.shared = set(shared)
+        touches_shared = touches[:-1, shared]
+        count = touches_shared.sum(axis=1)
+        members = [(frozenset([v]), touches_shared[:, i] & (count == 1)) for i, v in enumerate(shared)]
+        mixed = count > 1
+        members.append((frozenset(v for i, v in enumerate(shared) if touches_shared[mixed, i].any()), mixed))
+        self.groups = []
+        for variables, in_group in members:
+            clauses = np.flatnonzero(in_group)
+            if not len(clauses):
+                continue
+            in_group = np.append(in_group, False)[rb.rule_clause_index]
+            local = np.full(len(rb.clauses) + 1, len(clauses))
+            local[clauses] = np.arange(len(clauses))
+            self.groups.append({
+                'variables': variables,
+                'clauses': clauses,
+                'full_index': np.where(in_group, rb.rule_clause_index, one_clause),
+                'own_index': np.where(in_group, local[rb.rule_clause_index], len(clauses)),
+                # Clauses that only contain one shared variable's terms have
+                # one value for a shared reading
+                'pure': len(variables) == 1 and touches[clauses].sum(axis=1).max() == 1,
+            })
+        self.without_index = np.where(np.append(~touches_shared.any(axis=1), True)[rb.rule_clause_index],
+                                      rb.rule_clause_index, one_clause)
+
+        clause_values = self._clause_values(self.memberships)
+        strengths = clause_values[:, rb.rule_clause_index].min(axis=2)
+        self.without = clause_values[:, self.without_index].min(axis=2)
+        self.group_strengths = [clause_values[:, g['full_index']].min(axis=2) for g in self.groups]
+        self.cuts = engine.output_cuts(strengths)
+        self.scores = engine.defuzzify(self.cuts)
+        self.counts = {'updates': 0, 'bins': 0, 'defuzzified': 0}
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def _clause_values(self, memberships, clauses=None):
+        rb = self.rule_base
+        literals = rb.clause_literals if clauses is None else rb.clause_literals[clauses]
+        values = self.engine._extended(memberships)[:, literals].max(axis=2)
+        return np.concatenate([values, np.ones((len(values), 1))], axis=1)
+
+    # Sets `variable` to `values` (a scalar for all rows, or one value per
+    # row) for the given rows and returns their new scores.
+    def update(self, rows, variable, values):
+        engine, rb = self.engine, self.rule_base
+        v = rb.input_labels.index(variable) if isinstance(variable, str) else variable
+        rows = np.asarray(rows, dtype=np.intp).reshape(-1)
+        universe, membership = rb.input_universes[v], rb.input_membership[v]
+        scalar = np.ndim(values) == 0
+
+        # Step 1: memberships of the changed variable only
+        if scalar:
+            x = np.clip(float(values), universe[0], universe[-1])
+            mu = interp_rows(universe, membership, np.array([x])).T
+            self.memberships[v][rows] = mu
+        else:
+            x = np.clip(np.asarray(values, dtype=np.float64).reshape(-1), universe[0], universe[-1])
+            mu = interp_rows(universe, membership, x).T
+            self.memberships[v][rows] = mu
+        self.inputs[rows, v] = x
+
+        # Step 2: rule strengths
+        if v in self.shared:
+            for group, group_strengths in zip(self.groups, self.group_strengths):
+                if v not in group['variables']:
+                    continue
+                if scalar and group['pure']:
+                    # Only v's own terms are needed; the other columns of
+                    # the extended matrix are never read by v's clauses
+                    memberships = [mu if u == v else np.zeros((1, m.shape[1]))
+                                   for u, m in enumerate(self.memberships)]
+                else:
+                    memberships = [m[rows] for m in self.memberships]
+                values = self._clause_values(memberships, group['clauses'])
+                group_strengths[rows] = values[:, group['own_index']].min(axis=2)
+            strengths = np.minimum.reduce([self.without[rows]] + [g[rows] for g in self.group_strengths])
+        else:
+            clause_values = self._clause_values([m[rows] for m in self.memberships])
+            strengths = clause_values[:, rb.rule_clause_index].min(axis=2)
+            self.without[rows] = clause_values[:, self.without_index].min(axis=2)
+            for group, group_strengths in zip(self.groups, self.group_strengths):
+                group_strengths[rows] = clause_values[:, group['full_index']].min(axis=2)
+
+        # Step 3: defuzzify the bins whose cut levels moved, each distinct
+        # cut vector once
+        cuts = engine.output_cuts(strengths)
+        changed = (cuts != self.cuts[rows]).any(axis=1)
+        if changed.any():
+            moved = rows[changed]
+            self.cuts[moved] = cuts[changed]
+            unique, inverse = np.unique(cuts[changed], axis=0, return_inverse=True)
+            self.scores[moved] = engine.defuzzify(unique)[inverse.reshape(-1)]
+
+        self.counts['updates'] += 1
+        self.counts['bins'] += len(rows)
+        self.counts['defuzzified'] += int(changed.sum())
+        return self.scores[rows]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare partial and full rescoring on district-wide updates")
+    parser.add_argument('--variant', choices=list(VARIANTS), default='app')
+    parser.add_argument('--bins', type=int, default=200_000)
+    parser.add_argument('--districts', type=int, default=20)
+    parser.add_argument('--updates', type=int, default=50, help="district-wide updates to apply")
+    parser.add_argument('--variable', nargs='+', default=['weather'],
+                        help="shared variables; updates cycle through them")
+    parser.add_argument('--defuzzifier', choices=('sampled', 'analytic'), default='sampled')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    engine = BatchInferenceEngine(load_compiled(VARIANTS[args.variant]), defuzzifier=args.defuzzifier)
+    district = rng.integers(args.districts, size=args.bins)
+    inputs = np.round(rng.uniform(0, 100, size=(args.bins, engine.rule_base.n_inputs)), 1)
+    shared = [engine.input_labels.index(label) for label in args.variable]
+    for v in shared:
+        inputs[:, v] = rng.uniform(0, 100, size=args.districts)[district].round(1)
+
+    start = time.perf_counter()
+    rescorer = PartialRescorer(engine, inputs, shared=args.variable)
+    print(f"{args.bins:,} bins cached in {time.perf_counter() - start:.2f}s")
+
+    partial_time = full_time = 0.0
+    mismatched = 0
+    for update in range(args.updates):
+        v = shared[update % len(shared)]
+        d, value = int(rng.integers(args.districts)), round(float(rng.uniform(0, 100)), 1)
+        rows = np.flatnonzero(district == d)
+
+        start = time.perf_counter()
+        partial = rescorer.update(rows, v, value)
+        partial_time += time.perf_counter() - start
+
+        inputs[rows, v] = value
+        start = time.perf_counter()
+        full = engine.compute(inputs[rows])
+        full_time += time.perf_counter() - start
+        mismatched += int((~((partial == full) | (np.isnan(partial) & np.isnan(full)))).sum())
+
+    counts = rescorer.counts
+    print(f"{args.updates} {'/'.join(args.variable)} updates over {counts['bins']:,} bins "
+          f"({counts['defuzzified']:,} defuzzified, {counts['bins'] - counts['defuzzified']:,} with unchanged cuts)")
+    print(f"    full rescore    {full_time:.3f}s  ({counts['bins'] / full_time:,.0f} bins/s)")
+    print(f"    partial rescore {partial_time:.3f}s  ({counts['bins'] / partial_time:,.0f} bins/s), "
+          f"x{full_time / partial_time:.2f}")
+    print(f"    scores differing from the full rescore: {mismatched}")
@@ -0,0 +1,224 @@
+import argparse
+import csv
+import os
+import struct
+import time
+import zlib
+from multiprocessing import get_context
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from batchInference import INPUT_LABELS, BatchInferenceEngine
+from ruleSpec import VARIANTS, load_compiled
+
+# Headless plot report: the membership-function plots and the per-case
+# output plots of plot_membership_functions() / test_waste_management(),
+# rendered to PNG files with the Agg backend instead of plt.show().
+#
+# Scores and output cut levels for every case come from one
+# BatchInferenceEngine call.  Each worker process then owns a single output
+# figure: the axes, grid and output terms are drawn once and kept as a
+# pixel background, and each case only restores that background, updates
+# the clipped-term fills, crisp value line and caption, redraws those
+# artists and writes the pixel buffer.  Nothing is allocated per case
+# besides the image file.  Case images are written by write_png(), which
+# skips PIL's per-row filter search: at 80 dpi a case image takes 3.6ms
+# with write_png() and 9.3ms with PIL.Image.frombuffer(...).save() at the
+# same compress_level, against 6ms for drawing it, so PIL would make every
+# case about 1.6x slower for the same pixels.  The membership plots are
+# only written once and go through savefig().
+#
+# Files written to --output-dir:
+#   membership_<variable>.png   one per input and output variable
+#   case_<nnnnn>.png            one per case, numbered from 00001
+#   cases.csv                   inputs, urgency and image of every case
+
+FIGURE_SIZE = (6.4, 4.8)
+DEFAULT_DPI = 80
+PNG_COMPRESSION = 1
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+_worker = {}
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+# PNG of an (h, w, 4) RGBA buffer with unfiltered rows.  Kept RGBA: dropping
+# the alpha channel is a strided copy that costs more than compressing it.
+def write_png(path, rgba, level=PNG_COMPRESSION):
+    height, width = rgba.shape[:2]
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(height, -1)
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE
+                + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+                + _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), level))
+                + _png_chunk(b'IEND', b''))
+
+
+def variable_titles(rule_base):
+    return [label.capitalize() for label in rule_base.input_labels] + ['Urgency to Empty']
+
+
+# Step 1: Membership functions, one reused figure for every variable
+def render_membership(rule_base, output_dir, dpi=DEFAULT_DPI):
+    figure = Figure(figsize=FIGURE_SIZE, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    variables = list(zip(rule_base.input_universes, rule_base.input_terms, rule_base.input_membership))
+    variables.append((rule_base.output_universe, rule_base.output_terms, rule_base.output_membership))
+    labels = list(rule_base.input_labels) + [rule_base.output_label]
+
+    paths = []
+    for label, title, (universe, terms, membership) in zip(labels, variable_titles(rule_base), variables):
+        ax.clear()
+        for term, mf in zip(terms, membership):
+            ax.plot(universe, mf, linewidth=1.5, label=term)
+        ax.set_xlim(universe[0], universe[-1])
+        ax.set_ylim(0, 1.01)
+        ax.set_title(f'Membership Function: {title}')
+        ax.set_xlabel('Percentage')
+        ax.set_ylabel('Membership Degree')
+        ax.grid(True)
+        ax.legend(loc='upper right', fontsize='small')
+        path = os.path.join(output_dir, f'membership_{label}.png')
+        figure.savefig(path, pil_kwargs={'compress_level': PNG_COMPRESSION})
+        paths.append(path)
+    return paths
+
+
+# Step 2: Output plot template.  The static part is rendered once and kept
+# as a pixel background; the animated artists are the only things drawn per
+# case.
+class OutputPlot:
+    def __init__(self, rule_base, dpi=DEFAULT_DPI, captions=True):
+        self.captions = captions
+        self.universe = rule_base.output_universe
+        self.membership = rule_base.output_membership
+        self.figure = Figure(figsize=FIGURE_SIZE, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+
+        lines = [ax.plot(self.universe, mf, linewidth=1.5, label=term)[0]
+                 for term, mf in zip(rule_base.output_terms, self.membership)]
+        zeros = np.zeros_like(self.universe)
+        self.fills = [ax.fill_between(self.universe, zeros, zeros, facecolor=line.get_color(), alpha=0.4,
+                                      animated=True) for line in lines]
+        self.crisp = ax.plot([], [], color='k', linewidth=3, animated=True)[0]
+        self.caption = ax.text(0.02, 0.97, '', transform=ax.transAxes, va='top', fontsize='small',
+                               animated=True)
+        ax.set_xlim(self.universe[0], self.universe[-1])
+        ax.set_ylim(0, 1.01)
+        ax.set_title('Output: Urgency to Empty')
+        ax.set_xlabel('Urgency (%)')
+        ax.set_ylabel('Membership Degree')
+        ax.grid(True)
+        ax.legend(loc='upper right', fontsize='small')
+
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def render(self, path, inputs, cuts, score):
+        self.canvas.restore_region(self.background)
+        clipped = np.minimum(cuts[:, None], self.membership)
+        for fill, values in zip(self.fills, clipped):
+            fill.set_verts([np.column_stack([np.r_[self.universe, self.universe[::-1]],
+                                             np.r_[values, np.zeros_like(values)]])])
+            self.figure.draw_artist(fill)
+
+        # Kept short: text layout and glyph rendering are the largest
+        # per-case cost after PNG compression
+        caption = '  '.join(f'{label[0].upper()} {value:g}' for label, value in zip(INPUT_LABELS, inputs))
+        if np.isnan(score):
+            self.crisp.set_data([], [])
+            caption += '\nno rule fires'
+        else:
+            # Same marker height as FuzzyVariable.view(): the aggregate at the
+            # crisp value, or the full height when that is hard to see
+            height = np.interp(score, self.universe, clipped.max(axis=0))
+            self.crisp.set_data([score, score], [0, height if height >= 0.1 else 1.0])
+            caption += f'\nUrgency {score:.2f}%'
+        self.figure.draw_artist(self.crisp)
+        if self.captions:
+            self.caption.set_text(caption)
+            self.figure.draw_artist(self.caption)
+
+        write_png(path, np.asarray(self.canvas.buffer_rgba()))
+
+
+def _init_worker(variant, output_dir, dpi, captions):
+    _worker.update(plot=OutputPlot(load_compiled(VARIANTS[variant]), dpi, captions), output_dir=output_dir)
+
+
+def _render_cases(batch):
+    plot, paths = _worker['plot'], []
+    for case, inputs, cuts, score in batch:
+        path = os.path.join(_worker['output_dir'], f'case_{case:05d}.png')
+        plot.render(path, inputs, cuts, score)
+        paths.append(path)
+    return os.getpid(), paths
+
+
+# Step 3: Score every case in one engine call, then render on a process pool
+def render_cases(variant, inputs, output_dir, workers=None, dpi=DEFAULT_DPI, captions=True, batch_size=32):
+    rule_base = load_compiled(VARIANTS[variant])
+    engine = BatchInferenceEngine(rule_base)
+    memberships = engine.fuzzify(engine.as_columns(inputs))
+    cuts = engine.output_cuts(engine.rule_strengths(memberships))
+    scores = engine.defuzzify(cuts)
+
+    cases = list(zip(range(1, len(inputs) + 1), inputs.tolist(), cuts, scores))
+    batches = [cases[i:i + batch_size] for i in range(0, len(cases), batch_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(variant, output_dir, dpi, captions)
+        rendered = [_render_cases(batch) for batch in batches]
+    else:
+        with get_context().Pool(workers, initializer=_init_worker, initargs=(variant, output_dir, dpi, captions)) as pool:
+            rendered = list(pool.imap(_render_cases, batches))
+    paths = [path for _, batch_paths in rendered for path in batch_paths]
+    return scores, paths
+
+
+def write_index(path, inputs, scores, images):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['case', *INPUT_LABELS, 'urgency', 'image'])
+        for case, (row, score, image) in enumerate(zip(inputs.tolist(), scores, images), 1):
+            writer.writerow([case, *row, '' if np.isnan(score) else f'{score:.2f}', os.path.basename(image)])
+
+
+if __name__ == '__main__':
+    from fleetSweep import read_inputs
+
+    parser = argparse.ArgumentParser(description="Render membership and per-case output plots to PNG files")
+    parser.add_argument('--variant', choices=list(VARIANTS), default='wasteDisposal')
+    parser.add_argument('--cases', help="CSV with fullness..weather columns, or an (N, 5) .npy")
+    parser.add_argument('--random', type=int, default=1000, help="random cases when --cases is not given")
+    parser.add_argument('--output-dir', default='plot_report')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--no-captions', action='store_true', help="leave the inputs/score caption out of case plots")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.cases:
+        inputs = np.asarray(read_inputs(args.cases), dtype=np.float64)
+    else:
+        inputs = np.round(np.random.default_rng(args.seed).uniform(0, 100, size=(args.random, len(INPUT_LABELS))))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    membership = render_membership(load_compiled(VARIANTS[args.variant]), args.output_dir, args.dpi)
+    scores, images = render_cases(args.variant, inputs, args.output_dir, args.workers, args.dpi,
+                                  not args.no_captions)
+    write_index(os.path.join(args.output_dir, 'cases.csv'), inputs, scores, images)
+    elapsed = time.perf_counter() - start
+    print(f"{len(membership)} membership plots and {len(images):,} case plots in {elapsed:.2f}s "
+          f"({len(images) / elapsed:,.0f} cases/s, {int(np.isnan(scores).sum())} uncovered) -> {args.output_dir}")
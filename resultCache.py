@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Memoization layer in front of a BatchInferenceEngine.
+#
+# By default entries are keyed on the exact (clipped) inputs, so cached
+# scores are identical to engine.compute().  A `resolution` opts into
+# quantization, trading accuracy for hit rate: inputs are snapped to a grid
+# of `resolution` units and the snapped point is what gets scored, so a
+# cached score never depends on which caller filled the entry but can
+# differ from the exact score by the effect of a resolution/2 input change.
+# Near the edge of a membership function's support that can mean a
+# different coverage outcome (NaN instead of a score, or the reverse).
+#
+# Entries are keyed by the rule base fingerprint as well, so swapping the
+# engine's rule base (e.g. for one compiled from edited membership
+# functions) invalidates the whole cache on the next call.  Compiled rule
+# bases are read-only, so they cannot change under a fingerprint.  Only the
+# dictionary operations are under the lock; inference itself runs outside
+# it.
+
+DEFAULT_RESOLUTION = None
+DEFAULT_MAXSIZE = 65536
+
+
+# URGENCY_CACHE_RESOLUTION-style setting: unset, empty, 0 or "none" means
+# exact keys
+def parse_resolution(text):
+    if text is None or text.strip().lower() in ('', '0', 'none'):
+        return None
+    return float(text)
+
+
+class QuantizedResultCache:
+    def __init__(self, engine, resolution=DEFAULT_RESOLUTION, maxsize=DEFAULT_MAXSIZE):
+        self.engine = engine
+        self.resolution = resolution
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _quantize(self, columns):
+        rb = self.engine.rule_base
+        snapped = []
+        for universe, column in zip(rb.input_universes, columns):
+            x = np.clip(column, universe[0], universe[-1])
+            if self.resolution:
+                x = np.round(x / self.resolution) * self.resolution
+            snapped.append(x)
+        return np.stack(snapped, axis=1)
+
+    def _check_rule_base(self):
+        fingerprint = self.engine.rule_base.fingerprint
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    # Batch lookup: misses are de-duplicated and scored in one engine call.
+    # NaN marks inputs no rule covers, as with engine.compute().
+    def compute(self, inputs):
+        points = self._quantize(self.engine.as_columns(inputs))
+        keys = [tuple(row) for row in points.tolist()]
+        result = np.empty(len(keys))
+        missing = {}
+
+        with self._lock:
+            self._check_rule_base()
+            for i, key in enumerate(keys):
+                value = self._entries.get(key)
+                if value is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    result[i] = value
+            self.hits += len(keys) - sum(len(rows) for rows in missing.values())
+            self.misses += sum(len(rows) for rows in missing.values())
+            fingerprint = self._fingerprint
+
+        if missing:
+            scores = self.engine.compute(np.array(list(missing)))
+            with self._lock:
+                store = fingerprint == self._fingerprint
+                for (key, rows), score in zip(missing.items(), scores):
+                    result[rows] = score
+                    if store:
+                        self._entries[key] = float(score)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return result
+
+    # Cached counterpart of engine.score(): raises KeyError when no rule fires
+    def score(self, **inputs):
+        value = float(self.compute({label: [inputs[label]] for label in self.engine.input_labels})[0])
+        if np.isnan(value):
+            raise KeyError(self.engine.rule_base.output_label)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'resolution': self.resolution,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
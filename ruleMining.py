@@ -0,0 +1,348 @@
+import argparse
+import json
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.tree import DecisionTreeClassifier
+
+from batchInference import INPUT_LABELS, BatchInferenceEngine
+from ruleSpec import VARIANTS, load_compiled
+
+# Data-driven rule mining, the scalable version of the KMeans + decision tree
+# steps in wasteDisposalUpdate1.py.
+#
+# The readings file (CSV with fullness..weather and an urgency column) is
+# read in chunks, so memory stays bounded however long the history is:
+#   * MiniBatchKMeans.partial_fit() clusters every chunk as it arrives
+#   * a fixed-size uniform reservoir sample (Algorithm R) keeps the rows the
+#     decision tree is fitted on once the stream ends
+# Tree leaves are turned into candidate rules by mapping each split interval
+# onto membership terms: along every input a term owns the part of the
+# universe where it is the largest membership, and an interval becomes the
+# terms it covers at least half of.  Inputs whose interval covers every term
+# are left out of the rule, and leaves below --min-support or --min-purity
+# are dropped.  The rules are printed as ruleSpec tuples and as ctrl.Rule
+# definitions with their support (share of the sampled rows).
+#
+# The urgency column holds class indices into the output terms (0 = low,
+# 1 = medium, 2 = high, as in wasteDisposalUpdate1.py), or with
+# --score-target crisp 0..100 scores, which are mapped to the output term
+# with the largest membership.  --simulate writes a synthetic history scored
+# by one of the rule bases first.
+#
+# Time and peak traced memory (tracemalloc) are reported for every stage;
+# --no-trace-memory drops the memory figures and tracemalloc's overhead.
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_RESERVOIR = 200_000
+DEFAULT_CLUSTERS = 3
+DEFAULT_DEPTH = 4
+
+# Share of a term's region an interval must cover to include the term
+TERM_COVERAGE = 0.5
+
+
+# Starts tracemalloc unless it is already tracing; close() stops it again
+# only in that case, so a caller's own tracing is left alone
+class StageTimer:
+    def __init__(self, trace_memory=True):
+        self.stages = []
+        self.trace_memory = trace_memory
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def close(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def stage(self, name):
+        timer = self
+
+        class Stage:
+            def __enter__(self):
+                if timer.trace_memory:
+                    tracemalloc.reset_peak()
+                    self.before = tracemalloc.get_traced_memory()[0]
+                self.start = time.perf_counter()
+                return self
+
+            def __exit__(self, *exc):
+                elapsed = time.perf_counter() - self.start
+                entry = {'stage': name, 'seconds': elapsed}
+                if timer.trace_memory:
+                    current, peak = tracemalloc.get_traced_memory()
+                    entry.update(peak_mib=(peak - self.before) / 2 ** 20,
+                                 retained_mib=(current - self.before) / 2 ** 20)
+                timer.stages.append(entry)
+                return False
+
+        return Stage()
+
+
+# Uniform sample of a stream with a fixed number of slots; each chunk is
+# offered in one vectorized step.  A row with global position i replaces
+# slot j ~ U[0, i] when j < size, exactly as Algorithm R does row by row.
+class Reservoir:
+    def __init__(self, size, width, seed=0):
+        self.rows = np.empty((size, width), dtype=np.float32)
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def offer(self, chunk):
+        size = len(self.rows)
+        fill = min(max(size - self.seen, 0), len(chunk))
+        self.rows[self.seen:self.seen + fill] = chunk[:fill]
+        positions = np.arange(self.seen + fill, self.seen + len(chunk))
+        slots = (self.rng.random(len(positions)) * (positions + 1)).astype(np.int64)
+        keep = slots < size
+        slots, rows = slots[keep], chunk[fill:][keep]
+        # Only the last row offered to a slot survives, as in the
+        # sequential loop
+        last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+        self.rows[slots[last]] = rows[last]
+        self.seen += len(chunk)
+
+    @property
+    def sample(self):
+        return self.rows[:min(self.seen, len(self.rows))]
+
+
+# Term with the largest membership at each universe point (first on ties)
+def term_regions(rule_base):
+    regions = [(u, m.argmax(axis=0)) for u, m in zip(rule_base.input_universes, rule_base.input_membership)]
+    output = rule_base.output_membership[rule_base.output_used]
+    return regions, (rule_base.output_universe, np.flatnonzero(rule_base.output_used)[output.argmax(axis=0)])
+
+
+def score_classes(scores, output_region):
+    universe, dominant = output_region
+    index = np.clip(np.searchsorted(universe, scores, side='right') - 1, 0, len(universe) - 1)
+    return dominant[index]
+
+
+# Step 1: Stream the history: cluster incrementally, keep the reservoir
+def stream(path, rule_base, clusters, chunk_size, reservoir_size, score_target, seed):
+    labels = list(rule_base.input_labels)
+    kmeans = MiniBatchKMeans(n_clusters=clusters, random_state=seed, n_init=3, batch_size=4096)
+    reservoir = Reservoir(reservoir_size, len(labels) + 1, seed)
+    _, output_region = term_regions(rule_base)
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=labels + ['urgency'], dtype=np.float32, chunksize=chunk_size):
+        # Rows with a missing reading or no urgency (no rule fired) are skipped
+        values = chunk[labels + ['urgency']].dropna().to_numpy()
+        if not len(values):
+            continue
+        if score_target:
+            values[:, -1] = score_classes(values[:, -1], output_region)
+        kmeans.partial_fit(values[:, :-1])
+        reservoir.offer(values)
+        rows += len(values)
+    return kmeans, reservoir, rows
+
+
+# Step 2: Leaves of the fitted tree as per-input [low, high] intervals
+def leaf_intervals(tree, rule_base):
+    t = tree.tree_
+    bounds = [(u[0], u[-1]) for u in rule_base.input_universes]
+    leaves = []
+
+    def walk(node, box):
+        if t.children_left[node] == -1:
+            distribution = t.value[node][0]
+            leaves.append({'box': box, 'samples': int(t.n_node_samples[node]),
+                           'class': int(tree.classes_[distribution.argmax()]),
+                           'purity': float(distribution.max() / distribution.sum())})
+            return
+        feature, threshold = t.feature[node], t.threshold[node]
+        low, high = box[feature]
+        walk(t.children_left[node], box[:feature] + [(low, min(high, threshold))] + box[feature + 1:])
+        walk(t.children_right[node], box[:feature] + [(max(low, threshold), high)] + box[feature + 1:])
+
+    walk(0, bounds)
+    return leaves
+
+
+# Step 3: Map an interval onto the terms whose regions it mostly covers
+def interval_terms(low, high, region):
+    universe, dominant = region
+    inside = (universe > low) & (universe <= high) if low > universe[0] else universe <= high
+    owned = np.bincount(dominant, minlength=dominant.max() + 1)
+    covered = np.bincount(dominant[inside], minlength=len(owned))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        selected = np.flatnonzero(covered / owned >= TERM_COVERAGE)
+    if not len(selected) and covered.any():
+        selected = [int(covered.argmax())]
+    return [int(t) for t in selected], set(selected) >= set(np.flatnonzero(owned))
+
+
+# AND of per-input groups, each group an OR of (variable, term) pairs
+def antecedent(parts, literal):
+    groups = [' | '.join(literal.format(label, term) for label, term in group) for group in parts]
+    return ' & '.join(g if len(group) == 1 else f'({g})' for g, group in zip(groups, parts))
+
+
+def leaves_to_rules(leaves, rule_base, min_support, min_purity):
+    regions, _ = term_regions(rule_base)
+    total = sum(leaf['samples'] for leaf in leaves)
+    rules = {}
+    for leaf in leaves:
+        support = leaf['samples'] / total
+        if support < min_support or leaf['purity'] < min_purity:
+            continue
+        parts = []
+        for label, terms, region, (low, high) in zip(rule_base.input_labels, rule_base.input_terms, regions,
+                                                     leaf['box']):
+            selected, unconstrained = interval_terms(low, high, region)
+            if unconstrained or not selected:
+                continue
+            parts.append([(label, terms[t]) for t in selected])
+        if not parts:
+            continue
+        expression = antecedent(parts, "{}[{}]")
+        consequent = rule_base.output_terms[leaf['class']]
+        # Leaves can map onto the same terms; keep the best-supported
+        # consequent and count the disagreement
+        entry = rules.setdefault(expression, {'expression': expression, 'parts': parts, 'votes': {}})
+        entry['votes'][consequent] = entry['votes'].get(consequent, 0.0) + support
+
+    mined = []
+    for entry in rules.values():
+        consequent, support = max(entry['votes'].items(), key=lambda item: item[1])
+        mined.append({'expression': entry['expression'], 'consequent': consequent, 'support': support,
+                      'conflicting': {k: v for k, v in entry['votes'].items() if k != consequent},
+                      'parts': entry['parts']})
+    mined.sort(key=lambda rule: -rule['support'])
+    for i, rule in enumerate(mined, 1):
+        rule['name'] = f'mined{i}'
+    return mined
+
+
+def ctrl_rule(rule, output_label):
+    expression = antecedent(rule['parts'], "{}['{}']")
+    return f"{rule['name']} = ctrl.Rule({expression}, {output_label}['{rule['consequent']}'])"
+
+
+def describe_centroid(center, rule_base):
+    regions, _ = term_regions(rule_base)
+    described = []
+    for label, terms, (universe, dominant), value in zip(rule_base.input_labels, rule_base.input_terms,
+                                                          regions, center):
+        index = min(int(np.searchsorted(universe, value, side='right')) - 1, len(universe) - 1)
+        described.append(f"{label}[{terms[dominant[max(index, 0)]]}]")
+    return ' & '.join(described)
+
+
+def mine(path, variant='wasteDisposalUpdate1', clusters=DEFAULT_CLUSTERS, depth=DEFAULT_DEPTH,
+         chunk_size=DEFAULT_CHUNK_SIZE, reservoir_size=DEFAULT_RESERVOIR, score_target=False,
+         min_support=0.01, min_purity=0.6, seed=0, timer=None):
+    # A timer made here also stops the memory tracing it started
+    if timer is None:
+        timer = StageTimer()
+        try:
+            return mine(path, variant, clusters, depth, chunk_size, reservoir_size, score_target, min_support,
+                        min_purity, seed, timer)
+        finally:
+            timer.close()
+    rule_base = load_compiled(VARIANTS[variant])
+
+    with timer.stage('stream + cluster'):
+        kmeans, reservoir, rows = stream(path, rule_base, clusters, chunk_size, reservoir_size, score_target, seed)
+    sample = reservoir.sample
+    if not len(sample):
+        raise ValueError(f"No complete rows in {path}")
+
+    with timer.stage('tree'):
+        tree = DecisionTreeClassifier(max_depth=depth, min_samples_leaf=max(1, int(min_support * len(sample))),
+                                      random_state=seed)
+        tree.fit(sample[:, :-1], sample[:, -1].astype(np.int64))
+
+    with timer.stage('rules'):
+        rules = leaves_to_rules(leaf_intervals(tree, rule_base), rule_base, min_support, min_purity)
+        cluster_sizes = np.bincount(kmeans.predict(sample[:, :-1]), minlength=clusters)
+        centroids = [{'center': center.tolist(), 'terms': describe_centroid(center, rule_base),
+                      'share': float(size / len(sample))}
+                     for center, size in zip(kmeans.cluster_centers_, cluster_sizes)]
+
+    return {'rows': rows, 'reservoir': len(sample), 'tree_accuracy': float(tree.score(sample[:, :-1],
+                                                                                      sample[:, -1].astype(np.int64))),
+            'centroids': centroids, 'rules': rules, 'output_label': rule_base.output_label,
+            'stages': timer.stages}
+
+
+# Synthetic history scored by a rule base, written in chunks
+def write_synthetic(path, rows, variant='wasteDisposal', chunk_size=DEFAULT_CHUNK_SIZE, seed=0):
+    engine = BatchInferenceEngine(load_compiled(VARIANTS[variant]))
+    rng = np.random.default_rng(seed)
+    header = True
+    for start in range(0, rows, chunk_size):
+        inputs = np.round(rng.uniform(0, 100, size=(min(chunk_size, rows - start), len(INPUT_LABELS))), 1)
+        frame = pd.DataFrame(inputs, columns=list(INPUT_LABELS))
+        frame['urgency'] = np.round(engine.compute(inputs), 2)
+        frame.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mine candidate fuzzy rules from a large readings history")
+    parser.add_argument('--input', required=True, help="CSV with fullness..weather and urgency columns")
+    parser.add_argument('--variant', choices=list(VARIANTS), default='wasteDisposalUpdate1',
+                        help="rule base whose membership terms the rules are expressed in")
+    parser.add_argument('--score-target', action='store_true', help="urgency holds 0..100 scores, not classes")
+    parser.add_argument('--simulate', type=int, metavar='ROWS', help="first write a synthetic history to --input")
+    parser.add_argument('--simulate-variant', choices=list(VARIANTS), default='wasteDisposal')
+    parser.add_argument('--clusters', type=int, default=DEFAULT_CLUSTERS)
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--reservoir', type=int, default=DEFAULT_RESERVOIR, help="rows kept for the tree")
+    parser.add_argument('--min-support', type=float, default=0.01)
+    parser.add_argument('--min-purity', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-trace-memory', action='store_true')
+    parser.add_argument('--output', help="write the mined rules and report as JSON")
+    args = parser.parse_args()
+
+    if args.simulate:
+        start = time.perf_counter()
+        write_synthetic(args.input, args.simulate, args.simulate_variant, args.chunk_size, args.seed)
+        print(f"Wrote {args.simulate:,} synthetic rows to {args.input} in {time.perf_counter() - start:.1f}s")
+        args.score_target = True
+
+    timer = StageTimer(not args.no_trace_memory)
+
+    result = mine(args.input, args.variant, args.clusters, args.depth, args.chunk_size, args.reservoir,
+                  args.score_target, args.min_support, args.min_purity, args.seed, timer)
+    timer.close()
+
+    print(f"{result['rows']:,} rows, tree fitted on {result['reservoir']:,} "
+          f"(training accuracy {result['tree_accuracy']:.1%})")
+    print("\nCluster centers:")
+    for centroid in result['centroids']:
+        print(f"    {centroid['share']:6.1%}  " + ' '.join(f"{v:5.1f}" for v in centroid['center'])
+              + f"  ~ {centroid['terms']}")
+    print("\nCandidate rules (ruleSpec):")
+    for rule in result['rules']:
+        note = f"  # support {rule['support']:.1%}"
+        if rule['conflicting']:
+            note += ', also ' + ', '.join(f"{k} {v:.1%}" for k, v in rule['conflicting'].items())
+        print(f"    ('{rule['name']}', \"{rule['expression']}\", '{rule['consequent']}'),{note}")
+    print("\nCandidate rules (skfuzzy):")
+    for rule in result['rules']:
+        print(f"    {ctrl_rule(rule, result['output_label'])}")
+
+    print("\nStages:")
+    for stage in result['stages']:
+        memory = (f"  peak {stage['peak_mib']:8.1f} MiB  retained {stage['retained_mib']:7.1f} MiB"
+                  if 'peak_mib' in stage else '')
+        print(f"    {stage['stage']:<17} {stage['seconds']:8.2f}s{memory}")
+    print(f"    max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,473 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from batchInference import CompiledRuleBase, simplify_cnf
+
+# Declarative description of the waste-disposal rule bases.
+#
+# Each spec lists the fuzzy variables with their membership functions and
+# the rules as "variable[term]" expressions using the same &, | and ~
+# operators as skfuzzy.  A spec can be turned into the usual skfuzzy
+# objects with build_control_system(), or compiled straight into the batch
+# engine's array form with load_compiled(), which caches the compiled
+# arrays on disk keyed by the spec's content hash.  Cold starts and forked
+# workers then read one .npz file instead of rebuilding the skfuzzy graph.
+
+# Bump when the compiled layout changes so stale cache files are ignored.
+COMPILER_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.rulebase_cache')
+
+# Step 1: Membership functions shared between the variants
+FULLNESS_TERMS = {
+    'low': ('trimf', [0, 0, 50]),
+    'medium': ('trimf', [20, 50, 80]),
+    'high': ('trimf', [50, 100, 100])
+}
+
+TOXICITY_TERMS = {
+    'none': ('trimf', [0, 0, 10]),
+    'mild': ('trimf', [5, 15, 30]),
+    'moderate': ('trimf', [20, 35, 50]),
+    'high': ('trimf', [45, 60, 70]),
+    'very_high': ('trimf', [60, 75, 90]),
+    'severe': ('trimf', [80, 100, 100])
+}
+
+MOISTURE_TERMS = {
+    'dry': ('trimf', [0, 0, 20]),
+    'slightly_moist': ('trimf', [10, 25, 40]),
+    'moderate': ('trimf', [30, 50, 70]),
+    'wet': ('trimf', [60, 75, 90]),
+    'saturated': ('trimf', [80, 100, 100])
+}
+
+TRIANGULAR_ODOR_TERMS = {
+    'none': ('trimf', [0, 0, 20]),
+    'mild': ('trimf', [10, 25, 40]),
+    'moderate': ('trimf', [30, 50, 70]),
+    'strong': ('trimf', [60, 75, 90]),
+    'very_strong': ('trimf', [80, 100, 100])
+}
+
+GAUSSIAN_ODOR_TERMS = {
+    'none': ('gaussmf', [0, 10]),
+    'mild': ('gaussmf', [25, 10]),
+    'moderate': ('gaussmf', [50, 10]),
+    'strong': ('gaussmf', [75, 10]),
+    'very_strong': ('gaussmf', [100, 10])
+}
+
+TRIANGULAR_WEATHER_TERMS = {
+    'clear': ('trimf', [0, 0, 20]),
+    'cloudy': ('trimf', [10, 30, 50]),
+    'rainy': ('trimf', [30, 50, 70]),
+    'humid': ('trimf', [50, 70, 90]),
+    'hot': ('trimf', [70, 80, 100]),
+    'cold': ('trimf', [0, 20, 40]),
+    'stormy': ('trimf', [60, 90, 100])
+}
+
+TRAPEZOIDAL_WEATHER_TERMS = {
+    'clear': ('trapmf', [0, 0, 10, 20]),
+    'cloudy': ('trapmf', [10, 20, 30, 40]),
+    'rainy': ('trapmf', [30, 40, 50, 60]),
+    'humid': ('trapmf', [50, 60, 70, 80]),
+    'stormy': ('trapmf', [70, 80, 90, 100])
+}
+
+URGENCY_TERMS = {
+    'low': ('trimf', [0, 0, 50]),
+    'medium': ('trimf', [20, 50, 80]),
+    'high': ('trimf', [50, 100, 100])
+}
+
+# Urgency at or above which every front end answers "Empty the bin
+# immediately!"
+THRESHOLD = 85.0
+
+# Step 2: Rule bases
+# app.py - Gaussian odor, trapezoidal weather and a 'critical' output set
+APP_SPEC = {
+    'name': 'app',
+    'universe': [0, 101, 1],
+    'inputs': {
+        'fullness': FULLNESS_TERMS,
+        'toxicity': TOXICITY_TERMS,
+        'moisture': MOISTURE_TERMS,
+        'odor': GAUSSIAN_ODOR_TERMS,
+        'weather': TRAPEZOIDAL_WEATHER_TERMS
+    },
+    'output': 'urgency',
+    'output_terms': dict(URGENCY_TERMS, critical=('trimf', [85, 100, 100])),
+    'rules': [
+        ('rule1', "fullness[high] & odor[very_strong] & toxicity[severe] & moisture[saturated] & weather[stormy]", 'critical'),
+        ('rule2', "fullness[high] & odor[moderate] & toxicity[moderate] & moisture[saturated] & weather[stormy]", 'critical'),
+        ('rule3', "fullness[medium] & odor[very_strong] & toxicity[very_high] & moisture[wet] & weather[humid]", 'critical'),
+        ('rule4', "fullness[high] & odor[strong] & toxicity[severe] & moisture[wet] & weather[stormy]", 'critical'),
+        ('rule5', "fullness[high] & odor[moderate] & toxicity[severe] & moisture[saturated] & weather[stormy]", 'critical'),
+        ('rule6', "fullness[medium] & odor[moderate] & (toxicity[high] | toxicity[very_high]) & moisture[wet] & weather[humid]", 'high'),
+        ('rule7', "fullness[medium] & odor[very_strong] & toxicity[high] & moisture[wet] & weather[humid]", 'critical'),
+        ('rule8', "fullness[medium] & odor[moderate] & toxicity[moderate] & moisture[wet] & weather[stormy]", 'high'),
+        ('rule9', "fullness[high] & odor[very_strong] & toxicity[severe] & moisture[wet] & weather[humid]", 'high'),
+        ('rule10', "fullness[high] & odor[very_strong] & toxicity[moderate] & moisture[wet] & weather[rainy]", 'high'),
+        ('rule11', "fullness[high] & odor[moderate] & toxicity[moderate] & moisture[wet] & weather[cloudy]", 'high'),
+        ('rule12', "fullness[medium] & odor[very_strong] & toxicity[moderate] & moisture[wet] & weather[cloudy]", 'high'),
+        ('rule13', "fullness[medium] & odor[strong] & toxicity[moderate] & moisture[wet] & weather[rainy]", 'high'),
+        ('rule14', "fullness[medium] & odor[mild] & toxicity[moderate] & moisture[wet] & weather[cloudy]", 'medium'),
+        ('rule15', "fullness[medium] & odor[moderate] & toxicity[moderate] & moisture[moderate] & weather[rainy]", 'medium'),
+        ('rule16', "fullness[medium] & odor[strong] & toxicity[mild] & moisture[wet] & weather[cloudy]", 'medium'),
+        ('rule17', "fullness[medium] & odor[moderate] & toxicity[moderate] & moisture[moderate] & weather[cloudy]", 'medium'),
+        ('rule18', "fullness[medium] & odor[moderate] & toxicity[moderate] & moisture[wet] & weather[cloudy]", 'medium'),
+        ('rule19', "fullness[low] & odor[moderate] & toxicity[mild] & moisture[moderate] & weather[rainy]", 'medium'),
+        ('rule20', "fullness[low] & odor[mild] & toxicity[mild] & moisture[wet] & weather[rainy]", 'medium'),
+        ('rule21', "fullness[medium] & odor[moderate] & toxicity[moderate] & moisture[saturated] & weather[cloudy]", 'medium'),
+        ('rule22', "fullness[medium] & odor[mild] & toxicity[mild] & moisture[wet] & weather[cloudy]", 'medium'),
+        ('rule23', "fullness[medium] & odor[moderate] & toxicity[mild] & moisture[wet] & weather[cloudy]", 'medium'),
+        ('rule24', "fullness[low] & odor[none] & toxicity[none] & moisture[dry] & weather[clear]", 'low'),
+        ('rule25', "fullness[low] & odor[mild] & toxicity[none] & moisture[dry] & weather[clear]", 'low'),
+        ('rule26', "fullness[low] & odor[mild] & toxicity[mild] & moisture[slightly_moist] & weather[clear]", 'low'),
+        ('rule27', "fullness[low] & odor[mild] & toxicity[none] & moisture[slightly_moist] & weather[clear]", 'low'),
+        ('rule28', "fullness[high] & odor[mild] & toxicity[moderate] & moisture[moderate] & weather[cloudy]", 'medium'),
+        ('rule29', "fullness[high] & odor[very_strong] & toxicity[high] & moisture[saturated] & weather[stormy]", 'high'),
+        ('rule30', "fullness[low] & odor[mild] & toxicity[moderate] & moisture[wet] & weather[cloudy]", 'medium'),
+        ('rule31', "fullness[low] & odor[mild] & toxicity[mild] & moisture[moderate] & weather[rainy]", 'medium'),
+        ('rule32', "fullness[medium] & odor[moderate] & toxicity[mild] & moisture[wet] & weather[humid]", 'medium'),
+        ('rule33', "fullness[high] & odor[very_strong] & toxicity[moderate] & moisture[wet] & weather[humid]", 'high'),
+        ('rule34', "fullness[low] & odor[none] & toxicity[mild] & moisture[moderate] & weather[cloudy]", 'low'),
+        ('rule35', "fullness[low] & odor[mild] & toxicity[none] & moisture[dry] & weather[cloudy]", 'low'),
+        ('rule36', "fullness[high] & odor[mild] & toxicity[none] & moisture[dry] & weather[cloudy]", 'high'),
+        ('rule37', "fullness[high] & odor[strong] & toxicity[high] & moisture[wet] & weather[stormy]", 'critical'),
+        ('rule38', "fullness[high] & odor[strong] & toxicity[very_high] & moisture[wet] & weather[humid]", 'critical'),
+        ('fallback_rule', "fullness[high]", 'high')  # Fallback for high fullness
+    ]
+}
+
+# wasteDisposal.py - triangular odor/weather with hot and cold weather
+WASTE_DISPOSAL_SPEC = {
+    'name': 'wasteDisposal',
+    'universe': [0, 101, 1],
+    'inputs': {
+        'fullness': FULLNESS_TERMS,
+        'toxicity': TOXICITY_TERMS,
+        'moisture': MOISTURE_TERMS,
+        'odor': TRIANGULAR_ODOR_TERMS,
+        'weather': TRIANGULAR_WEATHER_TERMS
+    },
+    'output': 'urgency',
+    'output_terms': URGENCY_TERMS,
+    'rules': [
+        ('rule1', "fullness[high] & odor[very_strong] & weather[stormy] & toxicity[severe]", 'high'),
+        ('rule2', "fullness[medium] & (toxicity[very_high] | toxicity[severe]) & (moisture[wet] | weather[rainy])", 'high'),
+        ('rule3', "fullness[low] & odor[none] & moisture[dry] & weather[clear] & toxicity[none]", 'low'),
+        ('rule4', "moisture[saturated] & fullness[medium] & weather[cloudy] & toxicity[moderate]", 'medium'),
+        ('rule5', "odor[strong] & fullness[high] & (toxicity[high] | toxicity[very_high]) & weather[hot]", 'high'),
+        ('rule6', "fullness[high] & (moisture[saturated] | moisture[wet]) & weather[humid] & toxicity[high]", 'high'),
+        ('rule7', "toxicity[severe] & weather[stormy] & odor[very_strong]", 'high'),
+        ('rule8', "odor[moderate] & (moisture[wet] | moisture[saturated]) & weather[humid]", 'medium'),
+        ('rule9', "fullness[medium] & odor[moderate] & toxicity[mild] & weather[cold]", 'medium'),
+        ('rule10', "fullness[low] & odor[strong] & weather[rainy] & toxicity[mild]", 'medium'),
+        ('rule11', "fullness[high] & (moisture[dry] | moisture[slightly_moist]) & (toxicity[none] | odor[none])", 'low'),
+        ('rule12', "toxicity[severe] & moisture[saturated] & odor[very_strong] & weather[stormy]", 'high'),
+        ('rule13', "odor[none] & fullness[medium] & weather[clear] & toxicity[none]", 'low'),
+        ('rule14', "fullness[low] & (moisture[wet] | moisture[slightly_moist]) & (toxicity[mild] | weather[cloudy])", 'low'),
+        ('rule15', "toxicity[moderate] & fullness[high] & (moisture[moderate] | weather[hot])", 'medium'),
+        ('rule16', "fullness[medium] & odor[strong] & weather[humid] & (toxicity[high] | toxicity[very_high])", 'high'),
+        ('rule17', "odor[very_strong] & fullness[high] & (toxicity[moderate] | toxicity[high]) & weather[stormy]", 'high'),
+        ('rule18', "toxicity[high] & (moisture[dry] | odor[none]) & weather[clear]", 'medium'),
+        ('rule19', "toxicity[none] & fullness[low] & (odor[none] & moisture[dry])", 'low'),
+        ('rule20', "toxicity[mild] & (odor[mild] | odor[moderate]) & fullness[medium] & weather[cold]", 'medium'),
+        ('rule21', "fullness[high] & (moisture[saturated] | moisture[wet]) & (odor[very_strong] | weather[humid])", 'high'),
+        ('rule22', "odor[very_strong] & toxicity[very_high] & weather[stormy]", 'high'),
+        ('rule23', "moisture[wet] & fullness[low] & toxicity[mild] & weather[clear]", 'low'),
+        ('rule24', "fullness[medium] & odor[moderate] & moisture[wet] & (toxicity[moderate] | weather[rainy])", 'medium'),
+        ('rule25', "odor[very_strong] & moisture[saturated] & fullness[medium] & (toxicity[severe] | weather[stormy])", 'high'),
+        ('rule26', "moisture[moderate] & fullness[low] & odor[mild] & toxicity[mild]", 'low'),
+        ('rule27', "moisture[saturated] & fullness[high] & (toxicity[severe] | odor[very_strong])", 'high'),
+        ('rule28', "odor[mild] & fullness[medium] & moisture[slightly_moist] & (weather[cloudy] | toxicity[mild])", 'medium'),
+        ('rule29', "fullness[medium] & moisture[dry] & odor[none] & weather[clear]", 'low'),
+        ('rule30', "fullness[high] & (moisture[wet] | moisture[saturated]) & weather[hot] & toxicity[high]", 'high'),
+        ('rule31', "(fullness[low] | fullness[medium]) & moisture[wet] & weather[humid]", 'medium'),
+        ('rule32', "odor[mild] & fullness[low] & (moisture[dry] | weather[clear])", 'low'),
+        ('rule33', "odor[strong] & fullness[medium] & (toxicity[moderate] | weather[humid])", 'medium'),
+        ('rule34', "fullness[low] & toxicity[none] & moisture[slightly_moist] & odor[mild]", 'low'),
+        ('rule35', "weather[cold] & fullness[medium] & odor[mild]", 'medium'),
+        ('rule36', "fullness[high] & weather[hot] & odor[very_strong]", 'high'),
+        ('rule37', "weather[rainy] & moisture[wet] & fullness[medium]", 'medium'),
+        ('rule38', "odor[moderate] & moisture[saturated] & fullness[low]", 'medium'),
+        ('rule39', "fullness[high] & (odor[none] | moisture[slightly_moist]) & weather[clear]", 'low'),
+        ('rule40', "moisture[moderate] & odor[moderate] & fullness[medium] & weather[cloudy]", 'medium'),
+        # Comprehensive fallback rule to cover all remaining cases
+        ('rule_default', "~fullness[high] & ~toxicity[severe] & ~moisture[saturated] & ~odor[very_strong]", 'high')
+    ]
+}
+
+# wastedisposalDiffMembership.py - the short rule set behind the JSON API
+DIFF_MEMBERSHIP_SPEC = {
+    'name': 'diffMembership',
+    'universe': [0, 101, 1],
+    'inputs': {
+        'fullness': FULLNESS_TERMS,
+        'toxicity': TOXICITY_TERMS,
+        'moisture': MOISTURE_TERMS,
+        'odor': GAUSSIAN_ODOR_TERMS,
+        'weather': TRAPEZOIDAL_WEATHER_TERMS
+    },
+    'output': 'urgency',
+    'output_terms': URGENCY_TERMS,
+    'rules': [
+        ('rule1', "fullness[high] & odor[very_strong] & weather[stormy] & toxicity[severe]", 'high'),
+        ('rule2', "fullness[medium] & (toxicity[very_high] | toxicity[severe]) & (moisture[wet] | weather[rainy])", 'high'),
+        ('rule3', "fullness[low] & odor[none] & moisture[dry] & weather[clear] & toxicity[none]", 'low'),
+        ('rule4', "moisture[saturated] & fullness[medium] & weather[cloudy] & toxicity[moderate]", 'medium'),
+        ('rule5', "odor[strong] & fullness[high] & (toxicity[high] | toxicity[very_high]) & weather[clear]", 'high'),
+        # Fallback rule
+        ('fallback_rule', "~fullness[high] & ~toxicity[severe] & ~moisture[saturated] & ~odor[very_strong]", 'low')
+    ]
+}
+
+# wasteDisposalUpdate1.py - rules derived from clustering and the decision tree
+UPDATE1_SPEC = {
+    'name': 'wasteDisposalUpdate1',
+    'universe': [0, 101, 1],
+    'inputs': {
+        'fullness': FULLNESS_TERMS,
+        'toxicity': TOXICITY_TERMS,
+        'moisture': MOISTURE_TERMS,
+        'odor': TRIANGULAR_ODOR_TERMS,
+        'weather': TRIANGULAR_WEATHER_TERMS
+    },
+    'output': 'urgency',
+    'output_terms': URGENCY_TERMS,
+    'rules': [
+        ('rule1', "fullness[high] & toxicity[high] & moisture[wet]", 'high'),
+        ('rule2', "fullness[low] & odor[none] & weather[clear]", 'low'),
+        ('rule3', "moisture[saturated] & weather[stormy]", 'high'),
+        ('rule4', "fullness[medium] & toxicity[moderate] & weather[rainy]", 'medium'),
+        ('rule5', "fullness[low] & odor[mild] & weather[cloudy]", 'low'),
+        # Fallback rule
+        ('rule_default', "~fullness[high] & ~toxicity[severe] & ~moisture[saturated]", 'medium')
+    ]
+}
+
+VARIANTS = {spec['name']: spec for spec in (APP_SPEC, WASTE_DISPOSAL_SPEC, DIFF_MEMBERSHIP_SPEC, UPDATE1_SPEC)}
+
+
+# Step 3: Parse rule expressions into ('term' | 'and' | 'or' | 'not', ...) trees.
+# Precedence follows Python: ~ binds tighter than &, which binds tighter than |.
+_TOKEN = re.compile(r"\s*(?:(\w+)\[(\w+)\]|([&|~()]))")
+
+
+def parse_expression(text):
+    tokens = []
+    position = 0
+    while position < len(text.rstrip()):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Cannot parse rule expression at {text[position:]!r}")
+        tokens.append(('term', match.group(1), match.group(2)) if match.group(1) else match.group(3))
+        position = match.end()
+
+    def parse_or(i):
+        node, i = parse_and(i)
+        while i < len(tokens) and tokens[i] == '|':
+            right, i = parse_and(i + 1)
+            node = ('or', node, right)
+        return node, i
+
+    def parse_and(i):
+        node, i = parse_unary(i)
+        while i < len(tokens) and tokens[i] == '&':
+            right, i = parse_unary(i + 1)
+            node = ('and', node, right)
+        return node, i
+
+    def parse_unary(i):
+        if i >= len(tokens):
+            raise ValueError(f"Unexpected end of rule expression {text!r}")
+        token = tokens[i]
+        if token == '~':
+            node, i = parse_unary(i + 1)
+            return ('not', node), i
+        if token == '(':
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i] != ')':
+                raise ValueError(f"Unbalanced parentheses in {text!r}")
+            return node, i + 1
+        if isinstance(token, tuple):
+            return token, i + 1
+        raise ValueError(f"Unexpected {token!r} in rule expression {text!r}")
+
+    node, i = parse_or(0)
+    if i != len(tokens):
+        raise ValueError(f"Trailing tokens in rule expression {text!r}")
+    return node
+
+
+def _tree_to_cnf(node, term_index, negate=False):
+    kind = node[0]
+    if kind == 'term':
+        literal = term_index[node[1], node[2]]
+        return [frozenset([-literal - 1 if negate else literal])]
+    if kind == 'not':
+        return _tree_to_cnf(node[1], term_index, not negate)
+    left = _tree_to_cnf(node[1], term_index, negate)
+    right = _tree_to_cnf(node[2], term_index, negate)
+    if (kind == 'and') != negate:
+        return left + right
+    return [a | b for a in left for b in right]
+
+
+def sample_membership(universe, kind, params):
+    import skfuzzy as fuzz
+    if kind == 'trimf':
+        return fuzz.trimf(universe, params)
+    if kind == 'trapmf':
+        return fuzz.trapmf(universe, params)
+    if kind == 'gaussmf':
+        return fuzz.gaussmf(universe, *params)
+    raise ValueError(f"Unsupported membership function '{kind}'")
+
+
+# Exact (x, y) vertices of a piecewise-linear membership function, or None
+# when it has none (gaussmf) or has a vertical edge inside the universe; the
+# analytic defuzzifier then uses the sampled shape instead.
+def membership_vertices(universe, kind, params):
+    if kind == 'trimf':
+        x, y = list(params), [0.0, 1.0, 0.0]
+    elif kind == 'trapmf':
+        x, y = list(params), [0.0, 1.0, 1.0, 0.0]
+    else:
+        return None
+    if x[0] == x[1]:
+        if x[0] > universe[0]:
+            return None
+        x, y = x[1:], y[1:]
+    if x[-1] == x[-2]:
+        if x[-1] < universe[-1]:
+            return None
+        x, y = x[:-1], y[:-1]
+    return np.array(x, dtype=np.float64), np.array(y, dtype=np.float64)
+
+
+def spec_hash(spec):
+    payload = json.dumps({'spec': spec, 'compiler': COMPILER_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Step 4: Compile a spec straight into the batch engine's array form
+def compile_spec(spec):
+    universe = np.arange(*spec['universe'])
+    input_labels = list(spec['inputs'])
+
+    term_index = {}
+    input_terms, input_membership = [], []
+    for label in input_labels:
+        terms = spec['inputs'][label]
+        for term in terms:
+            term_index[label, term] = len(term_index)
+        input_terms.append(list(terms))
+        input_membership.append(np.array([sample_membership(universe, *terms[t]) for t in terms]))
+
+    output_terms = list(spec['output_terms'])
+    rule_labels, rule_clauses, activation_term = [], [], []
+    for name, expression, consequent in spec['rules']:
+        clauses = _tree_to_cnf(parse_expression(expression), term_index)
+        rule_labels.append(name)
+        rule_clauses.append(simplify_cnf(clauses))
+        activation_term.append(output_terms.index(consequent))
+
+    return CompiledRuleBase(
+        input_labels=input_labels,
+        input_universes=[universe] * len(input_labels),
+        input_terms=input_terms,
+        input_membership=input_membership,
+        output_label=spec['output'],
+        output_universe=universe,
+        output_terms=output_terms,
+        output_membership=np.array([sample_membership(universe, *spec['output_terms'][t])
+                                    for t in output_terms]),
+        rule_labels=rule_labels,
+        rule_clauses=rule_clauses,
+        activation_rule=np.arange(len(rule_labels)),
+        activation_term=activation_term,
+        activation_weight=np.ones(len(rule_labels)),
+        output_vertices=[membership_vertices(universe, *spec['output_terms'][t]) for t in output_terms],
+    )
+
+
+# Compiled rule base for a spec, from memory, then the on-disk cache, then a
+# fresh compile.  Cache files are written atomically so concurrently started
+# workers never read a half-written file.
+def load_compiled(spec, cache_dir=DEFAULT_CACHE_DIR):
+    return _load_compiled(spec_hash(spec), json.dumps(spec), cache_dir)
+
+
+@lru_cache(maxsize=None)
+def _load_compiled(key, spec_json, cache_dir):
+    spec = json.loads(spec_json)
+    path = os.path.join(cache_dir, f"{spec['name']}-{key[:16]}.npz")
+    if os.path.exists(path):
+        try:
+            return CompiledRuleBase.load(path)
+        except (OSError, ValueError, KeyError):
+            pass  # Corrupt or outdated file; recompile below
+
+    rule_base = compile_spec(spec)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        rule_base.save(f)
+    os.replace(temporary, path)
+    return rule_base
+
+
+# Names build_control_system() defines, known without building anything
+def fuzzy_object_names(spec):
+    return ({*spec['inputs'], spec['output'], 'rules', 'waste_ctrl', 'waste_sim'}
+            | {name for name, _, _ in spec['rules']})
+
+
+# Step 5: The equivalent skfuzzy objects, for plotting and reference runs.
+# Returns a namespace dict with every variable, every rule by name, 'rules',
+# 'waste_ctrl' and 'waste_sim'.
+def build_control_system(spec):
+    from skfuzzy import control as ctrl
+
+    universe = np.arange(*spec['universe'])
+    namespace = {}
+    for label, terms in spec['inputs'].items():
+        namespace[label] = ctrl.Antecedent(universe, label)
+        for term, (kind, params) in terms.items():
+            namespace[label][term] = sample_membership(universe, kind, params)
+
+    output = ctrl.Consequent(universe, spec['output'])
+    for term, (kind, params) in spec['output_terms'].items():
+        output[term] = sample_membership(universe, kind, params)
+    namespace[spec['output']] = output
+
+    def build(node):
+        kind = node[0]
+        if kind == 'term':
+            return namespace[node[1]][node[2]]
+        if kind == 'not':
+            return ~build(node[1])
+        if kind == 'and':
+            return build(node[1]) & build(node[2])
+        return build(node[1]) | build(node[2])
+
+    rules = []
+    for name, expression, consequent in spec['rules']:
+        rule = ctrl.Rule(build(parse_expression(expression)), output[consequent], label=name)
+        namespace[name] = rule
+        rules.append(rule)
+
+    namespace['rules'] = rules
+    namespace['waste_ctrl'] = ctrl.ControlSystem(rules)
+    namespace['waste_sim'] = ctrl.ControlSystemSimulation(namespace['waste_ctrl'])
+    return namespace
@@ -0,0 +1,147 @@
+import argparse
+import itertools
+import os
+import time
+import warnings
+
+import numpy as np
+from scipy.stats import qmc
+
+from batchInference import INPUT_LABELS
+from fleetSweep import sweep
+from ruleSpec import VARIANTS
+
+# Global sensitivity and response-surface analysis of the rule-base variants.
+#
+# For every variant one quasi-random design is assembled and scored in a
+# single fleetSweep.sweep() call (process pool, shared memory):
+#   * Sobol indices from a Saltelli design: scrambled Sobol matrices A and B
+#     plus A with column i taken from B, N * (d + 2) rows.  First-order
+#     indices use the Saltelli (2010) estimator, total-order Jansen's.
+#   * partial dependence: each input swept over a grid while the others
+#     take the values of a Sobol background sample, averaged per grid point
+#   * 2-D slices: every pair of inputs on a grid, the rest held at --baseline
+# Inputs with no rule coverage score NaN.  By default Sobol estimates only
+# use rows whose required scores are all covered (so they describe the
+# covered region) and partial dependence is averaged over covered rows, with
+# the covered fraction reported next to it; --fill scores uncovered inputs
+# as a fixed value instead.
+#
+# Results go to <output-dir>/sensitivity_<variant>.npz (float32 arrays).
+
+LOW, HIGH = 0.0, 100.0
+
+
+def saltelli_design(base_samples, seed):
+    d = len(INPUT_LABELS)
+    ab = qmc.scale(qmc.Sobol(2 * d, seed=seed).random(base_samples), [LOW] * 2 * d, [HIGH] * 2 * d)
+    a, b = ab[:, :d], ab[:, d:]
+    ab_i = np.repeat(a[None], d, axis=0)
+    for i in range(d):
+        ab_i[i, :, i] = b[:, i]
+    return a, b, ab_i
+
+
+def sobol_indices(f_a, f_b, f_ab):
+    d = len(f_ab)
+    first, total, used = np.full(d, np.nan), np.full(d, np.nan), np.zeros(d, dtype=int)
+    for i in range(d):
+        ok = ~np.isnan(f_a) & ~np.isnan(f_b) & ~np.isnan(f_ab[i])
+        used[i] = ok.sum()
+        if used[i] < 2:
+            continue
+        both = np.concatenate([f_a[ok], f_b[ok]])
+        variance = np.var(both)
+        if variance == 0:
+            continue
+        # Centering f_B keeps the estimator stable when the covered subset
+        # has a different mean than the full design
+        first[i] = np.mean((f_b[ok] - both.mean()) * (f_ab[i][ok] - f_a[ok])) / variance
+        total[i] = 0.5 * np.mean((f_a[ok] - f_ab[i][ok]) ** 2) / variance
+    return first, total, used
+
+
+def partial_dependence_design(grid, background):
+    d = len(INPUT_LABELS)
+    rows = np.repeat(background[None, None], d, axis=0).repeat(len(grid), axis=1)
+    for i in range(d):
+        rows[i, :, :, i] = grid[:, None]
+    return rows  # (inputs, grid, background, inputs)
+
+
+def slice_design(grid, baseline):
+    pairs = list(itertools.combinations(range(len(INPUT_LABELS)), 2))
+    rows = np.empty((len(pairs), len(grid), len(grid), len(INPUT_LABELS)))
+    rows[:] = baseline
+    for k, (i, j) in enumerate(pairs):
+        rows[k, :, :, i] = grid[:, None]
+        rows[k, :, :, j] = grid[None, :]
+    return np.array(pairs), rows
+
+
+def analyze(variant, base_samples=4096, grid_points=41, background_samples=256, baseline=50.0,
+            workers=None, seed=0, fill=None):
+    d = len(INPUT_LABELS)
+    grid = np.linspace(LOW, HIGH, grid_points)
+    a, b, ab_i = saltelli_design(base_samples, seed)
+    background = qmc.scale(qmc.Sobol(d, seed=seed + 1).random(background_samples), [LOW] * d, [HIGH] * d)
+    pd_rows = partial_dependence_design(grid, background)
+    pairs, slice_rows = slice_design(grid, np.broadcast_to(baseline, (d,)))
+
+    blocks = [a, b, ab_i.reshape(-1, d), pd_rows.reshape(-1, d), slice_rows.reshape(-1, d)]
+    scores, report = sweep(np.concatenate(blocks), variant, workers)
+    coverage = float(np.mean(~np.isnan(scores[:base_samples])))
+    if fill is not None:
+        scores[np.isnan(scores)] = fill
+    f_a, f_b, f_ab, f_pd, f_slice = np.split(scores, np.cumsum([len(block) for block in blocks])[:-1])
+
+    first, total, used = sobol_indices(f_a, f_b, f_ab.reshape(d, base_samples))
+    f_pd = f_pd.reshape(d, grid_points, background_samples)
+    covered = ~np.isnan(f_pd)
+    # Grid points where no background row is covered stay NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        pd_mean = np.nanmean(f_pd, axis=2)
+
+    return {
+        'labels': np.array(INPUT_LABELS),
+        'first_order': first.astype(np.float32),
+        'total_order': total.astype(np.float32),
+        'sobol_rows_used': used,
+        'coverage': np.float32(coverage),
+        'grid': grid.astype(np.float32),
+        'partial_dependence': pd_mean.astype(np.float32),
+        'partial_dependence_coverage': covered.mean(axis=2).astype(np.float32),
+        'slice_pairs': pairs,
+        'slice_baseline': np.float32(baseline),
+        'slices': f_slice.reshape(len(pairs), grid_points, grid_points).astype(np.float32),
+    }, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sobol sensitivity, partial dependence and 2-D slices per rule base")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--samples', type=int, default=4096, help="Saltelli base samples (power of 2)")
+    parser.add_argument('--grid', type=int, default=41, help="grid points per input for PD curves and slices")
+    parser.add_argument('--background', type=int, default=256, help="background samples per PD grid point")
+    parser.add_argument('--baseline', type=float, default=50.0, help="value of the inputs held fixed in slices")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--fill', type=float, help="score for inputs no rule covers (default: leave them out)")
+    parser.add_argument('--output-dir', default='.')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for variant in args.variants:
+        start = time.perf_counter()
+        result, report = analyze(variant, args.samples, args.grid, args.background, args.baseline,
+                                 args.workers, args.seed, args.fill)
+        path = os.path.join(args.output_dir, f'sensitivity_{variant}.npz')
+        np.savez_compressed(path, **result)
+
+        print(f"{variant}: {report['rows']:,} evaluations in {time.perf_counter() - start:.1f}s "
+              f"({report['throughput_per_s']:,.0f}/s), coverage {result['coverage']:.1%} -> {path}")
+        for label, s1, st, pd in zip(INPUT_LABELS, result['first_order'], result['total_order'],
+                                     result['partial_dependence']):
+            pd_range = f"{np.nanmin(pd):6.2f} .. {np.nanmax(pd):6.2f}" if not np.isnan(pd).all() else "uncovered"
+            print(f"    {label:<9} S1 {s1:6.3f}  ST {st:6.3f}  PD range {pd_range}")
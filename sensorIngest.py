@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from batchInference import BatchInferenceEngine
+from ruleSpec import THRESHOLD, VARIANTS, load_compiled
+
+# Streaming ingest: timestamped per-bin readings in, urgency changes out.
+#
+# Readings are JSON objects such as
+#     {"bin": "b-17", "ts": 1718000000.5, "fullness": 62.0, "odor": 40}
+# Any subset of the five inputs may be present; inputs a bin has never
+# reported default to 0, like /predict.  Each bin keeps one fixed-size state
+# record (latest inputs, inputs at the last score, last score, last ts), and
+# at most max_bins bins are tracked (least recently updated bins are dropped
+# first), so memory is bounded regardless of stream length.
+#
+# A bin is rescored only when one of its inputs has moved more than `delta`
+# away from the value used for its last score.  Readings are applied in
+# micro-batches and all bins that became dirty in a batch are scored in one
+# engine call, which is what lets the pipeline keep up with a busy stream.
+#
+# Emitted events:
+#     {"bin", "ts", "urgency", "previous", "decision", "crossed"}
+# crossed is "above"/"below" when the score crosses the threshold (ruleSpec's
+# THRESHOLD cut-off for "Empty the bin immediately!" by default), else
+# null.  urgency is null when no rule fires for the bin's inputs.
+
+DEFAULT_DELTA = 1.0
+DEFAULT_BATCH_SIZE = 1024
+DEFAULT_MAX_BINS = 1_000_000
+
+# Smallest score change worth emitting when no threshold is crossed
+MIN_SCORE_CHANGE = 0.01
+
+
+class BinState:
+    __slots__ = ('values', 'scored', 'urgency', 'ts')
+
+    def __init__(self, n_inputs):
+        self.values = np.zeros(n_inputs)
+        self.scored = None
+        self.urgency = None
+        self.ts = float('-inf')
+
+
+def decision_for(urgency, threshold=THRESHOLD):
+    if urgency is None:
+        return None
+    return "Empty the bin immediately!" if urgency >= threshold else "No immediate need to empty the bin."
+
+
+class IncrementalRescorer:
+    def __init__(self, engine, delta=DEFAULT_DELTA, threshold=THRESHOLD, max_bins=DEFAULT_MAX_BINS):
+        self.engine = engine
+        self.labels = engine.input_labels
+        self.delta = delta
+        self.threshold = threshold
+        self.max_bins = max_bins
+        self.bins = OrderedDict()
+        self.counts = {'readings': 0, 'stale': 0, 'invalid': 0, 'rescored': 0, 'events': 0, 'evicted': 0}
+
+    # Applies one reading; returns the bin id when it now needs rescoring
+    def apply(self, reading):
+        self.counts['readings'] += 1
+        try:
+            bin_id = reading['bin']
+            hash(bin_id)
+            ts = float(reading.get('ts', time.time()))
+            updates = [(i, float(reading[label])) for i, label in enumerate(self.labels) if label in reading]
+        except (KeyError, TypeError, ValueError):
+            self.counts['invalid'] += 1
+            return None
+
+        state = self.bins.get(bin_id)
+        if state is None:
+            state = self.bins[bin_id] = BinState(len(self.labels))
+            if len(self.bins) > self.max_bins:
+                self.bins.popitem(last=False)
+                self.counts['evicted'] += 1
+        else:
+            self.bins.move_to_end(bin_id)
+        if ts < state.ts:
+            self.counts['stale'] += 1
+            return None
+
+        state.ts = ts
+        for i, value in updates:
+            state.values[i] = value
+        if state.scored is None or np.max(np.abs(state.values - state.scored)) > self.delta:
+            return bin_id
+        return None
+
+    # Scores the given bins in one engine call and returns their events
+    def rescore(self, bin_ids):
+        bin_ids = [bin_id for bin_id in dict.fromkeys(bin_ids) if bin_id in self.bins]
+        if not bin_ids:
+            return []
+        states = [self.bins[bin_id] for bin_id in bin_ids]
+        scores = self.engine.compute(np.array([state.values for state in states]))
+        self.counts['rescored'] += len(states)
+
+        events = []
+        for bin_id, state, score in zip(bin_ids, states, scores.tolist()):
+            urgency = None if np.isnan(score) else score
+            previous = state.urgency
+            first = state.scored is None
+            state.scored = state.values.copy()
+            state.urgency = urgency
+
+            was_above = previous is not None and previous >= self.threshold
+            is_above = urgency is not None and urgency >= self.threshold
+            crossed = None if was_above == is_above else ('above' if is_above else 'below')
+            if not first and crossed is None:
+                if previous is None and urgency is None:
+                    continue
+                if previous is not None and urgency is not None and abs(urgency - previous) < MIN_SCORE_CHANGE:
+                    continue
+            events.append({
+                'bin': bin_id,
+                'ts': state.ts,
+                'urgency': None if urgency is None else round(urgency, 2),
+                'previous': None if previous is None else round(previous, 2),
+                'decision': decision_for(urgency, self.threshold),
+                'crossed': crossed,
+            })
+        self.counts['events'] += len(events)
+        return events
+
+    def process(self, readings):
+        dirty = [bin_id for bin_id in map(self.apply, readings) if bin_id is not None]
+        return self.rescore(dirty)
+
+
+# Step 1: Sources.  Synchronous ones are plain generators of reading dicts.
+def parse_line(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return {}
+
+
+def file_readings(path, follow=False, poll_interval=0.5):
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if not line:
+                if not follow:
+                    return
+                time.sleep(poll_interval)
+                continue
+            reading = parse_line(line)
+            if reading is not None:
+                yield reading
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Step 2: Generator pipeline: readings in, event lists out per micro-batch
+def pipeline(readings, rescorer, batch_size=DEFAULT_BATCH_SIZE):
+    for batch in batched(readings, batch_size):
+        events = rescorer.process(batch)
+        if events:
+            yield events
+
+
+# Step 3: asyncio pipeline.  Producers put readings on a bounded
+# asyncio.Queue (the local queue stand-in; a full queue back-pressures the
+# producers), the consumer drains whatever is waiting up to batch_size and
+# hands each batch's events to `emit`.
+async def consume(queue, rescorer, emit, batch_size=DEFAULT_BATCH_SIZE):
+    while True:
+        reading = await queue.get()
+        if reading is None:
+            return
+        batch = [reading]
+        done = False
+        while len(batch) < batch_size and not queue.empty():
+            reading = queue.get_nowait()
+            if reading is None:
+                done = True
+                break
+            batch.append(reading)
+        events = rescorer.process(batch)
+        if events:
+            await emit(events)
+        if done:
+            return
+
+
+async def serve_socket(queue, host, port):
+    async def handle(reader, writer):
+        while line := await reader.readline():
+            reading = parse_line(line.decode())
+            if reading is not None:
+                await queue.put(reading)
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+def simulated_readings(bins, count, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 100, size=(bins, 5))
+    labels = ('fullness', 'toxicity', 'moisture', 'odor', 'weather')
+    for n in range(count):
+        i = int(rng.integers(bins))
+        # Bins mostly report fullness, odor and moisture, drifting slowly
+        j = (0, 2, 3)[n % 3]
+        values[i, j] = min(100.0, max(0.0, values[i, j] + rng.normal(0.5, 1.5)))
+        yield {'bin': f'bin-{i}', 'ts': float(n), labels[j]: float(values[i, j]),
+               **({'toxicity': float(values[i, 1]), 'weather': float(values[i, 4])} if n < bins else {})}
+
+
+async def write_events(events):
+    sys.stdout.write(''.join(json.dumps(event) + '\n' for event in events))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rescore bins incrementally from a stream of readings")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--file', help="NDJSON readings file ('-' for stdin)")
+    source.add_argument('--listen', metavar='HOST:PORT', help="accept NDJSON readings over TCP")
+    source.add_argument('--simulate', type=int, default=200_000, help="synthetic readings (default source)")
+    parser.add_argument('--follow', action='store_true', help="keep reading --file as it grows")
+    parser.add_argument('--bins', type=int, default=10_000, help="bins in the simulated fleet")
+    parser.add_argument('--variant', choices=list(VARIANTS), default='app')
+    parser.add_argument('--delta', type=float, default=DEFAULT_DELTA)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-bins', type=int, default=DEFAULT_MAX_BINS)
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    args = parser.parse_args()
+
+    rescorer = IncrementalRescorer(BatchInferenceEngine(load_compiled(VARIANTS[args.variant])),
+                                   args.delta, max_bins=args.max_bins)
+
+    async def emit(events):
+        if not args.quiet:
+            await write_events(events)
+
+    start = time.perf_counter()
+    if args.listen:
+        host, port = args.listen.rsplit(':', 1)
+
+        async def main():
+            queue = asyncio.Queue(maxsize=args.batch_size * 4)
+            server = await serve_socket(queue, host, int(port))
+            async with server:
+                await consume(queue, rescorer, emit, args.batch_size)
+
+        asyncio.run(main())
+    else:
+        if args.file:
+            readings = (filter(None, map(parse_line, sys.stdin)) if args.file == '-'
+                        else file_readings(args.file, args.follow))
+        else:
+            readings = simulated_readings(args.bins, args.simulate)
+        for events in pipeline(readings, rescorer, args.batch_size):
+            if not args.quiet:
+                sys.stdout.write(''.join(json.dumps(event) + '\n' for event in events))
+    elapsed = time.perf_counter() - start
+
+    counts = rescorer.counts
+    print(f"{counts['readings']:,} readings in {elapsed:.2f}s ({counts['readings'] / elapsed:,.0f}/s), "
+          f"{counts['rescored']:,} rescores, {counts['events']:,} events, {counts['stale']} stale, "
+          f"{counts['invalid']} invalid, {counts['evicted']} evicted, {len(rescorer.bins):,} bins tracked",
+          file=sys.stderr)
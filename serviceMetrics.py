@@ -0,0 +1,141 @@
+import ipaddress
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# In-process request metrics rendered in the Prometheus text exposition
+# format (version 0.0.4).
+#
+# Recording is a bisect plus a couple of integer additions under a lock;
+# nothing is formatted until /metrics is scraped, so an unscraped service
+# only pays for the perf_counter() calls around each stage.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds: 25us .. 1s
+DEFAULT_BUCKETS = (0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}",
+                f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+
+class _StageTimer:
+    __slots__ = ('histogram', 'stage', 'start')
+
+    def __init__(self, histogram, stage):
+        self.histogram = histogram
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+# One histogram series per request stage, exported with a stage="..." label
+class StageHistogram:
+    def __init__(self, name, help, stages, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {stage: [[0] * (len(self.buckets) + 1), 0.0] for stage in stages}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series[stage]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def time(self, stage):
+        return _StageTimer(self, stage)
+
+    def render(self):
+        with self._lock:
+            snapshot = {stage: (list(counts), total) for stage, (counts, total) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for stage, (counts, total) in snapshot.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{stage="{stage}"}} {total!r}')
+            lines.append(f'{self.name}_count{{stage="{stage}"}} {cumulative}')
+        return lines
+
+
+# Exports QuantizedResultCache.stats() at scrape time
+class CacheCollector:
+    COUNTERS = ('hits', 'misses', 'evictions', 'invalidations')
+    GAUGES = ('size', 'maxsize')
+
+    def __init__(self, prefix, cache):
+        self.prefix = prefix
+        self.cache = cache
+
+    def render(self):
+        stats = self.cache.stats()
+        lines = []
+        for key in self.COUNTERS:
+            name = f"{self.prefix}_{key}_total"
+            lines += [f"# HELP {name} Result cache {key}", f"# TYPE {name} counter", f"{name} {stats[key]}"]
+        for key in self.GAUGES:
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} Result cache {key}", f"# TYPE {name} gauge", f"{name} {stats[key]}"]
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self._metrics = []
+
+    def counter(self, name, help):
+        return self._register(Counter(f"{self.namespace}_{name}", help))
+
+    def stage_histogram(self, name, help, stages, buckets=DEFAULT_BUCKETS):
+        return self._register(StageHistogram(f"{self.namespace}_{name}", help, stages, buckets))
+
+    def cache(self, name, cache):
+        return self._register(CacheCollector(f"{self.namespace}_{name}", cache))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+# /metrics is only served to loopback clients unless METRICS_ALLOW_REMOTE=1
+def metrics_allowed(remote_addr):
+    if os.environ.get('METRICS_ALLOW_REMOTE') == '1':
+        return True
+    try:
+        return ipaddress.ip_address(remote_addr or '').is_loopback
+    except ValueError:
+        return False
@@ -0,0 +1,310 @@
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+from batchInference import DEFAULT_CHUNK_SIZE, SPARSE_MIN_ROWS, BatchInferenceEngine, interp_rows, universe_slots
+from ruleSpec import THRESHOLD, VARIANTS, load_compiled
+
+# Shadow evaluation: one input batch scored against several rule-base
+# variants in a single pass, the first variant being the primary (the one
+# whose decisions are served) and the others shadows.
+#
+# Fuzzification is shared: every (universe, membership functions) pair of
+# an input variable is fuzzified once per chunk, and all variants that
+# declare the same terms over the same universe reuse its memberships and
+# universe slots.  app and diffMembership share all five inputs, for
+# example, and wasteDisposal differs from them only in odor and weather.
+# Rule evaluation and defuzzification remain per variant.  Scores are
+# identical to each variant's own BatchInferenceEngine.compute().
+#
+# The report has, per variant: coverage, decisions at THRESHOLD, and
+# fuzzification / inference time (a shared fuzzification is split evenly
+# between the variants using it); per shadow: decision disagreements with
+# the primary (covered by one and not the other counts as a disagreement),
+# score differences where both are covered, and example rows.
+#
+# Fuzzification is a small part of the cost; rule evaluation and
+# defuzzification dominate.  For live traffic serve() therefore scores only
+# the primary on the caller's thread and hands the shadows, with the
+# fuzzified inputs, to a background thread that accumulates live_report():
+# the response is delayed by the shared fuzzification only.  The shadows
+# cost several times the primary, so at most max_backlog requests may wait
+# for them; requests arriving while the backlog is full are served without
+# shadowing and counted as dropped.  Failed shadow work is logged.
+
+DEFAULT_MAX_BACKLOG = 8
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    def __init__(self, variants, defuzzifier='sampled', chunk_size=DEFAULT_CHUNK_SIZE, threshold=THRESHOLD,
+                 max_backlog=DEFAULT_MAX_BACKLOG):
+        self.variants = list(variants)
+        self.max_backlog = max_backlog
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.engines = {name: BatchInferenceEngine(load_compiled(VARIANTS[name]), defuzzifier=defuzzifier,
+                                                   chunk_size=chunk_size) for name in self.variants}
+        labels = {engine.input_labels for engine in self.engines.values()}
+        if len(labels) != 1:
+            raise ValueError(f"variants disagree on input variables: {sorted(labels)}")
+        self.input_labels = labels.pop()
+
+        # Per input variable: the distinct (universe, membership) pairs and,
+        # per variant, which of them it uses
+        self.fuzzifiers = [[] for _ in self.input_labels]
+        self.uses = {name: [] for name in self.variants}
+        for name, engine in self.engines.items():
+            rb = engine.rule_base
+            for v, (universe, membership) in enumerate(zip(rb.input_universes, rb.input_membership)):
+                shared = self.fuzzifiers[v]
+                for i, (u, m) in enumerate(shared):
+                    if np.array_equal(u, universe) and np.array_equal(m, membership):
+                        break
+                else:
+                    shared.append((universe, membership))
+                    i = len(shared) - 1
+                self.uses[name].append(i)
+        self.users = [[sum(uses[v] == i for uses in self.uses.values()) for i in range(len(shared))]
+                      for v, shared in enumerate(self.fuzzifiers)]
+
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.live = {name: {'rows': 0, 'disagreements': 0, 'coverage_mismatches': 0, 'abs_difference': 0.0,
+                            'both_covered': 0, 'inference_s': 0.0} for name in self.variants[1:]}
+        self.backlog = {'dropped_requests': 0, 'dropped_rows': 0, 'failed_requests': 0}
+
+    def fuzzifications(self):
+        return sum(len(shared) for shared in self.fuzzifiers), len(self.variants) * len(self.input_labels)
+
+    def _fuzzify(self, columns, timings):
+        results = []
+        for v, (shared, column) in enumerate(zip(self.fuzzifiers, columns)):
+            column = np.asarray(column, dtype=np.float64)
+            results.append([])
+            for i, (universe, membership) in enumerate(shared):
+                start = time.perf_counter()
+                x = np.clip(column, universe[0], universe[-1])
+                slots = universe_slots(universe, x)
+                results[v].append((interp_rows(universe, membership, x, slots).T, slots))
+                elapsed = (time.perf_counter() - start) / self.users[v][i]
+                for name, uses in self.uses.items():
+                    if uses[v] == i:
+                        timings[name]['fuzzify_s'] += elapsed
+        return results
+
+    def _infer(self, name, fuzzified):
+        engine = self.engines[name]
+        memberships = [fuzzified[v][i][0] for v, i in enumerate(self.uses[name])]
+        slots = [fuzzified[v][i][1] for v, i in enumerate(self.uses[name])]
+        sparse = engine.sparse and len(slots[0]) >= SPARSE_MIN_ROWS
+        return engine.infer(memberships, engine.candidate_rules(slots) if sparse else None)
+
+    def _chunks(self, inputs, timings):
+        columns = self.engines[self.variants[0]].as_columns(inputs)
+        n = len(columns[0])
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            yield start, stop, self._fuzzify([c[start:stop] for c in columns], timings)
+
+    # Scores of every variant for the same inputs, plus per-variant timings
+    def evaluate(self, inputs):
+        n = len(self.engines[self.variants[0]].as_columns(inputs)[0])
+        scores = {name: np.empty(n) for name in self.variants}
+        timings = {name: {'fuzzify_s': 0.0, 'inference_s': 0.0} for name in self.variants}
+        for start, stop, fuzzified in self._chunks(inputs, timings):
+            for name in self.variants:
+                begin = time.perf_counter()
+                scores[name][start:stop] = self._infer(name, fuzzified)
+                timings[name]['inference_s'] += time.perf_counter() - begin
+        return scores, timings
+
+    # Primary scores now; shadow scores on the background thread, unless
+    # max_backlog requests are already waiting for it
+    def serve(self, inputs):
+        timings = {name: {'fuzzify_s': 0.0, 'inference_s': 0.0} for name in self.variants}
+        chunks = list(self._chunks(inputs, timings))
+        primary = np.concatenate([self._infer(self.variants[0], fuzzified) for _, _, fuzzified in chunks])
+        if len(self.variants) > 1:
+            with self._lock:
+                if len(self._pending) >= self.max_backlog:
+                    self.backlog['dropped_requests'] += 1
+                    self.backlog['dropped_rows'] += len(primary)
+                    return primary
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+                future = self._executor.submit(self._shadow, chunks, primary)
+                self._pending.add(future)
+            future.add_done_callback(self._finished)
+        return primary
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            failed = not future.cancelled() and future.exception() is not None
+            if failed:
+                self.backlog['failed_requests'] += 1
+        if failed:
+            logger.error("shadow evaluation failed", exc_info=future.exception())
+
+    def _shadow(self, chunks, primary):
+        primary_decision = np.where(np.isnan(primary), -1, primary >= self.threshold)
+        for name in self.variants[1:]:
+            begin = time.perf_counter()
+            s = np.concatenate([self._infer(name, fuzzified) for _, _, fuzzified in chunks])
+            elapsed = time.perf_counter() - begin
+            both = ~np.isnan(s) & ~np.isnan(primary)
+            with self._lock:
+                live = self.live[name]
+                live['rows'] += len(s)
+                live['disagreements'] += int((np.where(np.isnan(s), -1, s >= self.threshold) != primary_decision).sum())
+                live['coverage_mismatches'] += int((np.isnan(s) != np.isnan(primary)).sum())
+                live['abs_difference'] += float(np.abs(s[both] - primary[both]).sum())
+                live['both_covered'] += int(both.sum())
+                live['inference_s'] += elapsed
+
+    # Waits for the shadow work submitted so far; failures are logged by
+    # _finished()
+    def drain(self):
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    # Per shadow variant, plus the requests served without shadowing
+    # ('dropped') or whose shadow work raised ('failed') under 'backlog'
+    def live_report(self):
+        with self._lock:
+            report = {name: {**live, 'mean_abs_difference': live['abs_difference'] / live['both_covered']
+                             if live['both_covered'] else float('nan')} for name, live in self.live.items()}
+            report['backlog'] = {**self.backlog, 'pending': len(self._pending), 'max_backlog': self.max_backlog}
+            return report
+
+    def close(self):
+        self.drain()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def report(self, scores, timings, examples=5, inputs=None):
+        primary = self.variants[0]
+        decisions = {name: np.where(np.isnan(s), -1, s >= self.threshold) for name, s in scores.items()}
+        report = {'primary': primary, 'threshold': self.threshold, 'rows': len(scores[primary]), 'variants': {}}
+        for name in self.variants:
+            s = scores[name]
+            entry = {
+                'coverage': float(np.mean(~np.isnan(s))),
+                'at_threshold': int((decisions[name] == 1).sum()),
+                'fuzzify_s': timings[name]['fuzzify_s'],
+                'inference_s': timings[name]['inference_s'],
+            }
+            if name != primary:
+                disagree = decisions[name] != decisions[primary]
+                both = ~np.isnan(s) & ~np.isnan(scores[primary])
+                difference = np.abs(s[both] - scores[primary][both])
+                rows = np.flatnonzero(disagree)[:examples]
+                entry.update({
+                    'disagreements': int(disagree.sum()),
+                    'coverage_mismatches': int((np.isnan(s) != np.isnan(scores[primary])).sum()),
+                    'mean_abs_difference': float(difference.mean()) if len(difference) else float('nan'),
+                    'max_abs_difference': float(difference.max()) if len(difference) else float('nan'),
+                    'examples': [{'row': int(r), **({'inputs': np.asarray(inputs)[r].tolist()} if inputs is not None else {}),
+                                  primary: float(scores[primary][r]), name: float(s[r])} for r in rows],
+                })
+            report['variants'][name] = entry
+        return report
+
+
+def print_report(report, elapsed, primary_only=None, separate=None, fuzzifications=None):
+    primary, rows = report['primary'], report['rows']
+    print(f"{rows:,} rows, primary {primary}, decisions at >= {report['threshold']:g}")
+    for name, entry in report['variants'].items():
+        cost = entry['fuzzify_s'] + entry['inference_s']
+        line = (f"    {name:<21} coverage {entry['coverage']:6.1%}  >= threshold {entry['at_threshold']:>8,}  "
+                f"cost {cost:6.3f}s (fuzzify {entry['fuzzify_s']:.3f}s)")
+        if name != primary:
+            line += (f"  disagreements {entry['disagreements']:,} ({entry['disagreements'] / rows:.2%}, "
+                     f"{entry['coverage_mismatches']:,} coverage), mean |diff| {entry['mean_abs_difference']:.2f}")
+        print(line)
+        for example in entry.get('examples', []):
+            print(f"        {example}")
+    summary = f"shadow pass {elapsed:.3f}s"
+    if fuzzifications:
+        summary += f", {fuzzifications[0]} of {fuzzifications[1]} variable fuzzifications computed"
+    if primary_only:
+        summary += f"; primary alone {primary_only:.3f}s (x{elapsed / primary_only:.2f})"
+    if separate:
+        summary += f"; variants run separately {separate:.3f}s"
+    print(summary)
+
+
+if __name__ == '__main__':
+    from fleetSweep import read_inputs
+
+    parser = argparse.ArgumentParser(description="Score one batch against several rule-base variants at once")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS),
+                        help="the first one is the primary")
+    parser.add_argument('--input', help="CSV with fullness..weather columns, or an (N, 5) .npy")
+    parser.add_argument('--rows', type=int, default=200_000, help="random rows when --input is not given")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--defuzzifier', choices=('sampled', 'analytic'), default='sampled')
+    parser.add_argument('--examples', type=int, default=3, help="disagreeing rows to show per shadow")
+    parser.add_argument('--requests', type=int, default=200, help="live requests to replay through serve()")
+    parser.add_argument('--request-size', type=int, default=64, help="bins per live request")
+    parser.add_argument('--max-backlog', type=int, default=DEFAULT_MAX_BACKLOG,
+                        help="live requests allowed to wait for shadow scoring")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.input:
+        inputs = np.asarray(read_inputs(args.input), dtype=np.float64)
+    else:
+        inputs = np.round(np.random.default_rng(args.seed).uniform(0, 100, size=(args.rows, 5)), 1)
+
+    evaluator = ShadowEvaluator(args.variants, args.defuzzifier, threshold=args.threshold,
+                                max_backlog=args.max_backlog)
+    start = time.perf_counter()
+    scores, timings = evaluator.evaluate(inputs)
+    elapsed = time.perf_counter() - start
+
+    # Baselines: the primary alone, and every variant through its own engine
+    separate = 0.0
+    for name, engine in evaluator.engines.items():
+        begin = time.perf_counter()
+        own = engine.compute(inputs)
+        took = time.perf_counter() - begin
+        separate += took
+        if name == args.variants[0]:
+            primary_only = took
+        assert np.array_equal(own, scores[name], equal_nan=True), name
+
+    print_report(evaluator.report(scores, timings, args.examples, inputs), elapsed, primary_only, separate,
+                 evaluator.fuzzifications())
+
+    # Live mode: per-request latency of serve() against the primary alone
+    primary_engine = evaluator.engines[args.variants[0]]
+    served = alone = 0.0
+    for r in range(args.requests):
+        batch = inputs[(r * args.request_size) % len(inputs):][:args.request_size]
+        begin = time.perf_counter()
+        evaluator.serve(batch)
+        served += time.perf_counter() - begin
+        begin = time.perf_counter()
+        primary_engine.compute(batch)
+        alone += time.perf_counter() - begin
+    evaluator.close()
+    print(f"live: {args.requests} requests of {args.request_size} bins, serve() {served / args.requests * 1e3:.2f}ms "
+          f"per request vs primary alone {alone / args.requests * 1e3:.2f}ms")
+    live_report = evaluator.live_report()
+    backlog = live_report.pop('backlog')
+    print(f"    shadowing skipped for {backlog['dropped_requests']:,} requests ({backlog['dropped_rows']:,} rows) "
+          f"with {backlog['max_backlog']} already waiting, {backlog['failed_requests']} failed")
+    for name, live in live_report.items():
+        print(f"    {name:<21} {live['rows']:,} rows shadowed, {live['disagreements']:,} disagreements "
+              f"({live['coverage_mismatches']:,} coverage), mean |diff| {live['mean_abs_difference']:.2f}, "
+              f"{live['inference_s']:.3f}s in the background")
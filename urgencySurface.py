@@ -0,0 +1,165 @@
+import argparse
+import itertools
+import time
+
+import numpy as np
+from skfuzzy import control as ctrl
+
+from batchInference import BatchInferenceEngine
+
+# Precomputed urgency surface for a control system.
+#
+# The build step scores every node of a regular 5-D grid over the input
+# universes with the batch engine and stores the result as a float32 array.
+# Lookups then cost 2**5 array reads and a multilinear blend instead of a
+# full Mamdani inference.  Grid nodes where no rule fires are stored as NaN.
+# A cell whose corners are all NaN lies outside every rule and returns NaN,
+# the same "rule coverage" error path as waste_sim.compute().  A cell with
+# both covered and NaN corners straddles the coverage boundary, and a cell
+# whose corner values differ by more than max_spread is too steep to blend;
+# those rows are scored exactly by the engine the surface was built from
+# (or loaded with).  Without an engine, mixed cells return NaN.
+#
+# The .npz records the fingerprint of the rule base it was built from;
+# load(path, engine) refuses a surface built from another rule base.
+
+# Largest difference between the corner values of a cell that is still
+# blended; steeper cells are scored by the engine
+DEFAULT_MAX_SPREAD = 5.0
+
+
+class UrgencySurface:
+    def __init__(self, input_labels, axes, values, output_label, fingerprint, engine=None,
+                 max_spread=DEFAULT_MAX_SPREAD):
+        self.input_labels = tuple(input_labels)
+        self.output_label = output_label
+        self.fingerprint = fingerprint
+        self.engine = engine
+        self.max_spread = max_spread
+        self.axes = [np.asarray(a, dtype=np.float64) for a in axes]
+        self.values = np.asarray(values, dtype=np.float32)
+        self._flat = self.values.reshape(-1)
+        self._corners = np.array(list(itertools.product((0, 1), repeat=len(self.axes))), dtype=np.intp)
+
+    @classmethod
+    def build(cls, engine, points=21, max_spread=DEFAULT_MAX_SPREAD):
+        rb = engine.rule_base
+        if np.isscalar(points):
+            points = [points] * rb.n_inputs
+        axes = [np.linspace(u[0], u[-1], p) for u, p in zip(rb.input_universes, points)]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, rb.n_inputs)
+        values = engine.compute(grid).reshape([len(a) for a in axes])
+        return cls(rb.input_labels, axes, values, rb.output_label, rb.fingerprint, engine, max_spread)
+
+    def save(self, path):
+        arrays = {f'axis_{i}': a for i, a in enumerate(self.axes)}
+        np.savez_compressed(path, values=self.values, input_labels=np.array(self.input_labels),
+                            output_label=np.array(self.output_label), fingerprint=np.array(self.fingerprint),
+                            **arrays)
+
+    @classmethod
+    def load(cls, path, engine=None, max_spread=DEFAULT_MAX_SPREAD):
+        with np.load(path) as data:
+            labels = [str(l) for l in data['input_labels']]
+            axes = [data[f'axis_{i}'] for i in range(len(labels))]
+            surface = cls(labels, axes, data['values'], str(data['output_label']), str(data['fingerprint']), engine,
+                          max_spread)
+        if engine is not None and surface.fingerprint != engine.rule_base.fingerprint:
+            raise ValueError(f"{path} was built from rule base {surface.fingerprint[:12]}, "
+                             f"not {engine.rule_base.fingerprint[:12]}")
+        return surface
+
+    def lookup(self, inputs):
+        if hasattr(inputs, 'keys'):
+            columns = [np.asarray(inputs[label], dtype=np.float64).reshape(-1) for label in self.input_labels]
+        else:
+            inputs = np.atleast_2d(np.asarray(inputs, dtype=np.float64))
+            columns = [inputs[:, i] for i in range(inputs.shape[1])]
+
+        index, fraction = [], []
+        for axis, column in zip(self.axes, columns):
+            x = np.clip(column, axis[0], axis[-1])
+            i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+            index.append(i)
+            fraction.append((x - axis[i]) / (axis[i + 1] - axis[i]))
+
+        shape = self.values.shape
+        rows = len(columns[0])
+        result = np.zeros(rows)
+        low, high = np.full(rows, np.inf), np.full(rows, -np.inf)
+        uncovered = np.zeros(rows, dtype=bool)
+        for corner in self._corners:
+            weight = np.ones(rows)
+            for d, bit in enumerate(corner):
+                weight *= fraction[d] if bit else 1.0 - fraction[d]
+            flat = np.ravel_multi_index([index[d] + bit for d, bit in enumerate(corner)], shape)
+            value = self._flat[flat]
+            touched = weight > 0
+            uncovered |= touched & np.isnan(value)
+            covered = touched & ~np.isnan(value)
+            low = np.where(covered, np.fmin(low, value), low)
+            high = np.where(covered, np.fmax(high, value), high)
+            result += np.where(touched, weight * np.nan_to_num(value), 0.0)
+        result[uncovered] = np.nan
+
+        # Cells with at least one covered corner that are either mixed or
+        # steeper than max_spread
+        exact = (high >= low) & (uncovered | (high - low > self.max_spread))
+        if self.engine is not None and exact.any():
+            result[exact] = self.engine.compute(np.column_stack([c[exact] for c in columns]))
+        return result
+
+    def lookup_one(self, **inputs):
+        return float(self.lookup({label: [inputs[label]] for label in self.input_labels})[0])
+
+
+# Held-out check against the reference skfuzzy simulation.  Returns the
+# maximum absolute error over samples both sides could score, plus how many
+# samples disagree on whether any rule fired at all.
+def interpolation_error(surface, control_system, samples=200, seed=1):
+    rng = np.random.default_rng(seed)
+    low = [a[0] for a in surface.axes]
+    high = [a[-1] for a in surface.axes]
+    inputs = rng.uniform(low, high, size=(samples, len(surface.axes)))
+    estimate = surface.lookup(inputs)
+
+    sim = ctrl.ControlSystemSimulation(control_system)
+    reference = np.full(samples, np.nan)
+    for i, row in enumerate(inputs):
+        for label, value in zip(surface.input_labels, row):
+            sim.input[label] = value
+        sim.compute()
+        reference[i] = sim.output.get(surface.output_label, np.nan)
+
+    both = ~np.isnan(estimate) & ~np.isnan(reference)
+    errors = np.abs(estimate[both] - reference[both])
+    coverage_mismatch = int((np.isnan(estimate) != np.isnan(reference)).sum())
+    return {
+        'max_error': float(errors.max(initial=0.0)),
+        'mean_error': float(errors.mean()) if errors.size else 0.0,
+        'coverage_mismatch': coverage_mismatch,
+        'samples': samples,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the precomputed urgency surface for app.py")
+    parser.add_argument('--points', type=int, default=21, help="grid nodes per input axis")
+    parser.add_argument('--output', default='urgency_surface.npz')
+    parser.add_argument('--samples', type=int, default=200, help="held-out samples checked against waste_sim")
+    parser.add_argument('--max-spread', type=float, default=DEFAULT_MAX_SPREAD,
+                        help="cells whose corners differ by more are scored by the engine")
+    args = parser.parse_args()
+
+    from app import waste_ctrl
+
+    start = time.perf_counter()
+    surface = UrgencySurface.build(BatchInferenceEngine(waste_ctrl), args.points, args.max_spread)
+    surface.save(args.output)
+    print(f"Built {args.points}^5 surface ({surface.values.nbytes / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s -> {args.output}")
+
+    report = interpolation_error(surface, waste_ctrl, args.samples)
+    print(f"Held-out error vs waste_sim.compute() over {report['samples']} samples: "
+          f"max {report['max_error']:.3f}, mean {report['mean_error']:.3f}, "
+          f"coverage mismatches {report['coverage_mismatch']}")
@@ -2,58 +2,16 @@
 
 pip install scikit-fuzzy
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+from ruleSpec import UPDATE1_SPEC, build_control_system
 from sklearn.cluster import KMeans
 from sklearn.tree import DecisionTreeClassifier, export_text
 import matplotlib.pyplot as plt
 
-# Step 1: Define fuzzy variables
-# Inputs
-fullness = ctrl.Antecedent(np.arange(0, 101, 1), 'fullness')
-toxicity = ctrl.Antecedent(np.arange(0, 101, 1), 'toxicity')
-moisture = ctrl.Antecedent(np.arange(0, 101, 1), 'moisture')
-odor = ctrl.Antecedent(np.arange(0, 101, 1), 'odor')
-weather = ctrl.Antecedent(np.arange(0, 101, 1), 'weather')
-
-# Output
-urgency = ctrl.Consequent(np.arange(0, 101, 1), 'urgency')
-
-# Define fuzzy membership functions
-fullness['low'] = fuzz.trimf(fullness.universe, [0, 0, 50])
-fullness['medium'] = fuzz.trimf(fullness.universe, [20, 50, 80])
-fullness['high'] = fuzz.trimf(fullness.universe, [50, 100, 100])
-
-toxicity['none'] = fuzz.trimf(toxicity.universe, [0, 0, 10])
-toxicity['mild'] = fuzz.trimf(toxicity.universe, [5, 15, 30])
-toxicity['moderate'] = fuzz.trimf(toxicity.universe, [20, 35, 50])
-toxicity['high'] = fuzz.trimf(toxicity.universe, [45, 60, 70])
-toxicity['very_high'] = fuzz.trimf(toxicity.universe, [60, 75, 90])
-toxicity['severe'] = fuzz.trimf(toxicity.universe, [80, 100, 100])
-
-moisture['dry'] = fuzz.trimf(moisture.universe, [0, 0, 20])
-moisture['slightly_moist'] = fuzz.trimf(moisture.universe, [10, 25, 40])
-moisture['moderate'] = fuzz.trimf(moisture.universe, [30, 50, 70])
-moisture['wet'] = fuzz.trimf(moisture.universe, [60, 75, 90])
-moisture['saturated'] = fuzz.trimf(moisture.universe, [80, 100, 100])
-
-odor['none'] = fuzz.trimf(odor.universe, [0, 0, 20])
-odor['mild'] = fuzz.trimf(odor.universe, [10, 25, 40])
-odor['moderate'] = fuzz.trimf(odor.universe, [30, 50, 70])
-odor['strong'] = fuzz.trimf(odor.universe, [60, 75, 90])
-odor['very_strong'] = fuzz.trimf(odor.universe, [80, 100, 100])
-
-weather['clear'] = fuzz.trimf(weather.universe, [0, 0, 20])
-weather['cloudy'] = fuzz.trimf(weather.universe, [10, 30, 50])
-weather['rainy'] = fuzz.trimf(weather.universe, [30, 50, 70])
-weather['humid'] = fuzz.trimf(weather.universe, [50, 70, 90])
-weather['hot'] = fuzz.trimf(weather.universe, [70, 80, 100])
-weather['cold'] = fuzz.trimf(weather.universe, [0, 20, 40])
-weather['stormy'] = fuzz.trimf(weather.universe, [60, 90, 100])
-
-urgency['low'] = fuzz.trimf(urgency.universe, [0, 0, 50])
-urgency['medium'] = fuzz.trimf(urgency.universe, [20, 50, 80])
-urgency['high'] = fuzz.trimf(urgency.universe, [50, 100, 100])
+# Step 1: Fuzzy variables, membership functions and rules are declared in
+# ruleSpec.UPDATE1_SPEC
+fuzzy = build_control_system(UPDATE1_SPEC)
+fullness, toxicity, moisture, odor, weather = (fuzzy[label] for label in UPDATE1_SPEC['inputs'])
+urgency = fuzzy['urgency']
 
 # Step 2: Example real-world data for clustering and rule generation
 # Replace this with your actual dataset
@@ -83,19 +41,10 @@ tree.fit(X, y)
 rules = export_text(tree, feature_names=["Fullness", "Toxicity", "Moisture", "Odor", "Weather"])
 print("\nDecision Tree Rules:\n", rules)
 
-# Step 5: Define rules based on clustering and decision tree insights
-rule1 = ctrl.Rule(fullness['high'] & toxicity['high'] & moisture['wet'], urgency['high'])
-rule2 = ctrl.Rule(fullness['low'] & odor['none'] & weather['clear'], urgency['low'])
-rule3 = ctrl.Rule(moisture['saturated'] & weather['stormy'], urgency['high'])
-rule4 = ctrl.Rule(fullness['medium'] & toxicity['moderate'] & weather['rainy'], urgency['medium'])
-rule5 = ctrl.Rule(fullness['low'] & odor['mild'] & weather['cloudy'], urgency['low'])
-
-# Add fallback rule
-rule_default = ctrl.Rule(~fullness['high'] & ~toxicity['severe'] & ~moisture['saturated'], urgency['medium'])
-
-# Create control system and simulation
-waste_ctrl = ctrl.ControlSystem([rule1, rule2, rule3, rule4, rule5, rule_default])
-waste_sim = ctrl.ControlSystemSimulation(waste_ctrl)
+# Step 5: Rules based on clustering and decision tree insights live in
+# ruleSpec.UPDATE1_SPEC; create control system and simulation
+waste_ctrl = fuzzy['waste_ctrl']
+waste_sim = fuzzy['waste_sim']
 
 # Step 6: Plot membership functions
 def plot_membership_functions():
@@ -1,107 +1,78 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, abort
+import json
 import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
+from functools import lru_cache
+import os
+from batchInference import BatchInferenceEngine
+from resultCache import QuantizedResultCache, DEFAULT_MAXSIZE, parse_resolution
+from ruleSpec import DIFF_MEMBERSHIP_SPEC, THRESHOLD, build_control_system, fuzzy_object_names, load_compiled
+from serviceMetrics import CONTENT_TYPE, MetricsRegistry, metrics_allowed
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Step 1: Define fuzzy variables
-# Inputs
-fullness = ctrl.Antecedent(np.arange(0, 101, 1), 'fullness')
-toxicity = ctrl.Antecedent(np.arange(0, 101, 1), 'toxicity')
-moisture = ctrl.Antecedent(np.arange(0, 101, 1), 'moisture')
-odor = ctrl.Antecedent(np.arange(0, 101, 1), 'odor')
-weather = ctrl.Antecedent(np.arange(0, 101, 1), 'weather')
-
-# Output
-urgency = ctrl.Consequent(np.arange(0, 101, 1), 'urgency')
-
-# Step 2: Define fuzzy membership functions
-# Fullness
-fullness['low'] = fuzz.trimf(fullness.universe, [0, 0, 50])
-fullness['medium'] = fuzz.trimf(fullness.universe, [20, 50, 80])
-fullness['high'] = fuzz.trimf(fullness.universe, [50, 100, 100])
-
-# Toxicity
-toxicity['none'] = fuzz.trimf(toxicity.universe, [0, 0, 10])
-toxicity['mild'] = fuzz.trimf(toxicity.universe, [5, 15, 30])
-toxicity['moderate'] = fuzz.trimf(toxicity.universe, [20, 35, 50])
-toxicity['high'] = fuzz.trimf(toxicity.universe, [45, 60, 70])
-toxicity['very_high'] = fuzz.trimf(toxicity.universe, [60, 75, 90])
-toxicity['severe'] = fuzz.trimf(toxicity.universe, [80, 100, 100])
-
-# Moisture
-moisture['dry'] = fuzz.trimf(moisture.universe, [0, 0, 20])
-moisture['slightly_moist'] = fuzz.trimf(moisture.universe, [10, 25, 40])
-moisture['moderate'] = fuzz.trimf(moisture.universe, [30, 50, 70])
-moisture['wet'] = fuzz.trimf(moisture.universe, [60, 75, 90])
-moisture['saturated'] = fuzz.trimf(moisture.universe, [80, 100, 100])
-
-# Odor
-odor['none'] = fuzz.gaussmf(odor.universe, mean=0, sigma=10)
-odor['mild'] = fuzz.gaussmf(odor.universe, mean=25, sigma=10)
-odor['moderate'] = fuzz.gaussmf(odor.universe, mean=50, sigma=10)
-odor['strong'] = fuzz.gaussmf(odor.universe, mean=75, sigma=10)
-odor['very_strong'] = fuzz.gaussmf(odor.universe, mean=100, sigma=10)
-
-# Weather
-weather['clear'] = fuzz.trapmf(weather.universe, [0, 0, 10, 20])
-weather['cloudy'] = fuzz.trapmf(weather.universe, [10, 20, 30, 40])
-weather['rainy'] = fuzz.trapmf(weather.universe, [30, 40, 50, 60])
-weather['humid'] = fuzz.trapmf(weather.universe, [50, 60, 70, 80])
-weather['stormy'] = fuzz.trapmf(weather.universe, [70, 80, 90, 100])
-
-# Urgency
-urgency['low'] = fuzz.trimf(urgency.universe, [0, 0, 50])
-urgency['medium'] = fuzz.trimf(urgency.universe, [20, 50, 80])
-urgency['high'] = fuzz.trimf(urgency.universe, [50, 100, 100])
-
-# Step 3: Define fuzzy rules
-rules = [
-    ctrl.Rule(fullness['high'] & odor['very_strong'] & weather['stormy'] & toxicity['severe'], urgency['high']),
-    ctrl.Rule(fullness['medium'] & (toxicity['very_high'] | toxicity['severe']) & (moisture['wet'] | weather['rainy']), urgency['high']),
-    ctrl.Rule(fullness['low'] & odor['none'] & moisture['dry'] & weather['clear'] & toxicity['none'], urgency['low']),
-    ctrl.Rule(moisture['saturated'] & fullness['medium'] & weather['cloudy'] & toxicity['moderate'], urgency['medium']),
-    ctrl.Rule(odor['strong'] & fullness['high'] & (toxicity['high'] | toxicity['very_high']) & weather['clear'], urgency['high']),
-    # Additional rules...
-]
-
-# Add a fallback rule
-fallback_rule = ctrl.Rule(~fullness['high'] & ~toxicity['severe'] & ~moisture['saturated'] & ~odor['very_strong'], urgency['low'])
-rules.append(fallback_rule)
-
-# Step 4: Create control system
-waste_ctrl = ctrl.ControlSystem(rules)
-waste_sim = ctrl.ControlSystemSimulation(waste_ctrl)
-
-# Endpoint to handle waste management prediction
-@app.route('/predict', methods=['POST'])
-def predict_waste_urgency():
+# Compiled rule base (see ruleSpec.DIFF_MEMBERSHIP_SPEC); stateless scorer
+# shared by all request threads (see app.py)
+waste_engine = BatchInferenceEngine(load_compiled(DIFF_MEMBERSHIP_SPEC),
+                                    defuzzifier=os.environ.get('URGENCY_DEFUZZIFIER', 'sampled'))
+
+# Memoized scores, shared by every handler.  Keys are the exact inputs
+# unless URGENCY_CACHE_RESOLUTION opts into quantized keys (see resultCache)
+urgency_cache = QuantizedResultCache(
+    waste_engine,
+    resolution=parse_resolution(os.environ.get('URGENCY_CACHE_RESOLUTION')),
+    maxsize=int(os.environ.get('URGENCY_CACHE_SIZE', DEFAULT_MAXSIZE))
+)
+
+# Per-stage request timings and counters, served on /metrics (see app.py)
+metrics = MetricsRegistry('urgency_predict')
+stage_seconds = metrics.stage_histogram(
+    'stage_seconds', "Time spent in each stage of the predict handlers",
+    ('parse', 'compute', 'serialize', 'batch_compute'))
+requests_total = metrics.counter('requests_total', "POST /predict requests")
+coverage_errors_total = metrics.counter('coverage_errors_total', "Readings where no rule fired (KeyError path)")
+errors_total = metrics.counter('errors_total', "POST /predict requests answered with a 500")
+batch_readings_total = metrics.counter('batch_readings_total', "Readings received on /predict/batch")
+metrics.cache('cache', urgency_cache)
+
+
+# skfuzzy objects (variables, rules, waste_ctrl, waste_sim), built on first access
+@lru_cache(maxsize=None)
+def _fuzzy_objects():
+    return build_control_system(DIFF_MEMBERSHIP_SPEC)
+
+
+def __getattr__(name):
+    if name in fuzzy_object_names(DIFF_MEMBERSHIP_SPEC):
+        return _fuzzy_objects()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Scores one /predict request.  load() returns the parsed JSON body (and
+# may raise, like request.json); returns (payload, status).  Shared by the
+# Flask route and asyncServer.py.
+def predict_payload(load):
+    requests_total.inc()
     try:
         # Parse input JSON
-        data = request.json
-        fullness_level = data.get('fullness', 0)
-        toxicity_level = data.get('toxicity', 0)
-        moisture_level = data.get('moisture', 0)
-        odor_level = data.get('odor', 0)
-        weather_level = data.get('weather', 0)
-
-        # Set simulation inputs
-        waste_sim.input['fullness'] = fullness_level
-        waste_sim.input['toxicity'] = toxicity_level
-        waste_sim.input['moisture'] = moisture_level
-        waste_sim.input['odor'] = odor_level
-        waste_sim.input['weather'] = weather_level
+        with stage_seconds.time('parse'):
+            data = load()
+            fullness_level = data.get('fullness', 0)
+            toxicity_level = data.get('toxicity', 0)
+            moisture_level = data.get('moisture', 0)
+            odor_level = data.get('odor', 0)
+            weather_level = data.get('weather', 0)
 
         # Perform fuzzy computation
-        waste_sim.compute()
-        urgency_score = waste_sim.output['urgency']
+        with stage_seconds.time('compute'):
+            urgency_score = urgency_cache.score(fullness=fullness_level, toxicity=toxicity_level,
+                                                moisture=moisture_level, odor=odor_level,
+                                                weather=weather_level)
 
         # Determine decision
-        decision = "Empty the bin immediately!" if urgency_score >= 85 else "No immediate need to empty the bin."
+        decision = "Empty the bin immediately!" if urgency_score >= THRESHOLD else "No immediate need to empty the bin."
 
-        return jsonify({
+        return {
             "fullness": fullness_level,
             "toxicity": toxicity_level,
             "moisture": moisture_level,
@@ -109,10 +80,106 @@ def predict_waste_urgency():
             "weather": weather_level,
             "urgency_score": round(urgency_score, 2),
             "decision": decision
-        })
+        }, 200
+
+    except Exception as e:
+        if isinstance(e, KeyError):
+            coverage_errors_total.inc()
+        errors_total.inc()
+        return {"error": str(e)}, 500
 
+
+# Endpoint to handle waste management prediction
+@app.route('/predict', methods=['POST'])
+def predict_waste_urgency():
+    payload, status = predict_payload(lambda: request.json)
+    with stage_seconds.time('serialize'):
+        return jsonify(payload), status
+
+# Readings scored together per engine call on the batch endpoint
+BATCH_CHUNK_SIZE = 512
+
+
+def read_batch_readings():
+    # NDJSON bodies are read line by line so large uploads are never held in
+    # memory; plain JSON bodies must be an array of reading objects.
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+    else:
+        data = request.get_json()
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array of readings")
+        yield from data
+
+
+def score_batch_chunk(readings):
+    batch_readings_total.inc(len(readings))
+    results, rows, scored = [], [], []
+    for reading in readings:
+        if not isinstance(reading, dict):
+            error = str(reading) if isinstance(reading, Exception) else "Reading must be a JSON object"
+            results.append({"urgency_score": None, "decision": None, "error": error})
+            continue
+        result = {label: reading.get(label, 0) for label in waste_engine.input_labels}
+        try:
+            rows.append([float(result[label]) for label in waste_engine.input_labels])
+        except (TypeError, ValueError) as e:
+            result.update({"urgency_score": None, "decision": None, "error": str(e)})
+        else:
+            scored.append(result)
+        results.append(result)
+
+    if rows:
+        with stage_seconds.time('batch_compute'):
+            scores = urgency_cache.compute(np.array(rows))
+        for result, urgency_score in zip(scored, scores):
+            if np.isnan(urgency_score):
+                coverage_errors_total.inc()
+                # Same message /predict returns when no rule fires
+                result.update({"urgency_score": None, "decision": None,
+                               "error": str(KeyError(waste_engine.rule_base.output_label))})
+                continue
+            decision = "Empty the bin immediately!" if urgency_score >= THRESHOLD else "No immediate need to empty the bin."
+            result.update({"urgency_score": round(float(urgency_score), 2), "decision": decision, "error": None})
+    return results
+
+
+# Bulk endpoint: accepts a JSON array or an NDJSON stream of readings and
+# streams one NDJSON result per reading back in input order
+@app.route('/predict/batch', methods=['POST'])
+def predict_waste_urgency_batch():
+    try:
+        readings = read_batch_readings()
+        first = next(readings, None)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        chunk = [] if first is None else [first]
+        for reading in readings:
+            chunk.append(reading)
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                for result in score_batch_chunk(chunk):
+                    yield json.dumps(result) + "\n"
+                chunk = []
+        for result in score_batch_chunk(chunk):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics_allowed(request.remote_addr):
+        abort(404)
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
 
 # Run the app
 if __name__ == '__main__':